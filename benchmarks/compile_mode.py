@@ -0,0 +1,104 @@
+# Copyright (C) 2023, Advanced Micro Devices, Inc. All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Latency of a ResNet18 and a small vision transformer quantized with the PTQ flow of
+brevitas_examples, comparing the regular eager execution, eager execution in compile mode and
+torch.compile in compile mode. Requires torchvision.
+"""
+
+import argparse
+import time
+
+import torch
+from torchvision.models import resnet18
+from torchvision.models.vision_transformer import VisionTransformer
+
+from brevitas.graph.calibrate import calibration_mode
+from brevitas.graph.inference import compile_mode
+from brevitas.graph.quantize import preprocess_for_quantize
+from brevitas_examples.imagenet_classification.ptq.ptq_common import quantize_model
+
+QUANT_KWARGS = {
+    'weight_bit_width': 8,
+    'act_bit_width': 8,
+    'bias_bit_width': 32,
+    'weight_quant_granularity': 'per_channel',
+    'act_quant_percentile': 99.999,
+    'act_quant_type': 'sym',
+    'scale_factor_type': 'float_scale',
+    'quant_format': 'int'}
+
+
+def quant_resnet18():
+    model = preprocess_for_quantize(resnet18())
+    return quantize_model(model, backend='fx', **QUANT_KWARGS), (1, 3, 224, 224)
+
+
+def quant_vit():
+    model = VisionTransformer(
+        image_size=64,
+        patch_size=8,
+        num_layers=4,
+        num_heads=4,
+        hidden_dim=128,
+        mlp_dim=512,
+        num_classes=100)
+    return quantize_model(model, backend='layerwise', **QUANT_KWARGS), (8, 3, 64, 64)
+
+
+MODELS = {'resnet18': quant_resnet18, 'vit': quant_vit}
+
+parser = argparse.ArgumentParser(description='torch.compile compile mode benchmark')
+parser.add_argument('--iters', default=20, type=int, help='Timed iterations per case (default: 20)')
+parser.add_argument('--warmup', default=3, type=int, help='Warmup iterations per case (default: 3)')
+parser.add_argument(
+    '--backend', default='inductor', help='Backend of torch.compile (default: inductor)')
+parser.add_argument(
+    '--models',
+    nargs='+',
+    default=list(MODELS.keys()),
+    choices=list(MODELS.keys()),
+    help='Models to run (default: all)')
+
+
+def time_ms(fn, iters, warmup):
+    for _ in range(warmup):
+        fn()
+    start = time.perf_counter()
+    for _ in range(iters):
+        fn()
+    return (time.perf_counter() - start) / iters * 1e3
+
+
+def main():
+    args = parser.parse_args()
+    print(
+        f"{'model':<12}{'eager':>12}{'compile mode':>14}{'compiled':>12}{'speedup':>10}"
+        f"{'compile time':>14}{'max abs err':>14}")
+    for name in args.models:
+        torch.manual_seed(0)
+        model, shape = MODELS[name]()
+        model.eval()
+        inp = torch.randn(shape)
+        with torch.no_grad():
+            with calibration_mode(model):
+                model(inp)
+            ref = model(inp)
+            eager_ms = time_ms(lambda: model(inp), args.iters, args.warmup)
+            with compile_mode(model, (inp,)):
+                compile_mode_ms = time_ms(lambda: model(inp), args.iters, args.warmup)
+                compiled_model = torch.compile(model, backend=args.backend)
+                start = time.perf_counter()
+                out = compiled_model(inp)
+                compile_s = time.perf_counter() - start
+                compiled_ms = time_ms(lambda: compiled_model(inp), args.iters, args.warmup)
+            torch._dynamo.reset()
+        err = (out - ref).abs().max().item()
+        print(
+            f"{name:<12}{eager_ms:>10.2f}ms{compile_mode_ms:>12.2f}ms{compiled_ms:>10.2f}ms"
+            f"{eager_ms / compiled_ms:>9.2f}x{compile_s:>13.1f}s{err:>14.2e}")
+
+
+if __name__ == '__main__':
+    main()
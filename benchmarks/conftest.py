@@ -0,0 +1,23 @@
+# Copyright (C) 2023, Advanced Micro Devices, Inc. All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+
+import importlib.util
+
+import pytest
+import torch
+
+# The suite is driven by pytest-benchmark's benchmark fixture, skip collection when it is missing
+if importlib.util.find_spec('pytest_benchmark') is None:
+    collect_ignore_glob = ['test_*.py']
+
+SEED = 123456
+
+
+@pytest.fixture(autouse=True)
+def benchmark_setup():
+    torch.manual_seed(SEED)
+    # Pin the thread count so that results stored on the same machine stay comparable
+    num_threads = torch.get_num_threads()
+    torch.set_num_threads(1)
+    yield
+    torch.set_num_threads(num_threads)
@@ -0,0 +1,102 @@
+# Copyright (C) 2023, Advanced Micro Devices, Inc. All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Time and memory allocations of IntQuant against FusedIntQuant on large activations, for forward
+only and forward + backward through scale, zero-point and input.
+"""
+
+import argparse
+import time
+
+import torch
+from torch.profiler import profile
+from torch.profiler import ProfilerActivity
+
+from brevitas.core.quant import FusedIntQuant
+from brevitas.core.quant import IntQuant
+
+SHAPES = {
+    'conv_act_bs32_64x56x56': (32, 64, 56, 56),
+    'conv_act_bs8_256x28x28': (8, 256, 28, 28),
+    'seq_act_bs4_2048x4096': (4, 2048, 4096)}
+
+parser = argparse.ArgumentParser(description='Fused IntQuant benchmark')
+parser.add_argument('--iters', default=10, type=int, help='Timed iterations per case (default: 10)')
+parser.add_argument('--warmup', default=2, type=int, help='Warmup iterations per case (default: 2)')
+parser.add_argument(
+    '--shapes',
+    nargs='+',
+    default=list(SHAPES.keys()),
+    choices=list(SHAPES.keys()),
+    help='Shapes to run (default: all)')
+
+
+def time_ms(fn, iters, warmup):
+    for _ in range(warmup):
+        fn()
+    start = time.perf_counter()
+    for _ in range(iters):
+        fn()
+    return (time.perf_counter() - start) / iters * 1e3
+
+
+def allocations(fn):
+    """
+    Number of allocations and total allocated bytes by the ops called by fn, and net bytes still
+    allocated when fn returns.
+    """
+    with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+        fn()
+    num_allocs, allocated_bytes, retained_bytes = 0, 0, 0
+    for event in prof.events():
+        if event.name == '[memory]':
+            continue
+        if event.self_cpu_memory_usage > 0:
+            num_allocs += 1
+            allocated_bytes += event.self_cpu_memory_usage
+        retained_bytes += event.self_cpu_memory_usage
+    return num_allocs, allocated_bytes, retained_bytes
+
+
+def main():
+    args = parser.parse_args()
+    torch.manual_seed(0)
+    bit_width = torch.tensor(8.)
+    print(
+        f"{'shape':<28}{'pass':<10}{'impl':<9}{'time':>10}{'allocs':>8}{'allocated':>12}"
+        f"{'saved for bwd':>15}")
+    for name in args.shapes:
+        inp = torch.randn(SHAPES[name])
+        out_bytes = inp.numel() * inp.element_size()
+        scale = torch.tensor(0.02, requires_grad=True)
+        zero_point = torch.tensor(0., requires_grad=True)
+        for impl_name, impl in (('unfused', IntQuant), ('fused', FusedIntQuant)):
+            int_quant = impl(narrow_range=False, signed=True)
+            x = inp.clone().requires_grad_()
+            graph = []
+
+            def forward():
+                with torch.no_grad():
+                    int_quant(scale, zero_point, bit_width, inp)
+
+            def forward_with_graph():
+                graph.append(int_quant(scale, zero_point, bit_width, x))
+
+            def forward_backward():
+                x.grad = scale.grad = zero_point.grad = None
+                int_quant(scale, zero_point, bit_width, x).sum().backward()
+
+            # Memory held by the autograd graph after the forward pass, on top of the output
+            saved_bytes = allocations(forward_with_graph)[2] - out_bytes
+            del graph[:]
+            for pass_name, fn in (('fwd', forward), ('fwd+bwd', forward_backward)):
+                ms = time_ms(fn, args.iters, args.warmup)
+                num_allocs, allocated_bytes, _ = allocations(fn)
+                print(
+                    f"{name:<28}{pass_name:<10}{impl_name:<9}{ms:>8.2f}ms{num_allocs:>8}"
+                    f"{allocated_bytes / 2 ** 20:>10.1f}MB{saved_bytes / 2 ** 20:>13.1f}MB")
+
+
+if __name__ == '__main__':
+    main()
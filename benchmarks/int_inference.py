@@ -0,0 +1,108 @@
+# Copyright (C) 2023, Advanced Micro Devices, Inc. All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Throughput of QuantLinear / QuantConv layers on CPU, comparing the fake-quant float path,
+the frozen fake-quant path and the integer-arithmetic backend.
+"""
+
+import argparse
+import time
+
+import torch
+
+from brevitas.graph.calibrate import calibration_mode
+from brevitas.graph.inference import frozen_inference_mode
+from brevitas.graph.inference import int_inference_mode
+from brevitas.graph.inference import is_int_inference_available
+import brevitas.nn as qnn
+from brevitas.quant import Int8ActPerTensorFloat
+from brevitas.quant import Int8WeightPerChannelFloat
+
+CASES = {
+    'conv2d_64x64_k3_bs8_56x56': (
+        lambda: qnn.QuantConv2d(
+            64,
+            64,
+            3,
+            padding=1,
+            input_quant=Int8ActPerTensorFloat,
+            weight_quant=Int8WeightPerChannelFloat), (8, 64, 56, 56)),
+    'conv2d_256x256_k3_bs1_14x14': (
+        lambda: qnn.QuantConv2d(
+            256,
+            256,
+            3,
+            padding=1,
+            input_quant=Int8ActPerTensorFloat,
+            weight_quant=Int8WeightPerChannelFloat), (1, 256, 14, 14)),
+    'conv1d_256x256_k3_bs8_128': (
+        lambda: qnn.QuantConv1d(
+            256,
+            256,
+            3,
+            padding=1,
+            input_quant=Int8ActPerTensorFloat,
+            weight_quant=Int8WeightPerChannelFloat), (8, 256, 128)),
+    'linear_1024x1024_bs64': (
+        lambda: qnn.QuantLinear(
+            1024,
+            1024,
+            bias=True,
+            input_quant=Int8ActPerTensorFloat,
+            weight_quant=Int8WeightPerChannelFloat), (64, 1024)),
+    'linear_4096x4096_bs8': (
+        lambda: qnn.QuantLinear(
+            4096,
+            4096,
+            bias=True,
+            input_quant=Int8ActPerTensorFloat,
+            weight_quant=Int8WeightPerChannelFloat), (8, 4096))}
+
+parser = argparse.ArgumentParser(description='Integer inference backend throughput benchmark')
+parser.add_argument('--iters', default=20, type=int, help='Timed iterations per case (default: 20)')
+parser.add_argument('--warmup', default=3, type=int, help='Warmup iterations per case (default: 3)')
+parser.add_argument(
+    '--cases',
+    nargs='+',
+    default=list(CASES.keys()),
+    choices=list(CASES.keys()),
+    help='Cases to run (default: all)')
+
+
+def time_ms(fn, iters, warmup):
+    for _ in range(warmup):
+        fn()
+    start = time.perf_counter()
+    for _ in range(iters):
+        fn()
+    return (time.perf_counter() - start) / iters * 1e3
+
+
+def main():
+    args = parser.parse_args()
+    if not is_int_inference_available():
+        raise RuntimeError("Integer inference kernels are not available in this PyTorch build.")
+    torch.manual_seed(0)
+    print(f"{'case':<32}{'fake-quant':>12}{'frozen':>12}{'int':>12}{'max abs err':>14}")
+    for name in args.cases:
+        layer_impl, shape = CASES[name]
+        layer = layer_impl()
+        layer.eval()
+        inp = torch.randn(shape)
+        with torch.no_grad():
+            with calibration_mode(layer):
+                layer(inp)
+            ref = layer(inp)
+            fake_quant_ms = time_ms(lambda: layer(inp), args.iters, args.warmup)
+            with frozen_inference_mode(layer):
+                frozen_ms = time_ms(lambda: layer(inp), args.iters, args.warmup)
+            with int_inference_mode(layer):
+                int_ms = time_ms(lambda: layer(inp), args.iters, args.warmup)
+                err = (layer(inp) - ref).abs().max().item()
+        print(
+            f"{name:<32}{fake_quant_ms:>10.2f}ms{frozen_ms:>10.2f}ms{int_ms:>10.2f}ms{err:>14.2e}")
+
+
+if __name__ == '__main__':
+    main()
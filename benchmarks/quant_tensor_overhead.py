@@ -0,0 +1,87 @@
+# Copyright (C) 2023, Advanced Micro Devices, Inc. All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Per-call overhead of QuantTensor handling and quant layer dispatch on small, latency-bound inputs,
+where the Python overhead dominates the actual math.
+"""
+
+import argparse
+import time
+
+import torch
+import torch.nn.functional as F
+
+from brevitas.graph.calibrate import calibration_mode
+import brevitas.nn as qnn
+from brevitas.quant_tensor import QuantTensor
+
+FEATURES = 64
+
+parser = argparse.ArgumentParser(description='QuantTensor and quant layer overhead benchmark')
+parser.add_argument(
+    '--iters', default=2000, type=int, help='Timed iterations per case (default: 2000)')
+parser.add_argument(
+    '--warmup', default=200, type=int, help='Warmup iterations per case (default: 200)')
+
+
+def time_us(fn, iters, warmup):
+    for _ in range(warmup):
+        fn()
+    start = time.perf_counter()
+    for _ in range(iters):
+        fn()
+    return (time.perf_counter() - start) / iters * 1e6
+
+
+def calibrated(module, inp):
+    module.eval()
+    with calibration_mode(module):
+        module(inp)
+    return module
+
+
+def cases():
+    torch.manual_seed(0)
+    x = torch.randn(1, FEATURES)
+    weight = torch.randn(FEATURES, FEATURES)
+    bias = torch.randn(FEATURES)
+    qt = calibrated(qnn.QuantIdentity(return_quant_tensor=True), x)(x)
+    scale, zero_point, bit_width = qt.scale, qt.zero_point, qt.bit_width
+    identity = calibrated(qnn.QuantIdentity(return_quant_tensor=False), x)
+    relu_qt = calibrated(qnn.QuantReLU(return_quant_tensor=True), x)
+    linear = qnn.QuantLinear(FEATURES, FEATURES, bias=True).eval()
+    linear_qt = calibrated(
+        qnn.QuantLinear(FEATURES, FEATURES, bias=True, return_quant_tensor=True), x)
+    linear_io = calibrated(
+        qnn.QuantLinear(
+            FEATURES,
+            FEATURES,
+            bias=True,
+            input_quant=qnn.QuantIdentity().act_quant.quant_injector,
+            output_quant=qnn.QuantIdentity().act_quant.quant_injector,
+            return_quant_tensor=False),
+        x)
+    return {
+        'F.linear': lambda: F.linear(x, weight, bias),
+        'QuantTensor()': lambda: QuantTensor(x, scale, zero_point, bit_width, True, False),
+        'QuantTensor.signed': lambda: qt.signed,
+        'QuantTensor + QuantTensor': lambda: qt + qt,
+        'torch.relu(QuantTensor)': lambda: torch.relu(qt),
+        'QuantIdentity': lambda: identity(x),
+        'QuantReLU(QuantTensor)': lambda: relu_qt(qt),
+        'QuantLinear': lambda: linear(x),
+        'QuantLinear(QuantTensor)': lambda: linear_qt(qt),
+        'QuantLinear io quant': lambda: linear_io(x)}
+
+
+def main():
+    args = parser.parse_args()
+    print(f"{'case':<32}{'us/call':>10}")
+    with torch.no_grad():
+        for name, fn in cases().items():
+            print(f"{name:<32}{time_us(fn, args.iters, args.warmup):>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
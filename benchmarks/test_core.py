@@ -0,0 +1,111 @@
+# Copyright (C) 2023, Advanced Micro Devices, Inc. All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Core quantizers and statistics ops, benchmarked in isolation from the injector and proxy machinery.
+"""
+
+import pytest
+import torch
+
+from brevitas.core.quant.float import FloatQuant
+from brevitas.core.quant.int_base import FusedIntQuant
+from brevitas.core.quant.int_base import IntQuant
+from brevitas.core.stats.stats_op import AbsMax
+from brevitas.core.stats.stats_op import AbsMaxL2
+from brevitas.core.stats.stats_op import AbsMinMax
+from brevitas.core.stats.stats_op import AbsPercentile
+from brevitas.core.stats.stats_op import L2Norm
+from brevitas.core.stats.stats_op import MeanSigmaStd
+from brevitas.core.stats.stats_op import NegativeMinOrZero
+from brevitas.core.stats.stats_op import PercentileInterval
+
+# Per-channel weight-like input
+SHAPE = (512, 1024)
+
+STATS_OPS = {
+    'abs_max':
+        lambda: AbsMax(),
+    'abs_max_per_channel':
+        lambda: AbsMax(stats_reduce_dim=1),
+    'abs_min_max':
+        lambda: AbsMinMax(),
+    'abs_max_l2':
+        lambda: AbsMaxL2(stats_reduce_dim=1),
+    'abs_percentile':
+        lambda: AbsPercentile(high_percentile_q=99.99, stats_reduce_dim=None),
+    'abs_percentile_per_channel':
+        lambda: AbsPercentile(high_percentile_q=99.99, stats_reduce_dim=1),
+    'percentile_interval':
+        lambda: PercentileInterval(low_percentile_q=0.01, high_percentile_q=99.99),
+    'negative_min_or_zero':
+        lambda: NegativeMinOrZero(),
+    'l2_norm_per_channel':
+        lambda: L2Norm(stats_reduce_dim=1),
+    'mean_sigma_std':
+        lambda: MeanSigmaStd(sigma=3.)}
+
+
+def int_quant_args():
+    x = torch.randn(SHAPE, requires_grad=True)
+    scale = x.detach().abs().amax(dim=1, keepdim=True) / 127.
+    zero_point = torch.tensor(0.)
+    bit_width = torch.tensor(8.)
+    return x, scale, zero_point, bit_width
+
+
+@pytest.mark.benchmark(group='int_quant')
+@pytest.mark.parametrize('int_quant_impl', [IntQuant, FusedIntQuant])
+def test_int_quant_forward(benchmark, int_quant_impl):
+    int_quant = int_quant_impl(narrow_range=True, signed=True)
+    x, scale, zero_point, bit_width = int_quant_args()
+    with torch.no_grad():
+        benchmark(int_quant, x, scale, zero_point, bit_width)
+
+
+@pytest.mark.benchmark(group='int_quant')
+@pytest.mark.parametrize('int_quant_impl', [IntQuant, FusedIntQuant])
+def test_int_quant_backward(benchmark, int_quant_impl):
+    int_quant = int_quant_impl(narrow_range=True, signed=True)
+    x, scale, zero_point, bit_width = int_quant_args()
+
+    def forward_backward():
+        x.grad = None
+        int_quant(x, scale, zero_point, bit_width).sum().backward()
+
+    benchmark(forward_backward)
+
+
+@pytest.mark.benchmark(group='float_quant')
+@pytest.mark.parametrize('exponent_mantissa', [(4, 3), (5, 2)], ids=['e4m3', 'e5m2'])
+def test_float_quant_forward(benchmark, exponent_mantissa):
+    exponent_bit_width, mantissa_bit_width = exponent_mantissa
+    float_quant = FloatQuant(
+        bit_width=8,
+        signed=True,
+        exponent_bit_width=exponent_bit_width,
+        mantissa_bit_width=mantissa_bit_width)
+    x = torch.randn(SHAPE)
+    with torch.no_grad():
+        benchmark(float_quant, x)
+
+
+@pytest.mark.benchmark(group='float_quant')
+def test_float_quant_backward(benchmark):
+    float_quant = FloatQuant(bit_width=8, signed=True, exponent_bit_width=4, mantissa_bit_width=3)
+    x = torch.randn(SHAPE, requires_grad=True)
+
+    def forward_backward():
+        x.grad = None
+        float_quant(x)[0].sum().backward()
+
+    benchmark(forward_backward)
+
+
+@pytest.mark.benchmark(group='stats_op')
+@pytest.mark.parametrize('stats_op', STATS_OPS.keys())
+def test_stats_op(benchmark, stats_op):
+    op = STATS_OPS[stats_op]()
+    x = torch.randn(SHAPE)
+    with torch.no_grad():
+        benchmark(op, x)
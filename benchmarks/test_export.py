@@ -0,0 +1,65 @@
+# Copyright (C) 2023, Advanced Micro Devices, Inc. All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Export time of a small quantized model to the QCDQ representations.
+"""
+
+import pytest
+import torch
+import torch.nn as nn
+
+# Both export flows live in brevitas.export, which depends on onnx
+pytest.importorskip('onnx')
+
+from brevitas.export import export_onnx_qcdq
+from brevitas.export import export_torch_qcdq
+import brevitas.nn as qnn
+from brevitas.quant import Int8ActPerTensorFloat
+from brevitas.quant import Int8WeightPerTensorFloat
+from brevitas.quant import Int32Bias
+
+IN_CH = 16
+FEATURES = 16
+
+
+def build_model():
+    model = nn.Sequential(
+        qnn.QuantIdentity(act_quant=Int8ActPerTensorFloat, return_quant_tensor=True),
+        qnn.QuantConv2d(
+            IN_CH,
+            IN_CH * 2,
+            3,
+            padding=1,
+            weight_quant=Int8WeightPerTensorFloat,
+            bias_quant=Int32Bias,
+            output_quant=Int8ActPerTensorFloat,
+            return_quant_tensor=True),
+        qnn.QuantReLU(act_quant=None, return_quant_tensor=True),
+        qnn.QuantConv2d(
+            IN_CH * 2,
+            IN_CH,
+            3,
+            padding=1,
+            weight_quant=Int8WeightPerTensorFloat,
+            bias_quant=Int32Bias,
+            output_quant=Int8ActPerTensorFloat))
+    inp = torch.randn(1, IN_CH, FEATURES, FEATURES)
+    # Collect activation statistics before export
+    model(inp)
+    return model.eval(), inp
+
+
+@pytest.mark.benchmark(group='export')
+def test_export_torch_qcdq(benchmark):
+    model, inp = build_model()
+    benchmark.pedantic(export_torch_qcdq, args=(model,), kwargs={'args': inp}, rounds=5)
+
+
+@pytest.mark.benchmark(group='export')
+def test_export_onnx_qcdq(benchmark, tmp_path):
+    model, inp = build_model()
+    export_path = str(tmp_path / 'model.onnx')
+    benchmark.pedantic(
+        export_onnx_qcdq, args=(model,), kwargs={
+            'args': inp, 'export_path': export_path}, rounds=5)
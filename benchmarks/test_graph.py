@@ -0,0 +1,112 @@
+# Copyright (C) 2023, Advanced Micro Devices, Inc. All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Post-training quantization passes run end to end on a small model, including the setup and
+teardown of the context managers.
+"""
+
+import pytest
+import torch
+import torch.nn as nn
+
+from brevitas.graph.calibrate import calibration_mode
+from brevitas.graph.gptq import gptq_mode
+import brevitas.nn as qnn
+from brevitas.quant import Int8ActPerTensorFloat
+
+BATCH = 8
+IN_CH = 16
+FEATURES = 16
+NUM_BATCHES = 4
+PARALLEL_FEATURES = 256
+NUM_PARALLEL_LAYERS = 4
+
+
+def build_model():
+    return nn.Sequential(
+        qnn.QuantIdentity(act_quant=Int8ActPerTensorFloat),
+        qnn.QuantConv2d(IN_CH, IN_CH * 2, 3, padding=1),
+        qnn.QuantReLU(),
+        qnn.QuantConv2d(IN_CH * 2, IN_CH * 2, 3, padding=1, groups=4),
+        qnn.QuantReLU(),
+        nn.AdaptiveAvgPool2d(1),
+        nn.Flatten(),
+        qnn.QuantLinear(IN_CH * 2, IN_CH, bias=True)).eval()
+
+
+class ParallelLayersModel(nn.Module):
+
+    def __init__(self):
+        super().__init__()
+        self.layers = nn.ModuleList([
+            qnn.QuantLinear(PARALLEL_FEATURES, PARALLEL_FEATURES, bias=True)
+            for _ in range(NUM_PARALLEL_LAYERS)])
+
+    def forward(self, x):
+        return sum(layer(x) for layer in self.layers)
+
+
+def build_parallel_layers_model():
+    return ParallelLayersModel().eval()
+
+
+def calib_data():
+    return [torch.randn(BATCH, IN_CH, FEATURES, FEATURES) for _ in range(NUM_BATCHES)]
+
+
+def apply_calibration(model, calib_data):
+    with torch.no_grad():
+        with calibration_mode(model):
+            for inp in calib_data:
+                model(inp)
+
+
+def apply_gptq(model, calib_data, act_order):
+    with torch.no_grad():
+        with gptq_mode(model, act_order=act_order) as gptq:
+            for _ in range(gptq.num_layers):
+                for inp in calib_data:
+                    gptq.model(inp)
+                gptq.update()
+
+
+def parallel_layers_calib_data():
+    return [torch.randn(BATCH, PARALLEL_FEATURES) for _ in range(NUM_BATCHES)]
+
+
+def apply_parallel_layers_gptq(model, calib_data, num_workers):
+    group_of_parallel_layers = [[f'layers.{i}' for i in range(NUM_PARALLEL_LAYERS)]]
+    with torch.no_grad():
+        with gptq_mode(model, group_of_parallel_layers=group_of_parallel_layers,
+                       num_workers=num_workers) as gptq:
+            for _ in range(gptq.num_layers):
+                for inp in calib_data:
+                    gptq.model(inp)
+                gptq.update()
+
+
+@pytest.mark.benchmark(group='ptq')
+def test_calibration_mode(benchmark):
+    data = calib_data()
+    benchmark.pedantic(
+        apply_calibration, setup=lambda: ((build_model(), data), {}), rounds=10, warmup_rounds=1)
+
+
+@pytest.mark.benchmark(group='ptq')
+@pytest.mark.parametrize('act_order', [True, False])
+def test_gptq_mode(benchmark, act_order):
+    data = calib_data()
+    benchmark.pedantic(
+        apply_gptq, setup=lambda: ((build_model(), data, act_order), {}), rounds=5, warmup_rounds=1)
+
+
+@pytest.mark.benchmark(group='ptq_parallel_layers')
+@pytest.mark.parametrize('num_workers', [1, NUM_PARALLEL_LAYERS])
+def test_gptq_mode_parallel_layers(benchmark, num_workers):
+    data = parallel_layers_calib_data()
+    benchmark.pedantic(
+        apply_parallel_layers_gptq,
+        setup=lambda: ((build_parallel_layers_model(), data, num_workers), {}),
+        rounds=5,
+        warmup_rounds=1)
@@ -0,0 +1,115 @@
+# Copyright (C) 2023, Advanced Micro Devices, Inc. All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Forward and forward + backward passes of quant layers with their default quantizers, in training
+mode so that the stats collection path of activation quantizers is included, and inference of
+recurrent stacks with and without concurrent execution of their directions and layers.
+"""
+
+import pytest
+import torch
+
+import brevitas
+import brevitas.nn as qnn
+from brevitas.quant import Int8ActPerTensorFloat
+from brevitas.quant import Int8Bias
+from brevitas.quant import Int8WeightPerChannelFloat
+
+BATCH = 8
+FEATURES = 256
+SEQ_LEN = 32
+EMBED_DIM = 128
+NUM_HEADS = 8
+
+LAYERS = {
+    'linear': (
+        lambda: qnn.QuantLinear(
+            FEATURES,
+            FEATURES,
+            bias=True,
+            input_quant=Int8ActPerTensorFloat,
+            weight_quant=Int8WeightPerChannelFloat,
+            bias_quant=Int8Bias,
+            return_quant_tensor=False),
+        lambda: (torch.randn(BATCH, FEATURES),)),
+    'conv2d': (
+        lambda: qnn.QuantConv2d(
+            64,
+            64,
+            3,
+            padding=1,
+            bias=True,
+            input_quant=Int8ActPerTensorFloat,
+            weight_quant=Int8WeightPerChannelFloat,
+            bias_quant=Int8Bias,
+            return_quant_tensor=False),
+        lambda: (torch.randn(BATCH, 64, 28, 28),)),
+    'lstm': (
+        lambda: qnn.QuantLSTM(EMBED_DIM, EMBED_DIM, io_quant=Int8ActPerTensorFloat),
+        lambda: (torch.randn(SEQ_LEN, BATCH, EMBED_DIM),)),
+    'bidirectional_lstm': (
+        lambda: qnn.QuantLSTM(
+            EMBED_DIM, EMBED_DIM, bidirectional=True, io_quant=Int8ActPerTensorFloat),
+        lambda: (torch.randn(SEQ_LEN, BATCH, EMBED_DIM),)),
+    'mha': (
+        lambda: qnn.QuantMultiheadAttention(EMBED_DIM, NUM_HEADS),
+        lambda: (torch.randn(SEQ_LEN, BATCH, EMBED_DIM),) * 3)}
+
+
+def forward_backward(module, *inp):
+    """
+    Run a forward pass followed by a backward pass through module, with gradients flowing
+    back into the inputs as well as the parameters.
+    """
+    module.zero_grad(set_to_none=True)
+    out = module(*inp)
+    if isinstance(out, tuple):
+        out = out[0]
+    out.sum().backward()
+    return out
+
+
+@pytest.mark.benchmark(group='nn_forward')
+@pytest.mark.parametrize('layer', LAYERS.keys())
+def test_layer_forward(benchmark, layer):
+    module_impl, inp_impl = LAYERS[layer]
+    module = module_impl()
+    inp = inp_impl()
+    with torch.no_grad():
+        benchmark(module, *inp)
+
+
+@pytest.mark.benchmark(group='nn_backward')
+@pytest.mark.parametrize('layer', LAYERS.keys())
+def test_layer_backward(benchmark, layer):
+    module_impl, inp_impl = LAYERS[layer]
+    module = module_impl()
+    inp = tuple(i.requires_grad_() for i in inp_impl())
+    benchmark(forward_backward, module, *inp)
+
+
+# Pairs of recurrent stacks running the same work sequentially and concurrently
+RECURRENT_EXECUTION = {
+    'bidirectional': {
+        'bidirectional': True},
+    'bidirectional_concurrent': {
+        'bidirectional': True, 'concurrent_directions': True},
+    'stacked': {
+        'num_layers': 2},
+    'stacked_wavefront': {
+        'num_layers': 2, 'wavefront_chunk_size': SEQ_LEN // 4}}
+
+
+@pytest.mark.benchmark(group='nn_recurrent_execution')
+@pytest.mark.parametrize('execution', RECURRENT_EXECUTION.keys())
+def test_recurrent_execution(benchmark, execution):
+    # Directions and layers only overlap while the GIL is released, i.e. within the fast cells
+    # scripted with BREVITAS_JIT=1
+    benchmark.extra_info['jit'] = brevitas.config.JIT_ENABLED
+    module = qnn.QuantLSTM(
+        EMBED_DIM, EMBED_DIM, io_quant=Int8ActPerTensorFloat, **RECURRENT_EXECUTION[execution])
+    module.eval()
+    inp = torch.randn(SEQ_LEN, BATCH, EMBED_DIM)
+    with torch.no_grad():
+        benchmark(module, inp)
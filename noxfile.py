@@ -18,6 +18,8 @@ PYTORCH_STABLE_WHEEL_SRC = 'https://download.pytorch.org/whl/torch_stable.html'
 PYTORCH_IDS = tuple([f'pytorch_{i}' for i in PYTORCH_VERSIONS])
 JIT_IDS = tuple([f'{i}'.lower() for i in JIT_STATUSES])
 LSTM_EXPORT_MIN_PYTORCH = '1.10.1'
+BENCHMARK_STORAGE_DIR = '.benchmarks'
+BENCHMARK_REGRESSION_THRESHOLD = 'mean:10%'
 
 TORCHVISION_VERSION_DICT = {
     '1.9.1': '0.10.1',
@@ -97,6 +99,23 @@ def tests_brevitas_cpu(session, pytorch, jit_status):
         session.run('pytest', 'tests/brevitas/graph', '-n', 'logical', '-v')
 
 
+@nox.session(python=PYTHON_VERSIONS)
+@nox.parametrize('pytorch', PYTORCH_VERSIONS, ids=PYTORCH_IDS)
+def benchmarks_brevitas_cpu(session, pytorch):
+    install_pytorch(pytorch, session)
+    session.install('--upgrade', '.[test, export, benchmark]')
+    # Results are stored per PyTorch version, and within that per machine by pytest-benchmark
+    storage = os.path.join(BENCHMARK_STORAGE_DIR, f'pytorch_{pytorch}')
+    args = ['--benchmark-autosave', f'--benchmark-storage=file://{storage}']
+    has_previous_run = os.path.isdir(storage) and any(
+        f.endswith('.json') for _, _, files in os.walk(storage) for f in files)
+    if has_previous_run:
+        # Compare against the latest stored run and fail on regressions of the mean time
+        args += [
+            '--benchmark-compare', f'--benchmark-compare-fail={BENCHMARK_REGRESSION_THRESHOLD}']
+    session.run('pytest', 'benchmarks', *args, *session.posargs)
+
+
 @nox.session(python=PYTHON_VERSIONS)
 @nox.parametrize("pytorch", PYTORCH_VERSIONS, ids=PYTORCH_IDS)
 @nox.parametrize("jit_status", JIT_STATUSES, ids=JIT_IDS)
@@ -31,6 +31,7 @@ setup(
     python_requires=">=3.8",
     install_requires=read_requirements('requirements.txt'),
     extras_require={
+        "benchmark": read_requirements('requirements-benchmark.txt'),
         "notebook": read_requirements('requirements-notebook.txt'),
         "dev": read_requirements('requirements-dev.txt'),
         "docs": read_requirements('requirements-docs.txt'),
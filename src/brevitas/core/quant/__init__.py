@@ -14,5 +14,6 @@ from .int import PrescaledRestrictIntQuantWithInputBitWidth
 from .int import RescalingIntQuant
 from .int import TruncIntQuant
 from .int_base import DecoupledIntQuant
+from .int_base import FusedIntQuant
 from .int_base import IntQuant
 from .ternary import TernaryQuant
@@ -8,9 +8,12 @@ from torch.nn import Module
 import brevitas
 from brevitas.core.function_wrapper import RoundSte
 from brevitas.core.function_wrapper import TensorClamp
+from brevitas.core.function_wrapper import TensorClampSte
 from brevitas.core.quant.delay import DelayWrapper
+from brevitas.function.ops import is_low_precision_float
 from brevitas.function.ops import max_int
 from brevitas.function.ops import min_int
+from brevitas.function.ops_ste import int_quant_ste
 
 
 class IntQuant(brevitas.jit.ScriptModule):
@@ -41,6 +44,10 @@ class IntQuant(brevitas.jit.ScriptModule):
     Note:
         Maps to quant_type == QuantType.INT == 'INT' == 'int' in higher-level APIs.
 
+    Note:
+        With a float16 or bfloat16 input, the integer representation is computed in float32 and
+        the output is cast back to the dtype of the input.
+
     Note:
         Set env variable BREVITAS_JIT=1 to enable TorchScript compilation of this module.
     """
@@ -63,6 +70,14 @@ class IntQuant(brevitas.jit.ScriptModule):
 
     @brevitas.jit.script_method
     def to_int(self, scale: Tensor, zero_point: Tensor, bit_width: Tensor, x: Tensor) -> Tensor:
+        return self._to_int(scale, zero_point, bit_width, x).to(x.dtype)
+
+    @brevitas.jit.script_method
+    def _to_int(self, scale: Tensor, zero_point: Tensor, bit_width: Tensor, x: Tensor) -> Tensor:
+        if is_low_precision_float(x):
+            # The integer grid is computed in float32, since float16 and bfloat16 can't represent
+            # all the integers of wider bit-widths
+            x = x.to(torch.float32)
         y = x / scale
         y = y + zero_point
         min_int_val = self.min_int(bit_width)
@@ -81,9 +96,88 @@ class IntQuant(brevitas.jit.ScriptModule):
 
     @brevitas.jit.script_method
     def forward(self, scale: Tensor, zero_point: Tensor, bit_width: Tensor, x: Tensor) -> Tensor:
-        y_int = self.to_int(scale, zero_point, bit_width, x)
+        y_int = self._to_int(scale, zero_point, bit_width, x)
         y = y_int - zero_point
         y = y * scale
+        if is_low_precision_float(x):
+            y = y.to(x.dtype)
+        y = self.delay_wrapper(x, y)
+        return y
+
+
+class FusedIntQuant(IntQuant):
+    """
+    Variant of :class:`~brevitas.core.quant.IntQuant` that performs the whole quantize-dequantize
+    computation with :func:`~brevitas.function.ops_ste.int_quant_ste`, a single autograd op that
+    computes its output in place on one buffer and recomputes what it needs in the backward pass,
+    instead of allocating and saving an intermediate for each step. Outputs and gradients match the
+    ones of :class:`~brevitas.core.quant.IntQuant`.
+
+    Only round-to-nearest is supported as float_to_int_impl, together with either a
+    :class:`~brevitas.core.function_wrapper.TensorClamp` or a
+    :class:`~brevitas.core.function_wrapper.TensorClampSte` as tensor_clamp_impl. With a learned
+    bit-width, the computation falls back to the unfused one so that its gradient is preserved.
+
+    Args:
+        narrow_range (bool): Flag that determines whether restrict quantization to a narrow range or not.
+        signed (bool): Flag that determines whether to quantize to a signed range or not.
+        float_to_int_impl (Module): Module that performs the conversion from floating point to
+            integer representation. Default: RoundSte()
+        tensor_clamp_impl (Module): Module that performs clamping. Default: TensorClamp()
+        quant_delay_steps (int): Number of training steps to delay quantization for. Default: 0
+
+    Returns:
+        Tensor: Quantized output in de-quantized format.
+
+    Examples:
+        >>> int_quant = FusedIntQuant(narrow_range=True, signed=True)
+        >>> scale, zero_point, bit_width = torch.tensor(0.01), torch.tensor(0.), torch.tensor(4.)
+        >>> inp = torch.Tensor([0.042, -0.053, 0.31, -0.44])
+        >>> out = int_quant(scale, zero_point, bit_width, inp)
+        >>> out
+        tensor([ 0.0400, -0.0500,  0.0700, -0.0700])
+
+    Note:
+        Set env variable BREVITAS_JIT=1 to enable TorchScript compilation of this module, in which
+        case the fused op is implemented natively.
+    """
+
+    __constants__ = ['signed', 'narrow_range', 'ste_clamp']
+
+    def __init__(
+            self,
+            narrow_range: bool,
+            signed: bool,
+            float_to_int_impl: Module = RoundSte(),
+            tensor_clamp_impl: Module = TensorClamp(),
+            quant_delay_steps: int = 0):
+        super(FusedIntQuant, self).__init__(
+            narrow_range, signed, float_to_int_impl, tensor_clamp_impl, quant_delay_steps)
+        if not isinstance(float_to_int_impl, RoundSte):
+            raise RuntimeError(
+                f"FusedIntQuant supports only RoundSte as float_to_int_impl, "
+                f"found {type(float_to_int_impl).__name__}.")
+        if isinstance(tensor_clamp_impl, TensorClampSte):
+            self.ste_clamp = True
+        elif isinstance(tensor_clamp_impl, TensorClamp):
+            self.ste_clamp = False
+        else:
+            raise RuntimeError(
+                f"FusedIntQuant supports only TensorClamp or TensorClampSte as tensor_clamp_impl, "
+                f"found {type(tensor_clamp_impl).__name__}.")
+
+    @brevitas.jit.script_method
+    def forward(self, scale: Tensor, zero_point: Tensor, bit_width: Tensor, x: Tensor) -> Tensor:
+        if bit_width.requires_grad:
+            y_int = self._to_int(scale, zero_point, bit_width, x)
+            y = (y_int - zero_point) * scale
+        else:
+            min_int_val = self.min_int(bit_width)
+            max_int_val = self.max_int(bit_width)
+            y = x.to(torch.float32) if is_low_precision_float(x) else x
+            y = int_quant_ste(y, scale, zero_point, min_int_val, max_int_val, self.ste_clamp)
+        if is_low_precision_float(x):
+            y = y.to(x.dtype)
         y = self.delay_wrapper(x, y)
         return y
 
@@ -138,6 +232,16 @@ class DecoupledIntQuant(brevitas.jit.ScriptModule):
     def to_int(
             self, pre_scale: Tensor, pre_zero_point: Tensor, bit_width: Tensor,
             x: Tensor) -> Tensor:
+        return self._to_int(pre_scale, pre_zero_point, bit_width, x).to(x.dtype)
+
+    @brevitas.jit.script_method
+    def _to_int(
+            self, pre_scale: Tensor, pre_zero_point: Tensor, bit_width: Tensor,
+            x: Tensor) -> Tensor:
+        if is_low_precision_float(x):
+            # The integer grid is computed in float32, since float16 and bfloat16 can't represent
+            # all the integers of wider bit-widths
+            x = x.to(torch.float32)
         y = x / pre_scale
         y = y + pre_zero_point
         min_int_val = self.min_int(bit_width)
@@ -163,8 +267,10 @@ class DecoupledIntQuant(brevitas.jit.ScriptModule):
             zero_point: Tensor,
             bit_width: Tensor,
             x: Tensor) -> Tensor:
-        y_int = self.to_int(pre_scale, pre_zero_point, bit_width, x)
+        y_int = self._to_int(pre_scale, pre_zero_point, bit_width, x)
         y = y_int - zero_point
         y = y * scale
+        if is_low_precision_float(x):
+            y = y.to(x.dtype)
         y = self.delay_wrapper(x, y)
         return y
@@ -14,20 +14,44 @@ from brevitas.core.function_wrapper import InplaceLogTwo
 from brevitas.core.function_wrapper import LogTwo
 from brevitas.core.function_wrapper import PowerOfTwo
 from brevitas.core.function_wrapper import RoundSte
-from brevitas.core.function_wrapper import ScalarClampMinSte
+from brevitas.function.ops_ste import scalar_clamp_min_ste
 from brevitas.inject.enum import FloatToIntImplType  # retrocompatibility
 from brevitas.inject.enum import RestrictValueType
 
 assert RestrictValueType  # prevent removal of unused import
 assert FloatToIntImplType
 
+# Smallest normal float16
+FLOAT16_MIN_NORMAL = 2. ** -14
+
+
+class _ScalingClampMinSte(brevitas.jit.ScriptModule):
+    """
+    Clamp a scale to a positive lower bound with a straight-through gradient estimator. With a
+    float16 scale, a small lower bound (e.g. the default 1e-10) is rounded to zero, and so is the
+    scale once divided by the integer range. The bound is then raised to the smallest normal
+    float16, which stays positive when divided by the integer range of up to 10 bits.
+    """
+    __constants__ = ['min_val', 'float16_min_val']
+
+    def __init__(self, min_val: float) -> None:
+        super(_ScalingClampMinSte, self).__init__()
+        self.min_val = min_val
+        self.float16_min_val = max(min_val, FLOAT16_MIN_NORMAL) if min_val > 0 else min_val
+
+    @brevitas.jit.script_method
+    def forward(self, x: torch.Tensor):
+        if x.dtype == torch.float16:
+            return scalar_clamp_min_ste(x, self.float16_min_val)
+        return scalar_clamp_min_ste(x, self.min_val)
+
 
 class _RestrictClampValue(brevitas.jit.ScriptModule):
 
     def __init__(self, scaling_min_val: Optional[float], restrict_value_impl: Optional[Module]):
         super(_RestrictClampValue, self).__init__()
         if scaling_min_val is not None and scaling_min_val != 0:
-            self.clamp_min_ste = ScalarClampMinSte(scaling_min_val)
+            self.clamp_min_ste = _ScalingClampMinSte(scaling_min_val)
         else:
             self.clamp_min_ste = Identity()
         if restrict_value_impl is not None:
@@ -62,7 +86,7 @@ class _ClampValue(brevitas.jit.ScriptModule):
     def __init__(self, scaling_min_val: Optional[float]):
         super(_ClampValue, self).__init__()
         if scaling_min_val is not None and scaling_min_val != 0:
-            self.clamp_min_ste = ScalarClampMinSte(scaling_min_val)
+            self.clamp_min_ste = _ScalingClampMinSte(scaling_min_val)
         else:
             self.clamp_min_ste = Identity()
         self.min_val = scaling_min_val
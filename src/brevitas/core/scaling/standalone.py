@@ -297,6 +297,9 @@ class ParameterFromRuntimeStatsScaling(brevitas.jit.ScriptModule):
             device: Optional[torch.device] = None) -> None:
         super(ParameterFromRuntimeStatsScaling, self).__init__()
         assert collect_stats_steps > 0, 'Steps should be more than 0'
+        if hasattr(scaling_stats_impl, 'compute_threshold') and any(s != 1 for s in scaling_shape):
+            # The threshold is a single value computed over the whole input
+            raise RuntimeError("Histogram-based stats support only per-tensor scaling.")
         self.collect_stats_steps: int = brevitas.jit.Attribute(collect_stats_steps, int)
         self.counter: int = brevitas.jit.Attribute(0, int)
         self.stats_input_view_shape_impl = scaling_stats_input_view_shape_impl
@@ -356,6 +359,27 @@ class ParameterFromRuntimeStatsScaling(brevitas.jit.ScriptModule):
             out = abs_binary_sign_grad(self.clamp_scaling(self.restrict_scaling(out)))
         return out
 
+    def finalize_stats(self):
+        """
+        Replace the average of the per-batch statistics with the statistics accumulated across
+        batches, for stats implementations that support it (e.g. HistogramThreshold).
+        """
+        stats_impl = self.stats.stats_impl
+        if not hasattr(stats_impl, 'compute_threshold'):
+            return
+        # Nothing was collected, e.g. when the value was loaded from a state dict
+        if self.counter == 0 or stats_impl.hist is None:
+            return
+        with torch.no_grad():
+            stats = stats_impl.compute_threshold().view(self.stats.stats_output_shape)
+            stats = self.clamp_scaling(stats)
+            if self.counter <= self.collect_stats_steps:
+                self.buffer.copy_(stats)
+            else:
+                # Calibration ran for more than collect_stats_steps batches, so the average of
+                # the per-batch statistics was already moved to value
+                self.value.detach().copy_(self.restrict_preprocess(stats))
+
     def state_dict(self, destination=None, prefix='', keep_vars=False):
         output_dict = super(ParameterFromRuntimeStatsScaling, self).state_dict(
             destination=destination, prefix=prefix, keep_vars=keep_vars)
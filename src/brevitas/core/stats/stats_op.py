@@ -12,6 +12,7 @@ import brevitas
 from brevitas import config
 from brevitas.core.utils import StatelessBuffer
 from brevitas.function.ops import max_int
+from brevitas.quant_tensor import _unpack_quant_tensor
 # Use custom implementation of kthvalue as work around to (b)float16 kernel limitations
 from brevitas.utils.torch_utils import kthvalue
 
@@ -108,7 +109,8 @@ class NegativePercentileOrZero(brevitas.jit.ScriptModule):
             # k is 1-indexed, so round away from zero
             k = int(math.ceil(.01 * self.q * dim_slice.numel()))
             result = kthvalue(x, k, dim=self.stats_reduce_dim, keepdim=self.keepdim)[0]
-        result = torch.clamp(result, max=self.zero())
+        # A per-tensor result has no dimensions, so it would be promoted to the dtype of zero
+        result = torch.clamp(result, max=self.zero().to(result.dtype))
         return result
 
 
@@ -337,66 +339,226 @@ class KLMinimizerThreshold(torch.nn.Module):
         self.bit_width_impl = bit_width_impl
         self.absmax_impl = AbsMax()
 
-    def smooth_normalize_distribution(self, p, eps):
-        is_zeros = (p == 0).float()
-        n_zeros = is_zeros.sum()
-        n_nonzeros = torch.numel(p) - n_zeros
-        if not n_nonzeros:
-            return None
+    def smooth_normalize_distribution(self, p, mask, eps):
+        """
+        Smooth a batch of histograms, each one restricted to the bins where mask is True, and
+        return their normalized logits. Bins outside of the mask have zero probability.
+        """
+        is_zeros = ((p == 0) & mask).float()
+        n_zeros = is_zeros.sum(dim=-1, keepdim=True)
+        n_nonzeros = mask.sum(dim=-1, keepdim=True) - n_zeros
         eps1 = eps * n_zeros / n_nonzeros
         hist = p.float()
         hist += eps * is_zeros + (-eps1) * n_nonzeros
-        dist = torch.distributions.categorical.Categorical(logits=hist)
-        return dist
+        hist = hist.masked_fill(~mask, float('-inf'))
+        return hist - hist.logsumexp(dim=-1, keepdim=True)
 
     def forward(self, x: Tensor):
+        dtype = x.dtype
+        # histc is not implemented for float16 on CPU, and bin edges need float32 precision
+        x = x.to(torch.float32)
         absmax = self.absmax_impl(x)
-        bit_width = self.bit_width_impl()
-        num_quantized_bins = max_int(self.signed, False, bit_width).int()
-        thresholds = torch.zeros(self.num_bins // 2 + 1 - num_quantized_bins // 2, device=x.device)
-        divergence = torch.zeros_like(thresholds)
-        quantized_bins = torch.zeros(num_quantized_bins, device=x.device)
         hist = torch.histc(x, bins=self.num_bins, min=-absmax, max=absmax).int()
         hist_edges = torch.linspace(-absmax, absmax, self.num_bins + 1)
-        for i in range(num_quantized_bins // 2, self.num_bins // 2 + 1):
-            p_bin_idx_start = self.num_bins // 2 - i
-            p_bin_idx_stop = self.num_bins // 2 + i + 1
-            thresholds[i - num_quantized_bins // 2] = hist_edges[p_bin_idx_stop]
-            sliced_nd_hist = hist[p_bin_idx_start:p_bin_idx_stop]
-            p = sliced_nd_hist.clone()
-            left_outlier_count = torch.sum(hist[0:p_bin_idx_start])
-            p[0] += left_outlier_count
-            right_outlier_count = torch.sum(hist[p_bin_idx_stop:])
-            p[-1] += right_outlier_count
-            is_nonzeros = (sliced_nd_hist != 0).float()
-            num_merged_bins = torch.numel(p) // num_quantized_bins
-            for j in range(num_quantized_bins):
-                start = j * num_merged_bins
-                stop = start + num_merged_bins
-                quantized_bins[j] = sliced_nd_hist[start:stop].sum()
-            quantized_bins[-1] += sliced_nd_hist[num_quantized_bins * num_merged_bins:].sum()
-            q = torch.zeros_like(p, dtype=torch.float32, device=x.device)
-            for j in range(num_quantized_bins):
-                start = j * num_merged_bins
-                if j == num_quantized_bins - 1:
-                    stop = -1
-                else:
-                    stop = start + num_merged_bins
-                norm = is_nonzeros[start:stop].sum()
-                if norm != 0:
-                    q[start:stop] = quantized_bins[j] / norm
-            q[sliced_nd_hist == 0] = 0.
-            p = self.smooth_normalize_distribution(p, self.smoothing_eps)
-            q = self.smooth_normalize_distribution(q, self.smoothing_eps)
-            if q is None:
-                divergence[i - num_quantized_bins // 2] = float('inf')
-            else:
-                divergence[i - num_quantized_bins // 2] = torch.distributions.kl.kl_divergence(p, q)
+        return self.threshold_from_histogram(hist, hist_edges).to(dtype)
+
+    def threshold_from_histogram(self, hist: Tensor, hist_edges: Tensor):
+        """
+        Compute the threshold from a histogram symmetric around zero, given its bin edges.
+        """
+        num_bins = hist.numel()
+        device = hist.device
+        bit_width = self.bit_width_impl()
+        num_quantized_bins = int(max_int(self.signed, False, bit_width))
+        # Every candidate threshold defines a window of bins centered around zero.
+        # All the candidates are evaluated at once on a [num_candidates, window_len] batch,
+        # where each window is padded to the length of the widest one
+        half_window = torch.arange(
+            num_quantized_bins // 2, num_bins // 2 + 1, device=device).unsqueeze(1)
+        window_start = num_bins // 2 - half_window
+        window_stop = torch.clamp_max(num_bins // 2 + half_window + 1, num_bins)
+        window_len = window_stop - window_start
+        thresholds = hist_edges[window_stop.view(-1).cpu()].to(device)
+        offset = torch.arange(int(window_len.max()), device=device).unsqueeze(0)
+        mask = offset < window_len
+        sliced_nd_hist = hist[torch.clamp_max(window_start + offset, num_bins - 1)] * mask
+        # Bin counts over any range of the histogram are computed from cumulative sums
+        hist_cumsum = torch.nn.functional.pad(hist.cumsum(0), (1, 0))
+        nonzeros_cumsum = torch.nn.functional.pad((hist != 0).cumsum(0), (1, 0))
+        p = sliced_nd_hist.long()
+        p[:, :1] += hist_cumsum[window_start]
+        p.scatter_add_(1, window_len - 1, hist_cumsum[-1] - hist_cumsum[window_stop])
+        # Merge the bins of each window into num_quantized_bins bins, the last one taking the rest
+        num_merged_bins = window_len // num_quantized_bins
+        bin_start = window_start + num_merged_bins * torch.arange(num_quantized_bins, device=device)
+        bin_stop = torch.cat([bin_start[:, 1:], window_stop], dim=1)
+        quantized_bins = (hist_cumsum[bin_stop] - hist_cumsum[bin_start]).float()
+        # The expansion of the last merged bin leaves out the last bin of the window
+        norm = (
+            nonzeros_cumsum[torch.cat([bin_start[:, 1:], window_stop - 1], dim=1)] -
+            nonzeros_cumsum[bin_start]).float()
+        expanded_bins = torch.where(
+            norm != 0, quantized_bins / norm, torch.zeros_like(quantized_bins))
+        bin_idx = torch.clamp_max(offset // num_merged_bins, num_quantized_bins - 1)
+        q = expanded_bins.gather(1, bin_idx)
+        q[(sliced_nd_hist == 0) | (offset == window_len - 1)] = 0.
+        p_logits = self.smooth_normalize_distribution(p, mask, self.smoothing_eps)
+        q_logits = self.smooth_normalize_distribution(q, mask, self.smoothing_eps)
+        # KL divergence between categorical distributions, as in torch.distributions
+        p_probs = p_logits.softmax(dim=-1)
+        divergence = p_probs * (p_logits - q_logits)
+        divergence[q_logits.softmax(dim=-1) == 0] = float('inf')
+        divergence[p_probs == 0] = 0.
+        divergence = divergence.sum(dim=-1)
+        # Smoothing is undefined for a window with only empty bins
+        is_q_empty = ((q != 0) & mask).sum(dim=-1) == 0
+        divergence[is_q_empty] = float('inf')
         min_divergence_idx = torch.argmin(divergence)
         opt_threshold = thresholds[min_divergence_idx]
         return opt_threshold
 
 
+class HistogramThreshold(torch.nn.Module):
+    """
+    Accumulate a histogram of the input across calls, and compute a threshold from it only when
+    compute_threshold is called, e.g. once at the end of calibration. Until then, the forward
+    pass returns the range of the inputs seen so far.
+
+    The histogram has a fixed number of bins over [-R, R), where R is the smallest power of two
+    larger than the absolute max seen so far. Whenever R grows, adjacent bins are merged, so the
+    accumulated histogram is the same as computing it over the whole calibration set at once,
+    regardless of how it is split in batches.
+
+    Args:
+        histogram_threshold_method (str): How to compute the threshold. One of 'percentile',
+            'mse' and 'kl'. Default: 'percentile'
+        high_percentile_q (float): Percentile of the absolute value of the input, or of the input
+            itself when low_percentile_q is specified. Default: 99.999
+        low_percentile_q (Optional, float): If specified, the 'percentile' threshold is the
+            interval between this percentile, clamped to be non-positive, and the high one.
+            Default: None
+        signed (Optional, bool): Whether the quantizer is signed. Required by 'mse' and 'kl'.
+            Default: None
+        bit_width_impl (Optional, Module): Bit width of the quantizer. Required by 'mse' and 'kl'.
+            Default: None
+        num_histogram_bins (int): Number of bins of the histogram, a power of two. Default: 2048
+    """
+
+    def __init__(
+            self,
+            histogram_threshold_method: str = 'percentile',
+            high_percentile_q: float = 99.999,
+            low_percentile_q: Optional[float] = None,
+            signed: Optional[bool] = None,
+            bit_width_impl: Optional[torch.nn.Module] = None,
+            num_histogram_bins: int = 2048):
+        super(HistogramThreshold, self).__init__()
+        if histogram_threshold_method not in ('percentile', 'mse', 'kl'):
+            raise ValueError(
+                f"Histogram threshold method {histogram_threshold_method} not supported.")
+        if histogram_threshold_method != 'percentile' and (signed is None or
+                                                           bit_width_impl is None):
+            raise ValueError(
+                f"Histogram threshold method {histogram_threshold_method} requires signed and "
+                "bit_width_impl.")
+        assert num_histogram_bins >= 4 and num_histogram_bins & (num_histogram_bins - 1) == 0, \
+            "The number of histogram bins has to be a power of two."
+        assert high_percentile_q <= 100, "q has to be a percentage"
+        self.method = histogram_threshold_method
+        self.high_q = high_percentile_q
+        self.low_q = low_percentile_q
+        self.signed = signed
+        # The bit width is not needed for percentiles, so avoid registering it as a submodule
+        self.bit_width_impl = bit_width_impl if histogram_threshold_method != 'percentile' else None
+        self.num_bins = num_histogram_bins
+        # Accumulated stats are not part of the state dict
+        self.hist = None
+        self.range = None
+        self.min_val = None
+        self.max_val = None
+
+    def rescale_histogram(self, new_range):
+        factor = int(new_range / self.range)
+        if factor >= self.num_bins // 2:
+            # All the negative and all the positive values fall in the two central bins
+            merged_hist = torch.stack([
+                self.hist[:self.num_bins // 2].sum(), self.hist[self.num_bins // 2:].sum()])
+        else:
+            merged_hist = self.hist.view(-1, factor).sum(dim=1)
+        start = (self.num_bins - merged_hist.numel()) // 2
+        self.hist = torch.nn.functional.pad(
+            merged_hist, (start, self.num_bins - merged_hist.numel() - start))
+        self.range = new_range
+
+    def forward(self, x: Tensor):
+        dtype = x.dtype
+        x = x.detach().float().reshape(-1)
+        min_val, max_val = torch.aminmax(x)
+        # frexp gives the smallest power of two strictly larger than the absolute max
+        new_range = 2. ** torch.frexp(torch.max(-min_val, max_val))[1].item()
+        if self.hist is None:
+            self.hist = torch.zeros(self.num_bins, dtype=torch.long, device=x.device)
+            self.range = new_range
+            self.min_val, self.max_val = min_val, max_val
+        else:
+            self.min_val = torch.min(self.min_val, min_val)
+            self.max_val = torch.max(self.max_val, max_val)
+            if new_range > self.range:
+                self.rescale_histogram(new_range)
+        # Scaling by a power of two is exact, so values are binned consistently across ranges
+        bin_idx = torch.floor(x * (self.num_bins / (2 * self.range))).int() + self.num_bins // 2
+        self.hist += torch.bincount(bin_idx, minlength=self.num_bins)
+        if self.method == 'percentile' and self.low_q is not None:
+            return (self.max_val - torch.clamp(self.min_val, max=0.)).to(dtype)
+        return torch.max(-self.min_val, self.max_val).to(dtype)
+
+    def percentile(self, hist, hist_edges, q, round_up):
+        # k is 1-indexed, as in kthvalue
+        numel = hist.sum().item()
+        k = math.ceil(.01 * q * numel) if round_up else math.floor(.01 * q * numel + 0.5)
+        k = min(max(k, 1), numel)
+        hist_cumsum = hist.cumsum(0)
+        bin_idx = int(torch.searchsorted(hist_cumsum, torch.tensor(k, device=hist.device)))
+        count_before = hist_cumsum[bin_idx] - hist[bin_idx]
+        # Interpolate linearly within the bin
+        fraction = (k - count_before) / hist[bin_idx]
+        return hist_edges[bin_idx] + fraction * (hist_edges[bin_idx + 1] - hist_edges[bin_idx])
+
+    def mse_threshold(self, hist, hist_edges):
+        bit_width = self.bit_width_impl()
+        max_q = max_int(self.signed, False, bit_width)
+        min_q = -max_q if self.signed else torch.zeros_like(max_q)
+        centers = (hist_edges[:-1] + hist_edges[1:]) / 2
+        # One candidate for every bin edge of the positive half of the histogram
+        candidates = hist_edges[self.num_bins // 2 + 1:].unsqueeze(1)
+        scale = candidates / max_q
+        quant_centers = torch.clamp(torch.round(centers / scale), min_q, max_q) * scale
+        loss = (hist.float() * (centers - quant_centers) ** 2).sum(dim=1)
+        return candidates[torch.argmin(loss), 0]
+
+    def compute_threshold(self):
+        if self.hist is None:
+            raise RuntimeError("No stats have been collected.")
+        hist_edges = torch.linspace(
+            -self.range, self.range, self.num_bins + 1, device=self.hist.device)
+        if self.method == 'percentile':
+            if self.low_q is None:
+                # Fold the histogram over the absolute value
+                half = self.num_bins // 2
+                abs_hist = self.hist[half:] + self.hist[:half].flip(0)
+                threshold = self.percentile(abs_hist, hist_edges[half:], self.high_q, False)
+            else:
+                low = self.percentile(self.hist, hist_edges, self.low_q, True)
+                high = self.percentile(self.hist, hist_edges, self.high_q, False)
+                threshold = torch.abs(high - torch.clamp(low, max=0.))
+        elif self.method == 'mse':
+            threshold = self.mse_threshold(self.hist, hist_edges)
+        else:
+            kl_minimizer = KLMinimizerThreshold(self.signed, self.bit_width_impl)
+            threshold = kl_minimizer.threshold_from_histogram(self.hist, hist_edges)
+        return threshold
+
+
 class L1Norm(brevitas.jit.ScriptModule):
     """ScriptModule implementation to collect per-channel L1 normalization stats
     for weight normalization-based quantization."""
@@ -433,17 +595,21 @@ class L2Norm(brevitas.jit.ScriptModule):
             return x.norm(p=2, dim=self.stats_reduce_dim, keepdim=True)
 
 
-def _set_local_loss_mode(module, enabled):
-    for m in module.modules():
-        if hasattr(m, 'local_loss_mode'):
-            m.local_loss_mode = enabled
-
-
 class MSE(torch.nn.Module):
     # References:
     # https://github.com/cornell-zhang/dnn-quant-ocs/blob/master/distiller/quantization/clip.py
     # https://github.com/wimh966/outlier_suppression/blob/main/quant_transformer/quantization/observer.py
 
+    """
+    Search for the statistic that minimizes the MSE between the input and its quantized version.
+
+    Args:
+        mse_max_batch_numel (Optional, int): If specified, multiple candidates are evaluated
+            with a single forward pass of the proxy, stacked along a new leading dimension.
+            Candidates are split in chunks so that each quantized batch has at most this many
+            elements. Otherwise candidates are evaluated one at a time. Default: None
+    """
+
     def __init__(
             self,
             proxy_module,
@@ -451,20 +617,34 @@ class MSE(torch.nn.Module):
             inner_stats_input_view_shape_impl: torch.nn.Module,
             stats_reduce_dim: Optional[int] = None,
             mse_search_method: str = 'fibonacci',
-            mse_iters: int = 20):
+            mse_iters: int = 20,
+            mse_max_batch_numel: Optional[int] = None):
         super(MSE, self).__init__()
         self.mse_init_op = mse_init_op
         self.input_view_shape_impl = inner_stats_input_view_shape_impl
         self.proxy_forward = proxy_module.forward
-        self.set_local_loss_mode = lambda enabled: _set_local_loss_mode(proxy_module, enabled)
+        # Submodules of the proxy to switch to local loss mode, collected on first use
+        self.local_loss_modules = None
+        self.collect_local_loss_modules = lambda: [
+            m for m in proxy_module.modules() if hasattr(m, 'local_loss_mode')]
         self.internal_candidate = None
         self.num = mse_iters
         self.search_method = mse_search_method
         self.stats_reduce_dim = stats_reduce_dim
+        self.mse_max_batch_numel = mse_max_batch_numel
         self.local_loss_mode: bool = False
 
+    def set_local_loss_mode(self, enabled):
+        if self.local_loss_modules is None:
+            self.local_loss_modules = self.collect_local_loss_modules()
+        for m in self.local_loss_modules:
+            m.local_loss_mode = enabled
+
     def mse_loss_fn(self, x, quant_value):
-        loss = torch.nn.functional.mse_loss(x, quant_value, reduction='none')
+        # Squared errors of float16 and bfloat16 inputs are accumulated in float32, where they
+        # don't overflow or lose the differences between candidates
+        loss = torch.nn.functional.mse_loss(
+            x.to(torch.float32), quant_value.to(torch.float32), reduction='none')
         if self.stats_reduce_dim is not None:
             # stats_reduce_dim applies to the permuted and reshaped tensor
             loss = self.input_view_shape_impl(loss)
@@ -473,23 +653,31 @@ class MSE(torch.nn.Module):
             loss = torch.sum(loss)
         return loss
 
-    def evaluate_loss(self, x, candidate):
-        self.internal_candidate = candidate
-        # Set to local_loss_mode before calling the proxy
-        self.set_local_loss_mode(True)
-        quant_value = self.proxy_forward(x)
-        if isinstance(quant_value, tuple):
-            quant_value = quant_value[0]
-        loss = self.mse_loss_fn(x, quant_value)
-        self.set_local_loss_mode(False)
-        return loss
+    def evaluate_loss(self, x, candidates):
+        """
+        Compute the loss of each of the candidates stacked along the first dimension.
+        Expects the proxy to be in local loss mode.
+        """
+        if self.mse_max_batch_numel is None:
+            batch_size = 1
+        else:
+            batch_size = max(self.mse_max_batch_numel // x.numel(), 1)
+        loss = []
+        for candidate in torch.split(candidates, batch_size):
+            self.internal_candidate = candidate
+            quant_value = self.proxy_forward(x)
+            if isinstance(quant_value, tuple):
+                quant_value = quant_value[0]
+            quant_value = _unpack_quant_tensor(quant_value)
+            quant_value = quant_value.reshape((-1,) + x.shape)
+            loss.extend(self.mse_loss_fn(x, q) for q in quant_value)
+        return torch.stack(loss)
 
     def mse_grid_search(self, xl, x):
-        best_loss = torch.tensor(float('inf'), device=x.device, dtype=x.dtype)
+        best_loss = torch.tensor(float('inf'), device=x.device, dtype=torch.float32)
         best_candidate = xl
-        for i in range(2, self.num + 1):
-            candidate = (xl * i).detach()
-            loss = self.evaluate_loss(x, candidate)
+        candidates = torch.stack([(xl * i).detach() for i in range(2, self.num + 1)])
+        for candidate, loss in zip(candidates, self.evaluate_loss(x, candidates)):
             best_candidate = torch.where(loss < best_loss, candidate, best_candidate)
             best_loss = torch.min(loss, best_loss)
         return best_candidate
@@ -513,7 +701,7 @@ class MSE(torch.nn.Module):
         for i in range(2, self.num + 1):
             x1 = torch.where(Li > L0 / 2, xr - Li, xl + Li)
             x2 = torch.where(Li > L0 / 2, xl + Li, xr - Li)
-            f1, f2 = self.evaluate_loss(x, x1), self.evaluate_loss(x, x2)
+            f1, f2 = self.evaluate_loss(x, torch.stack([x1, x2]))
             xr = torch.where(f1 <= f2, x2, xr)
             xl = torch.where(f1 >= f2, x1, xl)
             Li = (F[self.num - i] / F[self.num - (i - 2)]) * torch.where(f1 != f2, L0, xr - xl)
@@ -524,12 +712,17 @@ class MSE(torch.nn.Module):
         x_view = self.input_view_shape_impl(x)
         init = self.mse_init_op(x_view).detach()
         base = init / self.num
-        if self.search_method == 'grid':
-            best_candidate = self.mse_grid_search(base, x)
-        elif self.search_method == 'fibonacci':
-            best_candidate = self.mse_fib_search(base, init, x)
-        else:
+        if self.search_method not in ('grid', 'fibonacci'):
             raise ValueError(f"Search method {self.search_method} not supported.")
+        # Set to local_loss_mode before calling the proxy
+        self.set_local_loss_mode(True)
+        try:
+            if self.search_method == 'grid':
+                best_candidate = self.mse_grid_search(base, x)
+            else:
+                best_candidate = self.mse_fib_search(base, init, x)
+        finally:
+            self.set_local_loss_mode(False)
         # Save for evaluation by other modules (e.g. zp) invoking local loss mode
         self.internal_candidate = best_candidate
         return best_candidate
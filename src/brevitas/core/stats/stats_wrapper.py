@@ -1,6 +1,7 @@
 # Copyright (C) 2023, Advanced Micro Devices, Inc. All rights reserved.
 # SPDX-License-Identifier: BSD-3-Clause
 
+import math
 from typing import List, Optional, Tuple
 
 import torch
@@ -11,6 +12,7 @@ import brevitas
 import brevitas.config as config
 from brevitas.core.utils import inplace_momentum_update
 from brevitas.core.utils import inplace_tensor_mul
+from brevitas.function.shape import over_stacked_broadcast
 
 from .view_wrapper import _ViewCatParameterWrapper
 from .view_wrapper import _ViewParameterWrapper
@@ -20,17 +22,23 @@ SCALAR_SHAPE = ()
 
 
 class _Stats(brevitas.jit.ScriptModule):
-    __constants__ = ['stats_output_shape']
+    __constants__ = ['stats_output_shape', 'stats_output_numel']
 
     def __init__(self, stats_impl: nn.Module, stats_output_shape: Tuple[int, ...]) -> None:
         super(_Stats, self).__init__()
         self.stats_output_shape = stats_output_shape
+        self.stats_output_numel = math.prod(stats_output_shape)
+        self.stats_output_shape_list = brevitas.jit.Attribute(list(stats_output_shape), List[int])
         self.stats_impl = stats_impl
 
     @brevitas.jit.script_method
     def forward(self, input: Tensor) -> Tensor:
         stats = self.stats_impl(input)
-        stats = stats.view(self.stats_output_shape)
+        if stats.numel() > self.stats_output_numel:
+            # Multiple stats stacked along a leading dimension, e.g. by a batched MSE search
+            stats = stats.view(over_stacked_broadcast(input, self.stats_output_shape_list))
+        else:
+            stats = stats.view(self.stats_output_shape)
         return stats
 
 
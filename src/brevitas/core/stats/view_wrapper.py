@@ -35,7 +35,8 @@ class _ViewParameterWrapper(brevitas.jit.ScriptModule):
         output_dict = super(_ViewParameterWrapper, self).state_dict(
             destination=destination, prefix=prefix, keep_vars=keep_vars)
         if not config._FULL_STATE_DICT:
-            del output_dict[prefix + 'parameter']
+            # The parameter is dropped when it's not tracked anymore, e.g. by packed layers
+            output_dict.pop(prefix + 'parameter', None)
         return output_dict
 
 
@@ -65,5 +66,6 @@ class _ViewCatParameterWrapper(brevitas.jit.ScriptModule):
         output_dict = super(_ViewCatParameterWrapper, self).state_dict(
             destination=destination, prefix=prefix, keep_vars=keep_vars)
         if not config._FULL_STATE_DICT:
-            del output_dict[prefix + 'parameter']
+            # The parameter is dropped when it's not tracked anymore, e.g. by packed layers
+            output_dict.pop(prefix + 'parameter', None)
         return output_dict
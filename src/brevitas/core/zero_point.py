@@ -14,6 +14,7 @@ from brevitas.core.stats import _ParameterListStats
 from brevitas.core.stats import DEFAULT_MOMENTUM
 from brevitas.core.stats import SCALAR_SHAPE
 from brevitas.function import abs_binary_sign_grad
+from brevitas.function.shape import over_stacked_broadcast
 
 from .utils import inplace_momentum_update
 from .utils import inplace_tensor_add
@@ -105,6 +106,7 @@ class ParameterFromRuntimeZeroPoint(brevitas.jit.ScriptModule):
         self.collect_stats_steps = brevitas.jit.Attribute(collect_stats_steps, int)
         self.counter: int = brevitas.jit.Attribute(0, int)
         self.zero_point_shape = zero_point_shape
+        self.zero_point_shape_list = brevitas.jit.Attribute(list(zero_point_shape), List[int])
         self.stats_input_view_shape_impl = zero_point_stats_input_view_shape_impl
         self.momentum: Optional[float] = brevitas.jit.Attribute(
             zero_point_stats_momentum, Optional[float])
@@ -120,9 +122,10 @@ class ParameterFromRuntimeZeroPoint(brevitas.jit.ScriptModule):
         if self.counter < self.collect_stats_steps:
             stats_input = self.stats_input_view_shape_impl(x)
             stats = self.zero_point_stats_impl(stats_input)
-            stats = stats.view(self.zero_point_shape)
             if self.local_loss_mode:
-                return stats
+                # Keep the leading dimension of candidates stacked by a batched MSE search
+                return stats.view(over_stacked_broadcast(stats_input, self.zero_point_shape_list))
+            stats = stats.view(self.zero_point_shape)
             new_counter = self.counter + 1
             if self.counter == 0:
                 inplace_tensor_add(self.buffer, stats.detach())
@@ -3,6 +3,7 @@
  */
 
 
+#include <ATen/ExpandUtils.h>
 #include <ATen/TensorUtils.h>
 #include <torch/extension.h>
 
@@ -194,6 +195,103 @@ class AbsBinarySignGradFn : public torch::autograd::Function<AbsBinarySignGradFn
 };
 
 
+bool can_update_inplace(const Tensor& output, const Tensor& other) {
+  return output.sizes() == at::infer_size(output.sizes(), other.sizes())
+    && at::result_type(output, other) == output.scalar_type();
+}
+
+
+Tensor inplace_add(Tensor output, const Tensor& other) {
+  return can_update_inplace(output, other) ? output.add_(other) : at::add(output, other);
+}
+
+
+Tensor inplace_sub(Tensor output, const Tensor& other) {
+  return can_update_inplace(output, other) ? output.sub_(other) : at::sub(output, other);
+}
+
+
+Tensor inplace_mul(Tensor output, const Tensor& other) {
+  return can_update_inplace(output, other) ? output.mul_(other) : at::mul(output, other);
+}
+
+
+Tensor inplace_clamp(Tensor output, const Tensor& min_val, const Tensor& max_val) {
+  if (can_update_inplace(output, min_val) && can_update_inplace(output, max_val)) {
+    at::min_out(output, output, max_val);
+    at::max_out(output, output, min_val);
+    return output;
+  }
+  output = at::where(output > max_val, max_val.type_as(output), output);
+  return at::where(output < min_val, min_val.type_as(output), output);
+}
+
+
+Tensor reduce_to_shape(const Tensor& grad, const Tensor& t) {
+  return at::sum_to(grad, t.sizes()).type_as(t);
+}
+
+
+class IntQuantSteFn : public torch::autograd::Function<IntQuantSteFn> {
+ public:
+
+  static Tensor forward(
+    AutogradContext* ctx,
+    Tensor input,
+    Tensor scale,
+    Tensor zero_point,
+    Tensor min_val,
+    Tensor max_val,
+    bool ste_clamp){
+    ctx->save_for_backward({input, scale, zero_point, min_val, max_val});
+    ctx->saved_data["ste_clamp"] = ste_clamp;
+    Tensor output = at::div(input, scale);
+    output = inplace_add(output, zero_point);
+    output.round_();
+    output = inplace_clamp(output, min_val, max_val);
+    output = inplace_sub(output, zero_point);
+    output = inplace_mul(output, scale);
+    return output;
+  };
+
+  static tensor_list backward(AutogradContext* ctx, tensor_list grad_output) {
+    auto saved = ctx->get_saved_variables();
+    Tensor input = saved[0];
+    Tensor scale = saved[1];
+    Tensor zero_point = saved[2];
+    Tensor min_val = saved[3];
+    Tensor max_val = saved[4];
+    bool ste_clamp = ctx->saved_data["ste_clamp"].toBool();
+    Tensor grad = grad_output[0];
+    Tensor grad_input, grad_scale, grad_zero_point;
+    // Recompute the quantization, updating in place the few intermediates that are needed
+    Tensor y = inplace_add(at::div(input, scale), zero_point);
+    Tensor y_int = at::round(y);
+    if (ste_clamp) {
+      grad_input = grad;
+      // The gradient w.r.t. zero_point cancels out when both round and clamp are STE
+      grad_zero_point = at::zeros_like(zero_point);
+    } else {
+      // The clamp lets the gradient through to its input where it doesn't saturate
+      Tensor mask = at::logical_and(y_int >= min_val, y_int <= max_val);
+      grad_input = grad * mask;
+      grad_zero_point = (grad * scale).masked_fill_(mask, 0.).neg_();
+      // (y_int - y) where the clamp is not saturated, (y_int - zero_point) where it is
+      y = at::where(mask, y, zero_point.type_as(y));
+    }
+    y_int = inplace_clamp(y_int, min_val, max_val);
+    grad_scale = inplace_mul(inplace_sub(y_int, y), grad);
+    return {
+      reduce_to_shape(grad_input, input),
+      reduce_to_shape(grad_scale, scale),
+      reduce_to_shape(grad_zero_point, zero_point),
+      Tensor(),
+      Tensor(),
+      Tensor()};
+  }
+};
+
+
 Tensor ceil_ste_impl(const Tensor& input) {
  return CeilSteFn::apply(input);
 };
@@ -254,6 +352,16 @@ Tensor abs_binary_sign_grad_impl(const Tensor& input) {
 };
 
 
+Tensor int_quant_ste_impl(
+  const Tensor& input,
+  const Tensor& scale,
+  const Tensor& zero_point,
+  const Tensor& min_val,
+  const Tensor& max_val,
+  const bool ste_clamp) {
+ return IntQuantSteFn::apply(input, scale, zero_point, min_val, max_val, ste_clamp);
+};
+
 
 TORCH_LIBRARY(autograd_ste_ops, m) {
     m.def("round_ste_impl", &round_ste_impl);
@@ -268,4 +376,5 @@ TORCH_LIBRARY(autograd_ste_ops, m) {
     m.def("round_to_zero_ste_impl", &round_to_zero_ste_impl);
     m.def("dpu_round_ste_impl", &dpu_round_ste_impl);
     m.def("abs_binary_sign_grad_impl", &abs_binary_sign_grad_impl);
+    m.def("int_quant_ste_impl", &int_quant_ste_impl);
 }
@@ -127,6 +127,25 @@ def identity(x: Tensor) -> Tensor:
     return x
 
 
+@brevitas.jit.script
+def is_low_precision_float(x: Tensor) -> bool:
+    """
+    Check whether a tensor is float16 or bfloat16, which represent integers exactly only up to
+    2048 and 256 respectively.
+
+    Args:
+        x (Tensor): Input Tensor
+
+    Returns:
+        bool: Whether the dtype of x is float16 or bfloat16.
+
+    Examples:
+        >>> is_low_precision_float(torch.tensor(1.7, dtype=torch.bfloat16))
+        True
+    """
+    return x.dtype == torch.float16 or x.dtype == torch.bfloat16
+
+
 @brevitas.jit.script
 def max_int(signed: bool, narrow_range: bool, bit_width: Tensor) -> Tensor:
     """ Compute the maximum integer representable by a given number of bits.
@@ -217,3 +236,60 @@ def get_upper_bound_on_l1_norm(
     max_accumulator_mag = pow(2., max_accumulator_bit_width - 1.) - 1.  # 2^{P-1}-1
     max_input_mag_inverse = pow(2., input_is_signed - input_bit_width)
     return max_accumulator_mag * max_input_mag_inverse
+
+
+def pack_uint(x: Tensor, bit_width: int) -> Tensor:
+    """Pack unsigned integers of ``bit_width`` bits each into a flat uint8 tensor, filling every
+    byte from its least significant bit. Sub-byte values can straddle two bytes (e.g. at 3 bits)
+    and the last byte is zero-padded.
+
+    Args:
+        x (Tensor): input tensor of integers in [0, 2 ** bit_width).
+        bit_width (int): number of bits of each value, between 1 and 8.
+
+    Returns:
+        Tensor: 1D uint8 tensor of ``ceil(x.numel() * bit_width / 8)`` elements.
+
+    Examples:
+        >>> pack_uint(torch.tensor([1, 2, 3]), bit_width=4)
+        tensor([33,  3], dtype=torch.uint8)
+    """
+    assert 1 <= bit_width <= 8, "Packing requires a bit-width between 1 and 8."
+    x = x.reshape(-1).to(torch.uint8)
+    if 8 % bit_width == 0:
+        # Values never straddle two bytes, shift them into place directly
+        values_per_byte = 8 // bit_width
+        x = torch.nn.functional.pad(x, (0, (-x.numel()) % values_per_byte))
+        shifts = torch.arange(0, 8, bit_width, dtype=torch.uint8, device=x.device)
+        return (x.view(-1, values_per_byte) << shifts).sum(dim=-1, dtype=torch.uint8)
+    bit_shifts = torch.arange(bit_width, dtype=torch.uint8, device=x.device)
+    bits = ((x.unsqueeze(-1) >> bit_shifts) & 1).view(-1)
+    bits = torch.nn.functional.pad(bits, (0, (-bits.numel()) % 8))
+    byte_shifts = torch.arange(8, dtype=torch.uint8, device=x.device)
+    return (bits.view(-1, 8) << byte_shifts).sum(dim=-1, dtype=torch.uint8)
+
+
+def unpack_uint(packed: Tensor, bit_width: int, numel: int) -> Tensor:
+    """Inverse of :func:`pack_uint`.
+
+    Args:
+        packed (Tensor): uint8 tensor returned by :func:`pack_uint`.
+        bit_width (int): number of bits of each value, between 1 and 8.
+        numel (int): number of packed values.
+
+    Returns:
+        Tensor: 1D uint8 tensor of ``numel`` unpacked values.
+
+    Examples:
+        >>> unpack_uint(torch.tensor([33, 3], dtype=torch.uint8), bit_width=4, numel=3)
+        tensor([1, 2, 3], dtype=torch.uint8)
+    """
+    assert 1 <= bit_width <= 8, "Unpacking requires a bit-width between 1 and 8."
+    mask = (1 << bit_width) - 1
+    if 8 % bit_width == 0:
+        shifts = torch.arange(0, 8, bit_width, dtype=torch.uint8, device=packed.device)
+        return ((packed.unsqueeze(-1) >> shifts) & mask).view(-1)[:numel]
+    byte_shifts = torch.arange(8, dtype=torch.uint8, device=packed.device)
+    bits = ((packed.unsqueeze(-1) >> byte_shifts) & 1).view(-1)[:numel * bit_width]
+    bit_shifts = torch.arange(bit_width, dtype=torch.uint8, device=packed.device)
+    return (bits.view(numel, bit_width) << bit_shifts).sum(dim=-1, dtype=torch.uint8)
@@ -33,7 +33,8 @@ __all__ = [
     'ternary_sign_ste',
     'round_to_zero_ste',
     'dpu_round_ste',
-    'abs_binary_sign_grad']
+    'abs_binary_sign_grad',
+    'int_quant_ste']
 
 if brevitas.NATIVE_STE_BACKEND_LOADED:
     fn_prefix = torch
@@ -368,3 +369,42 @@ def abs_binary_sign_grad(x: Tensor) -> Tensor:
     if torch._C._get_tracing_state():
         return torch.abs(x)
     return fn_prefix.ops.autograd_ste_ops.abs_binary_sign_grad_impl(x)
+
+
+@script_flag
+def int_quant_ste(
+        x: Tensor,
+        scale: Tensor,
+        zero_point: Tensor,
+        min_int_val: Tensor,
+        max_int_val: Tensor,
+        ste_clamp: bool) -> Tensor:
+    """
+    Function that implements scale, shifted, uniform integer fake-quantization of x in a single
+    fused op, with a straight-through gradient estimator for the rounding and, when ``ste_clamp``
+    is True, for the clamping. Equivalent to the composition of
+    :func:`~brevitas.function.ops_ste.round_ste` with
+    :func:`~brevitas.function.ops.tensor_clamp` (or
+    :func:`~brevitas.function.ops_ste.tensor_clamp_ste`) implemented by
+    :class:`~brevitas.core.quant.IntQuant`, while allocating a single output tensor.
+
+    Notes:
+        Wrapper for either :func:`~brevitas.ops.autograd_ste_ops.int_quant_ste_impl` (with
+        env ``BREVITAS_JIT=0``) or its native just-in-time compiled variant (with
+        ``BREVITAS_JIT=1``).
+
+    Examples:
+        >>> x = torch.tensor([0.042, -0.053, 0.31, -0.44], requires_grad=True)
+        >>> scale, zero_point = torch.tensor(0.01), torch.tensor(0.)
+        >>> y = int_quant_ste(x, scale, zero_point, torch.tensor(-7.), torch.tensor(7.), False)
+        >>> y
+        tensor([ 0.0400, -0.0500,  0.0700, -0.0700], grad_fn=<IntQuantSteFnBackward>)
+        >>> y.backward(torch.ones_like(y))
+        >>> x.grad
+        tensor([1., 1., 0., 0.])
+    """
+    if torch._C._get_tracing_state():
+        y = tensor_clamp(torch.round(x / scale + zero_point), min_int_val, max_int_val)
+        return (y - zero_point) * scale
+    return fn_prefix.ops.autograd_ste_ops.int_quant_ste_impl(
+        x, scale, zero_point, min_int_val, max_int_val, ste_clamp)
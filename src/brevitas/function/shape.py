@@ -6,7 +6,7 @@ Implementation of various functions to compute shapes that induce flattening alo
 dimensions of a tensor.
 """
 
-from typing import Tuple
+from typing import List, Tuple
 
 from torch import Tensor
 
@@ -17,7 +17,8 @@ __all__ = [
     'over_output_channels',
     'over_batch_over_tensor',
     'over_output_features',
-    'over_batch_over_output_channels']
+    'over_batch_over_output_channels',
+    'over_stacked_broadcast']
 
 
 @brevitas.jit.script
@@ -112,3 +113,28 @@ def over_output_features(x: Tensor):
         (24, 3)
     """
     return -1, x.shape[-1]
+
+
+@brevitas.jit.script
+def over_stacked_broadcast(x: Tensor, shape: List[int]) -> List[int]:
+    """
+    Returns a shape s such that y.view(s) stacks tensors of a given shape along a new leading
+    dimension, while keeping each of them broadcastable with x.
+
+    Args:
+        x (Tensor): Input tensor each of the stacked tensors is broadcast with.
+        shape (List[int]): Shape of each of the stacked tensors.
+
+    Returns:
+        A list containing the stacked shape.
+
+    Examples:
+        >>> over_stacked_broadcast(torch.randn([2, 3, 4, 3]), [3, 1, 1])
+        [-1, 1, 3, 1, 1]
+    """
+    stacked_shape = [-1]
+    for _ in range(x.dim() - len(shape)):
+        stacked_shape.append(1)
+    for s in shape:
+        stacked_shape.append(s)
+    return stacked_shape
@@ -6,5 +6,7 @@ from .calibrate import *
 from .channel_splitting import *
 from .equalize import *
 from .fixed_point import *
+from .inference import *
+from .offload import *
 from .per_input import *
 from .standardize import *
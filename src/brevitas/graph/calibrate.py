@@ -4,10 +4,13 @@
 from abc import ABC
 from copy import deepcopy
 from functools import partial
+import hashlib
+import os
 import sys
 
 import torch
 from torch import nn
+from torch.autograd.profiler import record_function
 import torch.nn.functional as F
 
 from brevitas.nn import QuantHardTanh
@@ -16,6 +19,7 @@ from brevitas.nn.quant_layer import QuantWeightBiasInputOutputLayer as QuantWBIO
 from brevitas.nn.utils import compute_channel_view_shape
 from brevitas.proxy.parameter_quant import BiasQuantProxyFromInjector
 from brevitas.proxy.parameter_quant import WeightQuantProxyFromInjector
+from brevitas.proxy.quant_proxy import QuantProxyFromInjector
 from brevitas.proxy.runtime_quant import ActQuantProxyFromInjector
 from brevitas.proxy.runtime_quant import ClampQuantProxyFromInjector
 from brevitas.proxy.runtime_quant import TruncQuantProxyFromInjector
@@ -24,7 +28,15 @@ from brevitas.quant_tensor import QuantTensor
 from .base import Transform
 
 __all__ = [
-    'ClipFloatWeights', 'DisableEnableQuantization', 'bias_correction_mode', 'calibration_mode']
+    'ClipFloatWeights',
+    'DisableEnableQuantization',
+    'bias_correction_mode',
+    'calibration_mode',
+    'quant_profiling_mode',
+    'CalibrationStatsCache',
+    'calibration_fingerprint',
+    'runtime_stats_state_dict',
+    'load_runtime_stats_state_dict']
 
 _PARAM_PROXIES = (WeightQuantProxyFromInjector, BiasQuantProxyFromInjector)
 
@@ -43,6 +55,18 @@ _LAYERS_TO_CLIP = (
 
 BN_LAYERS = (nn.BatchNorm1d, nn.BatchNorm2d, nn.BatchNorm3d)
 
+# Quant proxies profiled as a stage of the layer they belong to
+_PROFILED_STAGES = ('input_quant', 'act_quant', 'weight_quant', 'bias_quant', 'output_quant')
+
+# Stages of a profiled layer, in execution order
+_PROFILED_STAGES_ORDER = (
+    'forward', 'input_quant', 'act_quant', 'weight_quant', 'bias_quant', 'compute', 'output_quant')
+
+_FINGERPRINT_ATTR_TYPES = (bool, int, float, str, type(None))
+
+# Attributes of runtime stats modules that calibration_mode overrides or updates
+_FINGERPRINT_IGNORED_ATTRS = ('training', 'counter', 'collect_stats_steps', 'momentum')
+
 
 def extend_collect_stats_steps(module):
     if hasattr(module, 'collect_stats_steps'):
@@ -56,8 +80,15 @@ def set_collect_stats_to_average(module):
         module.momentum = None
 
 
+def is_runtime_stats_module(module):
+    return hasattr(module, 'collect_stats_steps') and hasattr(module, 'counter')
+
+
 def finalize_collect_stats(module):
-    if hasattr(module, 'collect_stats_steps') and hasattr(module, 'counter'):
+    if is_runtime_stats_module(module):
+        if hasattr(module, 'finalize_stats'):
+            # Compute the statistics accumulated across batches, e.g. from a histogram
+            module.finalize_stats()
         # If the counter has already reached collect_stats_steps, we do not want to reset it
         # otherwise the restrict_preprocess might be applied twice: during calibration
         # (that happens in training mode) and then when the model is evaluated
@@ -85,6 +116,157 @@ class calibration_mode:
             self.model, is_training=self.previous_training_state, quantization_enabled=True)
 
 
+def _update_fingerprint(hasher, obj, hash_tensors=True):
+    if isinstance(obj, torch.Tensor):
+        hasher.update(f'{obj.dtype}{tuple(obj.shape)}'.encode())
+        if hash_tensors:
+            obj = obj.detach().cpu().contiguous()
+            hasher.update(obj.reshape(-1).view(torch.uint8).numpy().tobytes())
+    elif isinstance(obj, dict):
+        for k, v in obj.items():
+            _update_fingerprint(hasher, k, hash_tensors)
+            _update_fingerprint(hasher, v, hash_tensors)
+    elif isinstance(obj, (list, tuple)):
+        hasher.update(f'{type(obj).__name__}{len(obj)}'.encode())
+        for v in obj:
+            _update_fingerprint(hasher, v, hash_tensors)
+    else:
+        hasher.update(repr(obj).encode())
+
+
+def _is_fingerprint_attr(name, value):
+    if name.startswith('_') or name in _FINGERPRINT_IGNORED_ATTRS:
+        return False
+    if isinstance(value, tuple):
+        return all(isinstance(v, _FINGERPRINT_ATTR_TYPES) for v in value)
+    return isinstance(value, _FINGERPRINT_ATTR_TYPES)
+
+
+def _update_act_quant_fingerprint(hasher, prefix, act_quant):
+    for name, module in act_quant.named_modules(prefix=prefix):
+        hasher.update(f'{name}:{type(module).__qualname__}'.encode())
+        attrs = {k: v for k, v in vars(module).items() if _is_fingerprint_attr(k, v)}
+        _update_fingerprint(hasher, sorted(attrs.items()))
+        # The parameters of runtime stats modules are what the calibration computes
+        if not is_runtime_stats_module(module):
+            _update_fingerprint(hasher, dict(module.named_parameters(recurse=False)))
+        _update_fingerprint(hasher, dict(module.named_buffers(recurse=False)))
+
+
+def calibration_fingerprint(model, *calibration_data, hash_parameters=False):
+    """
+    Compute a key identifying the outcome of calibrating ``model`` with :class:`calibration_mode`.
+
+    Since calibration runs with quantization disabled, the statistics collected depend only on the
+    float parameters and buffers of the model, on the configuration of its activation quantizers,
+    and on the calibration data. Weight and bias quantizers are not part of the fingerprint.
+
+    By default, the parameters and buffers of the model outside of its quantizers are identified by
+    their name, shape and dtype only, so that the fingerprint is cheap to compute and doesn't load
+    offloaded or meta-device parameters. Set ``hash_parameters`` when the same model can be
+    calibrated with different float values.
+
+    Args:
+        model (nn.Module): quantized model to be calibrated.
+        *calibration_data: tensors, or nested lists/tuples/dicts of tensors, making up the
+            calibration set. Any other object, e.g. a string describing a dataset, is hashed
+            through its repr.
+        hash_parameters (bool): if True, hash the contents of the parameters and buffers of the
+            model outside of its quantizers too. Default: False
+
+    Returns:
+        str: hex digest of the fingerprint.
+    """
+    hasher = hashlib.sha256()
+    quant_proxy_prefixes = tuple(
+        name + '.' for name,
+        module in model.named_modules() if isinstance(module, QuantProxyFromInjector))
+    for name, tensor in list(model.named_parameters()) + list(model.named_buffers()):
+        if not name.startswith(quant_proxy_prefixes):
+            _update_fingerprint(hasher, name)
+            _update_fingerprint(hasher, tensor, hash_parameters)
+    for name, module in model.named_modules():
+        if isinstance(module, ActQuantProxyFromInjector):
+            _update_act_quant_fingerprint(hasher, name, module)
+    _update_fingerprint(hasher, calibration_data)
+    return hasher.hexdigest()
+
+
+def runtime_stats_state_dict(model):
+    """
+    Return the statistics collected by the runtime stats modules of ``model`` (e.g.
+    ``ParameterFromRuntimeStatsScaling`` and ``ParameterFromRuntimeZeroPoint``), keyed as in
+    ``model.state_dict()``.
+    """
+    state_dict = {}
+    for name, module in model.named_modules():
+        if is_runtime_stats_module(module):
+            for k, v in module.state_dict(prefix=name + '.').items():
+                state_dict[k] = v.detach().cpu()
+    return state_dict
+
+
+def load_runtime_stats_state_dict(model, state_dict):
+    """
+    Load statistics returned by :func:`runtime_stats_state_dict` into ``model``. Runtime stats
+    modules that receive a value stop collecting statistics, as after calibration.
+    """
+    for name, module in model.named_modules():
+        if is_runtime_stats_module(module):
+            prefix = name + '.'
+            module_state_dict = {
+                k[len(prefix):]: v for k, v in state_dict.items() if k.startswith(prefix)}
+            if module_state_dict:
+                module.load_state_dict(module_state_dict, strict=False)
+
+
+class CalibrationStatsCache:
+    """
+    On-disk cache of the activation statistics collected with :class:`calibration_mode`, so that
+    repeated runs that differ only in how weights are quantized can skip activation calibration.
+
+    Args:
+        cache_dir (str): directory where the statistics are stored, one file per fingerprint.
+        hash_parameters (bool): if True, fingerprints hash the contents of the parameters and
+            buffers of the model too, see :func:`calibration_fingerprint`. Default: False
+
+    Examples:
+        >>> cache = CalibrationStatsCache('calibration_cache')
+        >>> key = cache.fingerprint(model, calibration_data)
+        >>> if not cache.load(model, key):
+        ...     with calibration_mode(model):
+        ...         for x in calibration_data:
+        ...             model(x)
+        ...     cache.save(model, key)
+    """
+
+    def __init__(self, cache_dir, hash_parameters=False):
+        self.cache_dir = cache_dir
+        self.hash_parameters = hash_parameters
+
+    def fingerprint(self, model, *calibration_data):
+        return calibration_fingerprint(
+            model, *calibration_data, hash_parameters=self.hash_parameters)
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.pt')
+
+    def load(self, model, key):
+        path = self.path(key)
+        if not os.path.isfile(path):
+            return False
+        load_runtime_stats_state_dict(model, torch.load(path, map_location='cpu'))
+        return True
+
+    def save(self, model, key):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path(key)
+        # Write to a temporary file first, so that concurrent runs never read a partial file
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        torch.save(runtime_stats_state_dict(model), tmp_path)
+        os.replace(tmp_path, path)
+
+
 class bias_correction_mode:
 
     def __init__(self, model, enabled=True):
@@ -103,6 +285,197 @@ class bias_correction_mode:
             hook.remove()
 
 
+class quant_profiling_mode:
+    """
+    Context manager that profiles the forward passes of ``model`` run within it with
+    ``torch.profiler``, breaking down each quantized layer into stages: input, activation, weight,
+    bias and output quantization, and the float compute of the layer. Each stage is recorded as a
+    ``<layer name>/<stage>`` range, and the whole forward pass of the layer as
+    ``<layer name>/forward``, so they also show up in the exported Chrome trace.
+
+    Timings include the overhead of the profiler, so they are best compared with each other rather
+    than taken in absolute terms. Memory is the net amount allocated within each range, as reported
+    by the profiler.
+
+    Examples:
+        >>> with torch.no_grad(), quant_profiling_mode(model) as profiler:
+        ...     model(inp)
+        >>> print(profiler.table())
+        >>> profiler.export_chrome_trace('trace.json')
+    """
+
+    def __init__(
+            self, model, enabled=True, activities=None, profile_memory=True, record_shapes=False):
+        self.model = model
+        self.enabled = enabled
+        if activities is None:
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+        self.activities = activities
+        self.profile_memory = profile_memory
+        self.record_shapes = record_shapes
+        self.profiler = None
+        self.layer_names = []
+        self.hooks = []
+        self.wrapped_layers = []
+        self.open_ranges = []
+        self.layer_stack = []
+
+    def __enter__(self):
+        if self.enabled:
+            self.register_hooks()
+            self.profiler = torch.profiler.profile(
+                activities=self.activities,
+                profile_memory=self.profile_memory,
+                record_shapes=self.record_shapes)
+            self.profiler.__enter__()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if self.enabled:
+            # Ranges are left open if the forward pass raised
+            while self.open_ranges:
+                self.close_range()
+            self.layer_stack = []
+            self.profiler.__exit__(type, value, traceback)
+            self.remove_hooks()
+
+    def open_range(self, name):
+        profiled_range = record_function(name)
+        profiled_range.__enter__()
+        self.open_ranges.append(profiled_range)
+
+    def close_range(self):
+        if self.open_ranges:
+            self.open_ranges.pop().__exit__(None, None, None)
+
+    def layer_pre_hook(self, module, inp, name):
+        self.layer_stack.append(name)
+        self.open_range(f'{name}/forward')
+
+    def layer_hook(self, module, inp, output):
+        self.close_range()
+        self.layer_stack.pop()
+
+    def stage_pre_hook(self, module, inp, owner_name, stage):
+        # A proxy shared across layers is attributed to the layer currently running
+        layer_name = self.layer_stack[-1] if self.layer_stack else owner_name
+        self.open_range(f'{layer_name}/{stage}')
+
+    def stage_hook(self, module, inp, output):
+        self.close_range()
+
+    def wrap_compute(self, module, name):
+        compute_impl = module.quant_inner_forward_impl
+
+        def profiled_compute_impl(*args, **kwargs):
+            self.open_range(f'{name}/compute')
+            try:
+                return compute_impl(*args, **kwargs)
+            finally:
+                self.close_range()
+
+        # Shadow the method on the instance, it's restored by deleting the attribute
+        module.quant_inner_forward_impl = profiled_compute_impl
+        self.wrapped_layers.append(module)
+
+    def register_hooks(self):
+        profiled_proxies = set()
+        for name, module in self.model.named_modules():
+            proxies = [(stage, module._modules[stage])
+                       for stage in _PROFILED_STAGES
+                       if isinstance(module._modules.get(stage), QuantProxyFromInjector)]
+            if not proxies:
+                continue
+            name = name or type(module).__name__
+            self.layer_names.append(name)
+            self.hooks.append(
+                module.register_forward_pre_hook(partial(self.layer_pre_hook, name=name)))
+            self.hooks.append(module.register_forward_hook(self.layer_hook))
+            for stage, proxy in proxies:
+                if proxy in profiled_proxies:
+                    continue
+                profiled_proxies.add(proxy)
+                self.hooks.append(
+                    proxy.register_forward_pre_hook(
+                        partial(self.stage_pre_hook, owner_name=name, stage=stage)))
+                self.hooks.append(proxy.register_forward_hook(self.stage_hook))
+            if isinstance(module, QuantWBIOL):
+                self.wrap_compute(module, name)
+
+    def remove_hooks(self):
+        for hook in self.hooks:
+            hook.remove()
+        self.hooks = []
+        for module in self.wrapped_layers:
+            del module.quant_inner_forward_impl
+        self.wrapped_layers = []
+
+    def stats(self):
+        """
+        Return a dict mapping each ``(layer name, stage)`` pair that was run to its number of calls,
+        total CPU and device time in microseconds and net CPU and device memory allocated in bytes.
+        Layers are in module order.
+        """
+        events = {event.key: event for event in self.profiler.key_averages()}
+        stats = {}
+        for layer_name in self.layer_names:
+            for stage in _PROFILED_STAGES_ORDER:
+                event = events.get(f'{layer_name}/{stage}')
+                if event is None:
+                    continue
+                stats[(layer_name, stage)] = {
+                    'calls': event.count,
+                    'cpu_time_total': event.cpu_time_total,
+                    'device_time_total': getattr(event, 'cuda_time_total', 0),
+                    'cpu_memory_usage': event.cpu_memory_usage,
+                    'device_memory_usage': getattr(event, 'cuda_memory_usage', 0)}
+        return stats
+
+    def table(self, sort_by=None, row_limit=None):
+        """
+        Format :meth:`stats` as a table, with the share of each stage in the forward pass of its
+        layer. Rows are in module order, unless ``sort_by`` names a stats key to sort by in
+        descending order.
+        """
+        stats = self.stats()
+        rows = list(stats.items())
+        if sort_by is not None:
+            rows = sorted(rows, key=lambda row: row[1][sort_by], reverse=True)
+        if row_limit is not None:
+            rows = rows[:row_limit]
+        show_device = any(s['device_time_total'] for s in stats.values())
+        layer_width = max([len('Layer')] + [len(layer_name) for (layer_name, _), _ in rows])
+        header = f"{'Layer':<{layer_width}}  {'Stage':<12}{'Calls':>8}{'CPU total':>13}{'CPU avg':>12}"
+        if show_device:
+            header += f"{'Device total':>15}"
+        header += f"{'% forward':>11}{'CPU mem':>12}"
+        lines = [header, '-' * len(header)]
+        for (layer_name, stage), s in rows:
+            forward = stats.get((layer_name, 'forward'))
+            share = 100. * s['cpu_time_total'] / max(forward['cpu_time_total'], 1e-9)
+            line = (
+                f"{layer_name:<{layer_width}}  {stage:<12}{s['calls']:>8}"
+                f"{s['cpu_time_total'] / 1e3:>11.3f}ms{s['cpu_time_total'] / s['calls']:>10.1f}us")
+            if show_device:
+                line += f"{s['device_time_total'] / 1e3:>13.3f}ms"
+            line += f"{share:>10.1f}%{_format_bytes(s['cpu_memory_usage']):>12}"
+            lines.append(line)
+        return '\n'.join(lines)
+
+    def export_chrome_trace(self, path):
+        self.profiler.export_chrome_trace(path)
+
+
+def _format_bytes(num_bytes):
+    for unit in ('B', 'KB', 'MB'):
+        if abs(num_bytes) < 1024:
+            return f'{num_bytes:.0f}{unit}' if unit == 'B' else f'{num_bytes:.1f}{unit}'
+        num_bytes /= 1024
+    return f'{num_bytes:.1f}GB'
+
+
 class ClipFloatWeights(Transform):
 
     def __init__(self, threshold=15., layers_to_clip=_LAYERS_TO_CLIP) -> None:
@@ -246,11 +619,16 @@ class _BiasCorrection(DisableEnableQuantization):
         for name, module in model.named_modules():
             if name in self.correction_map.keys():
                 correction = self.correction_map[name] / self.iterations[name]
+                # If a module has `allocate_params` attribute, we must load the weights following that method
+                if hasattr(module, 'allocate_params'):
+                    module.allocate_params(module)
                 if module.bias is not None:
                     module.bias.data += correction
                 else:
                     module.register_parameter(
                         'bias', nn.Parameter(correction).to(module.weight.device))
+                if hasattr(module, 'offload_params'):
+                    module.offload_params(module)
 
     def compute_correct_bias(self, module, inp, name):
         inp = self.unpack_input(inp)
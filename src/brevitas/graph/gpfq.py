@@ -1,7 +1,10 @@
 # Copyright (C) 2023, Advanced Micro Devices, Inc. All rights reserved.
 # SPDX-License-Identifier: BSD-3-Clause
 
+from contextlib import contextmanager
+from contextlib import nullcontext
 from copy import deepcopy
+import math
 from typing import Callable, List, Optional
 
 import numpy as np
@@ -38,6 +41,12 @@ class gpfq_mode(gpxq_mode):
         accumulator_bit_width (Optional, int): The target accumulator bit width. Default: None
         a2q_layer_filter_fnc (Optional, callable): An optional lambda function to filter layers for
             accumulator cosntraints. Should return True for layers to constrain. Default: `lambda x: True`
+        num_workers (int): Number of threads used to update the layers of a group of parallel layers
+            concurrently. Layers sharing a weight quantizer are always updated sequentially, so
+            results do not depend on the number of workers. Default: 1
+        num_blocks (int): The number of sub-blocks to use to speed-up GPFQ computation. Default: 100
+        accumulator_dtype (torch.dtype): The dtype used to accumulate the Gram matrices of the float
+            and quantized inputs. Default: torch.float32
 
     Example:
         >>> with torch.no_grad():
@@ -62,7 +71,10 @@ class gpfq_mode(gpxq_mode):
             act_order: bool = False,
             use_gpfa2q: bool = False,
             accumulator_bit_width: Optional[int] = None,
-            a2q_layer_filter_fnc: Optional[Callable[[nn.Module], bool]] = lambda x: True) -> None:
+            a2q_layer_filter_fnc: Optional[Callable[[nn.Module], bool]] = lambda x: True,
+            num_workers: int = 1,
+            num_blocks: int = 100,
+            accumulator_dtype: torch.dtype = torch.float32) -> None:
         if not inplace:
             model = deepcopy(model)
         super().__init__(
@@ -72,38 +84,52 @@ class gpfq_mode(gpxq_mode):
             create_weight_orig,
             use_quant_activations,
             act_order,
-            return_forward_output)
+            return_forward_output,
+            accumulator_dtype=accumulator_dtype,
+            num_workers=num_workers)
 
         self.p = p
+        self.num_blocks = num_blocks
 
         # GPFA2Q params
         self.use_gpfa2q = use_gpfa2q
         self.accumulator_bit_width = accumulator_bit_width
         self.a2q_layer_filter_fnc = a2q_layer_filter_fnc  # returns true when to use GPFA2Q
 
-    def catch_stopfwd(self, *args, **kwargs):
-        # Collect quant input
-        try:
-            self.orig_forward(*args, **kwargs)
-        except StopFwdException:
-            pass
-
+    @contextmanager
+    def disable_quantization(self):
         # Disable quantization
         self.disable_quant_inference.disable_param_quantization(self.model, is_training=False)
         self.disable_quant_inference.disable_act_quantization(self.model, is_training=False)
-        # Collect float input
+        try:
+            yield
+        finally:
+            # Re-enable quantization. If activation quantization is disabled,
+            # we also disable bias quantization
+            self.disable_quant_inference.enable_param_quantization(self.model, is_training=False)
+            if self.use_quant_activations:
+                self.disable_quant_inference.enable_act_quantization(self.model, is_training=False)
+            else:
+                self.disable_quant_inference.disable_bias_quantization(
+                    self.model, is_training=False)
+
+    def forward_contexts(self):
+        # Collect both quant and float input
+        return [nullcontext, self.disable_quantization]
+
+    def catch_stopfwd(self, *args, **kwargs):
+        # Collect quant input
         try:
             self.orig_forward(*args, **kwargs)
         except StopFwdException:
             pass
 
-        # Re-enable quantization. If activation quantization is disabled,
-        # we also disable bias quantization
-        self.disable_quant_inference.enable_param_quantization(self.model, is_training=False)
-        if self.use_quant_activations:
-            self.disable_quant_inference.enable_act_quantization(self.model, is_training=False)
-        else:
-            self.disable_quant_inference.disable_bias_quantization(self.model, is_training=False)
+        # Collect float input
+        with self.disable_quantization():
+            try:
+                self.orig_forward(*args, **kwargs)
+            except StopFwdException:
+                pass
 
         if self.return_forward_output:
             # If we want to return the output of the network, we need to disable all hooks
@@ -123,7 +149,9 @@ class gpfq_mode(gpxq_mode):
                 act_order=act_order,
                 len_parallel_layers=len_parallel_layers,
                 create_weight_orig=create_weight_orig,
-                p=self.p)
+                p=self.p,
+                num_blocks=self.num_blocks,
+                accumulator_dtype=self.accumulator_dtype)
         else:
             return GPFA2Q(
                 layer=layer,
@@ -132,20 +160,50 @@ class gpfq_mode(gpxq_mode):
                 len_parallel_layers=len_parallel_layers,
                 create_weight_orig=create_weight_orig,
                 p=self.p,
-                accumulator_bit_width=self.accumulator_bit_width)
+                accumulator_bit_width=self.accumulator_bit_width,
+                num_blocks=self.num_blocks,
+                accumulator_dtype=self.accumulator_dtype)
 
 
 class GPFQ(GPxQ):
     """
     Based on https://github.com/YixuanSeanZhou/Quantized_Neural_Nets/tree/main
-    """
 
-    def __init__(self, layer, name, act_order, len_parallel_layers, create_weight_orig, p) -> None:
+    Rather than storing the float and quantized inputs of every sample, only their Gram matrices
+    are accumulated, and columns are processed in blocks of matrix products.
+    """
 
-        super().__init__(layer, name, act_order, len_parallel_layers, create_weight_orig)
+    def __init__(
+            self,
+            layer,
+            name,
+            act_order,
+            len_parallel_layers,
+            create_weight_orig,
+            p,
+            num_blocks=100,
+            accumulator_dtype=torch.float32) -> None:
 
-        self.float_input = None
-        self.quantized_input = None
+        super().__init__(
+            layer,
+            name,
+            act_order,
+            len_parallel_layers,
+            create_weight_orig,
+            accumulator_dtype=accumulator_dtype)
+
+        # Define how many columns to update in each mini-block
+        self.blocksize = math.ceil(self.columns / num_blocks)
+
+        # Quantized inputs waiting for the float inputs of the same samples
+        self.pending_quantized_input = []
+        # Gram matrices of the quantized input with itself and with the float input
+        self.H = torch.zeros((self.groups, self.columns, self.columns),
+                             device='cpu',
+                             dtype=self.accumulator_dtype)
+        self.G = torch.zeros((self.groups, self.columns, self.columns),
+                             device='cpu',
+                             dtype=self.accumulator_dtype)
         self.index_computed = False
         self.p = p
 
@@ -210,16 +268,15 @@ class GPFQ(GPxQ):
                 inp_processed.append(inp)
             inp_processed = torch.stack(inp_processed)
 
+        inp_processed = inp_processed.to(self.accumulator_dtype)  # [groups, samples, IC/groups]
         if is_quant_disabled:
-            if self.float_input is None:
-                self.float_input = inp_processed
-            else:
-                self.float_input = torch.cat([self.float_input, inp_processed], dim=1)
+            # Quantized and float inputs are collected in the same order,
+            # so the oldest quantized input belongs to the same samples
+            quantized_input = self.pending_quantized_input.pop(0)
+            self.G += inp_processed.transpose(2, 1).bmm(quantized_input).to(self.G.device)
         else:
-            if self.quantized_input is None:
-                self.quantized_input = inp_processed
-            else:
-                self.quantized_input = torch.cat([self.quantized_input, inp_processed], dim=1)
+            self.H += inp_processed.transpose(2, 1).bmm(inp_processed).to(self.H.device)
+            self.pending_quantized_input.append(inp_processed)
         # If we are executing GPFQ with group of parallel layers, we keep track of how many forward
         # we executed. Once we executed as many as the number of parallel_layers, we raise
         # StopFwdException
@@ -228,57 +285,72 @@ class GPFQ(GPxQ):
             current_layer.forward_count = 0
             raise StopFwdException
 
+    def constrain_q_arg(self, q_arg):
+        return q_arg
+
+    def update_constraint(self, q):
+        pass
+
     def single_layer_update(self):
-        weight = self.layer.weight.data
+        """
+        For each column t, following the chosen order, GPFQ computes
+        q_arg_t = (sum_{s <= t} w_s <x_s, x~_t> - sum_{s < t} q_s <x~_s, x~_t>) / <x~_t, x~_t>
+        where w, q are the float and quantized columns of the weight, and x, x~ are the float and
+        quantized inputs of each column. The float term is computed for all columns with a single
+        matrix product, while the quantized term is accumulated block by block.
+        """
+        if hasattr(self.layer, 'allocate_params'):
+            self.layer.allocate_params(self.layer)
+        weight = self.grouped_weight()  # [groups, OC/groups, IC/groups]
         dev = weight.device
         dtype = weight.dtype
-        if isinstance(self.layer, SUPPORTED_CONV_OP):
-            if isinstance(self.layer, (qnn.QuantConvTranspose1d, qnn.QuantConvTranspose2d)):
-                weight = weight.transpose(1, 0)  # This performs a view
-            weight = weight.flatten(1)
-        weight = weight.view(self.groups, -1, weight.shape[-1])  # [Groups, OC/Groups, IC]
-        U = torch.zeros(
-            weight.shape[0], weight.shape[1], self.float_input.shape[1], device=dev, dtype=dtype)
-        self.float_input = self.float_input.to(dev)
-        self.quantized_input = self.quantized_input.to(dev)
-        # We don't need full Hessian, we just need the diagonal
-        self.H_diag = self.quantized_input.transpose(2, 1).square().sum(
-            2)  # summing over Batch dimension
-        permutation_list = []
-        for group_index in range(self.groups):
-            if self.act_order:
-                # Re-order Hessian_diagonal so that weights associated to
-                # higher magnitude activations are quantized first
-                perm = torch.argsort(self.H_diag[group_index, :], descending=True)
-            else:
-                # No permutation, permutation tensor is a ordered index
-                perm = torch.tensor(range(weight.shape[-1]), device=dev)
-            permutation_list.append(perm)
-        for t in range(weight.shape[-1]):
-            for group_index in range(self.groups):
-                U[group_index] += torch.matmul(
-                    weight[group_index, :, permutation_list[group_index][t]].unsqueeze(1),
-                    self.float_input[group_index, :, permutation_list[group_index][t]].unsqueeze(
-                        0))  #[OC/Groups, 1] * [1, INSHAPE[1]]
-                norm = torch.linalg.norm(
-                    self.quantized_input[group_index, :, permutation_list[group_index][t]], 2) ** 2
-                if norm > 0:
-                    q_arg = U[group_index].matmul(
-                        self.quantized_input[group_index, :,
-                                             permutation_list[group_index][t]]) / norm
-                else:
-                    q_arg = torch.zeros_like(U[group_index, :, 0])
-
-                weight[group_index, :, permutation_list[group_index][t]] = q_arg
-            q = self.get_quant_weights(t, 0, permutation_list)
-            for group_index in range(self.groups):
-                U[group_index] -= torch.matmul(
-                    q[group_index].unsqueeze(1),
-                    self.quantized_input[group_index, :,
-                                         permutation_list[group_index][t]].unsqueeze(0))
-
-        del self.float_input
-        del self.quantized_input
+        G = self.G.to(device=dev, dtype=torch.float32)
+        H = self.H.to(device=dev, dtype=torch.float32)
+        del self.G, self.H, self.pending_quantized_input
+
+        if self.act_order:
+            # Re-order Hessian_diagonal so that weights associated to
+            # higher magnitude activations are quantized first
+            perm = torch.argsort(torch.diagonal(H, dim1=1, dim2=2), dim=-1, descending=True)
+        else:
+            # No permutation, permutation tensor is a ordered index
+            perm = torch.arange(self.columns, device=dev).expand(self.groups, -1)
+        permutation_list = list(perm.unbind(0))
+        rows = weight.shape[1]
+
+        def permuted_index(start, end):
+            return perm[:, start:end].unsqueeze(1).expand(-1, rows, -1)
+
+        # Permute the weights and both dimensions of the Gram matrices
+        float_weight = weight.gather(2, permuted_index(0, self.columns)).to(torch.float32)
+        H = H.gather(1, perm.unsqueeze(2).expand(-1, -1, self.columns))
+        H = H.gather(2, perm.unsqueeze(1).expand(-1, self.columns, -1))
+        G = G.gather(1, perm.unsqueeze(2).expand(-1, -1, self.columns))
+        G = G.gather(2, perm.unsqueeze(1).expand(-1, self.columns, -1))
+        norm = torch.diagonal(H, dim1=1, dim2=2)  # [groups, IC/groups]
+        is_norm_positive = norm > 0
+        norm = torch.where(is_norm_positive, norm, torch.ones_like(norm))
+
+        float_term = float_weight.bmm(G.triu())  # [groups, OC/groups, IC/groups]
+        del G
+        quant_weight = torch.zeros_like(float_weight)
+        for i1 in range(0, self.columns, self.blocksize):
+            i2 = min(i1 + self.blocksize, self.columns)
+            # Contribution of the columns quantized in the previous blocks
+            quant_term = quant_weight[:, :, :i1].bmm(H[:, :i1, i1:i2])  # [groups, OC/groups, i2-i1]
+            for i in range(i2 - i1):
+                t = i1 + i
+                q_arg = (float_term[:, :, t] - quant_term[:, :, i]) / norm[:, t:t + 1]
+                q_arg = q_arg * is_norm_positive[:, t:t + 1]
+                q_arg = self.constrain_q_arg(q_arg)
+                weight.scatter_(2, permuted_index(t, t + 1), q_arg.unsqueeze(2).to(dtype))
+                self.write_back_grouped_weight(weight)
+                q = self.get_quant_weights(t, 0, permutation_list)  # [groups, OC/groups]
+                self.update_constraint(q)
+                quant_weight[:, :, t] = q
+                quant_term[:, :, i + 1:] += q.unsqueeze(2) * H[:, t, t + 1:i2].unsqueeze(1)
+        if hasattr(self.layer, 'offload_params'):
+            self.layer.offload_params(self.layer)
 
 
 class GPFA2Q(GPFQ):
@@ -291,7 +363,9 @@ class GPFA2Q(GPFQ):
             len_parallel_layers,
             create_weight_orig,
             accumulator_bit_width,
-            p) -> None:
+            p,
+            num_blocks=100,
+            accumulator_dtype=torch.float32) -> None:
         GPFQ.__init__(
             self,
             layer=layer,
@@ -299,80 +373,38 @@ class GPFA2Q(GPFQ):
             act_order=act_order,
             len_parallel_layers=len_parallel_layers,
             create_weight_orig=create_weight_orig,
-            p=p)
+            p=p,
+            num_blocks=num_blocks,
+            accumulator_dtype=accumulator_dtype)
         self.accumulator_bit_width = accumulator_bit_width
         assert self.accumulator_bit_width is not None
         self.requires_quant_input = True  # force true
 
+    def constrain_q_arg(self, q_arg):
+        max_q_arg = self.s * torch.clamp_min(self.T - self.z, 0.)
+        return q_arg.sign() * torch.clamp_max(q_arg.abs(), max_q_arg)
+
+    def update_constraint(self, q):
+        self.z += q.abs() / self.s  # increment cumulative l1-norm
+
     def single_layer_update(self):
         # raise error in case no quant-input is here
         if self.quant_input is None:
             raise ValueError(
                 'Expected quant input to calculate L1-norm upper bound, but received None')
-        weight = self.layer.weight.data
-        dev = weight.device
-        dtype = weight.dtype
-        if isinstance(self.layer, SUPPORTED_CONV_OP):
-            if isinstance(self.layer, (qnn.QuantConvTranspose1d, qnn.QuantConvTranspose2d)):
-                weight = weight.transpose(1, 0)  # This performs a view
-            weight = weight.flatten(1)
-        weight = weight.view(self.groups, -1, weight.shape[-1])  # [Groups, OC/Groups, IC]
-        U = torch.zeros(
-            weight.shape[0], weight.shape[1], self.float_input.shape[1], device=dev, dtype=dtype)
-        self.float_input = self.float_input.to(dev)
-        self.quantized_input = self.quantized_input.to(dev)
+        if hasattr(self.layer, 'allocate_params'):
+            self.layer.allocate_params(self.layer)
+        weight = self.grouped_weight()
 
         # get upper bound
         input_bit_width = self.quant_input.bit_width
         input_is_signed = self.quant_input.signed
-        T = get_upper_bound_on_l1_norm(
+        self.T = get_upper_bound_on_l1_norm(
             torch.tensor(self.accumulator_bit_width), input_bit_width, input_is_signed)
-        s = self.layer.quant_weight_scale()
-        s = s.view(self.groups, -1)  # [Groups, OC/Groups]
+        self.s = self.layer.quant_weight_scale()
+        self.s = self.s.view(self.groups, -1)  # [Groups, OC/Groups]
 
         # initialize cumulative l1-norm
-        z = torch.zeros(weight.shape[:-1], device=dev)
-
-        # We don't need full Hessian, we just need the diagonal
-        self.H_diag = self.quantized_input.transpose(2, 1).square().sum(
-            2)  # summing over Batch dimension
-        permutation_list = []
-        for group_index in range(self.groups):
-            if self.act_order:
-                # Re-order Hessian_diagonal so that weights associated to
-                # higher magnitude activations are quantized first
-                perm = torch.argsort(self.H_diag[group_index, :], descending=True)
-            else:
-                # No permutation, permutation tensor is a ordered index
-                perm = torch.tensor(range(weight.shape[-1]), device=dev)
-            permutation_list.append(perm)
-
-        for t in range(weight.shape[-1]):
-            for group_index in range(self.groups):
-                U[group_index] += torch.matmul(
-                    weight[group_index, :, permutation_list[group_index][t]].unsqueeze(1),
-                    self.float_input[group_index, :, permutation_list[group_index][t]].unsqueeze(
-                        0))  #[OC/Groups, 1] * [1, INSHAPE[1]]
-                norm = torch.linalg.norm(
-                    self.quantized_input[group_index, :, permutation_list[group_index][t]], 2) ** 2
-                if norm > 0:
-                    q_arg = U[group_index].matmul(
-                        self.quantized_input[group_index, :,
-                                             permutation_list[group_index][t]]) / norm
-                else:
-                    q_arg = torch.zeros_like(U[group_index, :, 0])
-
-                max_q_arg = s[group_index, :] * torch.clamp_min(T - z[group_index, :], 0.)
-                q_arg = q_arg.sign() * torch.clamp_max(q_arg.abs(), max_q_arg)
-                weight[group_index, :, permutation_list[group_index][t]] = q_arg
-            q = self.get_quant_weights(t, 0, permutation_list)
-            z += q.abs() / s  # increment cumulative l1-norm
-
-            for group_index in range(self.groups):
-                U[group_index] -= torch.matmul(
-                    q[group_index].unsqueeze(1),
-                    self.quantized_input[group_index, :,
-                                         permutation_list[group_index][t]].unsqueeze(0))
-
-        del self.float_input
-        del self.quantized_input
+        self.z = torch.zeros(weight.shape[:-1], device=weight.device)
+
+        super().single_layer_update()
@@ -12,8 +12,9 @@ try:
     from torch.linalg import LinAlgError
 except:
     LinAlgError = RuntimeError
-import unfoldNd
+from packaging import version
 
+from brevitas import torch_version
 from brevitas.graph.gpxq import GPxQ
 from brevitas.graph.gpxq import gpxq_mode
 from brevitas.graph.gpxq import StopFwdException
@@ -21,6 +22,13 @@ from brevitas.graph.gpxq import SUPPORTED_CONV_OP
 import brevitas.nn as qnn
 
 
+def _cholesky_inverse(x):
+    # Batched cholesky_inverse is supported starting from PyTorch 1.13
+    if torch_version >= version.parse('1.13'):
+        return torch.cholesky_inverse(x)
+    return torch.stack([torch.cholesky_inverse(x_i) for x_i in x])
+
+
 class gptq_mode(gpxq_mode):
     """
     Apply GPTQ algorithm https://arxiv.org/abs/2210.17323.
@@ -36,8 +44,21 @@ class gptq_mode(gpxq_mode):
             GPTQ. Default: False
         num_blocks (int): The number of sub-blocks to use to speed-up GPTQ computation. Default: 100
         act_order (bool): Whether to order greedy path following by Hessian approximation. Default: False
+        lazy_weight_update (bool): If True, update a pre-permuted float32 copy of the weights in-place
+            and write each block back to the layer once it has been processed, which is faster on
+            CPU. Weight quantizers that compute their scale from the current weights observe the
+            not yet processed columns of the active block before their update, so the resulting
+            weights can differ slightly from the default mode. Default: False
         return_forward_output (bool): If True, returns the output of the forward pass. Otherwise the
             forward call inside the context manager returns None. Default: False
+        input_chunk_size (Optional, int): If specified, the Hessian is accumulated over chunks of
+            roughly this many input vectors, split along the spatial dimension, so that peak memory
+            does not depend on the size of the input. Default: None
+        accumulator_dtype (torch.dtype): The dtype of the Hessian accumulator. The Hessian is
+            upcast to float32 to compute its inverse, unless it is float64. Default: torch.float32
+        num_workers (int): Number of threads used to update the layers of a group of parallel layers
+            concurrently. Layers sharing a weight quantizer are always updated sequentially, so
+            results do not depend on the number of workers. Default: 1
 
     Example:
         >>> with torch.no_grad():
@@ -59,7 +80,11 @@ class gptq_mode(gpxq_mode):
             use_quant_activations: bool = True,
             num_blocks: int = 100,
             return_forward_output: bool = False,
-            act_order: bool = False) -> None:
+            act_order: bool = False,
+            lazy_weight_update: bool = False,
+            input_chunk_size: Optional[int] = None,
+            accumulator_dtype: torch.dtype = torch.float32,
+            num_workers: int = 1) -> None:
         if not inplace:
             model = deepcopy(model)
         super().__init__(
@@ -69,10 +94,14 @@ class gptq_mode(gpxq_mode):
             create_weight_orig,
             use_quant_activations,
             act_order,
-            return_forward_output)
+            return_forward_output,
+            input_chunk_size,
+            accumulator_dtype,
+            num_workers)
 
         # How many subblock to use during GPTQ for each layer
         self.num_blocks = num_blocks
+        self.lazy_weight_update = lazy_weight_update
 
     def catch_stopfwd(self, *args, **kwargs):
         try:
@@ -97,7 +126,10 @@ class gptq_mode(gpxq_mode):
             act_order=act_order,
             len_parallel_layers=len_parallel_layers,
             create_weight_orig=create_weight_orig,
-            num_blocks=self.num_blocks)
+            num_blocks=self.num_blocks,
+            lazy_weight_update=self.lazy_weight_update,
+            input_chunk_size=self.input_chunk_size,
+            accumulator_dtype=self.accumulator_dtype)
 
 
 class GPTQ(GPxQ):
@@ -120,17 +152,33 @@ class GPTQ(GPxQ):
     """
 
     def __init__(
-            self, layer, name, act_order, len_parallel_layers, create_weight_orig,
-            num_blocks) -> None:
-        super().__init__(layer, name, act_order, len_parallel_layers, create_weight_orig)
+            self,
+            layer,
+            name,
+            act_order,
+            len_parallel_layers,
+            create_weight_orig,
+            num_blocks,
+            lazy_weight_update=False,
+            input_chunk_size=None,
+            accumulator_dtype=torch.float32) -> None:
+        super().__init__(
+            layer,
+            name,
+            act_order,
+            len_parallel_layers,
+            create_weight_orig,
+            input_chunk_size,
+            accumulator_dtype)
+        self.lazy_weight_update = lazy_weight_update
 
         # Define how many columns to update in each mini-block
         self.blocksize = math.ceil(self.columns / num_blocks)
 
-        # Initialize Hessian matrix and counter. We need it in float32 to compute the inverse
+        # Initialize Hessian matrix and counter
         self.H = torch.zeros((self.groups, self.columns, self.columns),
                              device='cpu',
-                             dtype=torch.float32)
+                             dtype=self.accumulator_dtype)
         self.nsamples = 0
 
     def update_batch(self, module, input, current_layer):
@@ -142,43 +190,12 @@ class GPTQ(GPxQ):
         inp = self.process_input(input)
         batch_size = inp.shape[0]
 
-        # Preprocess the input to compute the Hessian
-        if isinstance(self.layer, qnn.QuantLinear):
-            if len(inp.shape) > 2:
-                inp = inp.reshape((-1, sum(inp.shape[2:])))
-            inp = inp.t()
-            # For QuantLinear layer, groups will be 1
-            inp_processed = inp.unsqueeze(0)
-
-        if isinstance(self.layer, SUPPORTED_CONV_OP):
-            # Pick the correct unfoldNd class
-            if isinstance(self.layer, (qnn.QuantConvTranspose1d, qnn.QuantConvTranspose2d)):
-                unfold_impl = unfoldNd.UnfoldTransposeNd
-            else:
-                unfold_impl = unfoldNd.UnfoldNd
-
-            unfold = unfold_impl(
-                self.layer.kernel_size,
-                dilation=self.layer.dilation,
-                padding=self.layer.padding,
-                stride=self.layer.stride)
-
-            # Split input based on how many groups in convolution
-            inp_by_group = torch.chunk(inp, self.groups, 1)
-            inp_processed = []
-            # Preprocess input by group
-            for i, inp in enumerate(inp_by_group):
-                inp = unfold(inp)
-                inp = inp.transpose(1, 0)
-                inp = inp.flatten(1)
-                inp_processed.append(inp)
-            inp_processed = torch.stack(inp_processed)
-
-        # Hessian computation
+        # Hessian computation, accumulated over chunks of the unfolded input
         self.H *= self.nsamples / (self.nsamples + batch_size)
         self.nsamples += batch_size
-        inp_processed = math.sqrt(2 / self.nsamples) * inp_processed.to(torch.float32)
-        self.H += (inp_processed.bmm(inp_processed.transpose(2, 1))).to(self.H.device)
+        for inp_processed in self.unfold_input(inp):
+            inp_processed = math.sqrt(2 / self.nsamples) * inp_processed.to(self.H.dtype)
+            self.H += (inp_processed.bmm(inp_processed.transpose(2, 1))).to(self.H.device)
         # If we are executing GPTQ with group of parallel layers, we keep track of how many forward
         # we executed. Once we executed as many as the number of parallel_layers, we raise
         # StopFwdException
@@ -198,46 +215,43 @@ class GPTQ(GPxQ):
         # When the weights are updated, we cast everything back to the original dtype
         dtype = weight.dtype
 
-        if isinstance(self.layer, SUPPORTED_CONV_OP):
-            if isinstance(self.layer, (qnn.QuantConvTranspose1d, qnn.QuantConvTranspose2d)):
-                weight = weight.transpose(1, 0)  # This performs a view
-            weight = weight.flatten(1)
+        weight = self.grouped_weight()  # [groups, OC/groups, IC/groups]
+
+        # We need the Hessian at least in float32 to compute the inverse
+        if self.H.dtype != torch.float64:
+            self.H = self.H.to(torch.float32)
 
         # List with permutation tensors for the Hessian and Weight matrix.
         # If act_order is False, the tensors will be ordered indexes.
         # For groupwise convolution, we have one tensor per group,
         # thus len(permutation_list) is always equal to self.groups.
-        # We do not explicity permute the weight matrix, only the Hessian.
-        permutation_list = []
-        weight = weight.view(self.groups, -1, weight.shape[-1])
-        # For groupwise convolution, these operations are groupwise so we iterate
-        for i in range(self.groups):
-            # If a diagonal element on the Hessian is zero, we can set to 0 the corresponding
-            # column in the weight matrix.
-            # The diagonal element is set to 1 to avoid division-by-zero
-            dead = torch.diag(self.H[i, :, :]) == 0
-            self.H[i, dead, dead] = 1
-            # If the diagonal of activations is zero, we set the weight to zero
-            weight[i, :, dead] = 0
-            if self.act_order:
-                # Re-order Hessian so that weights associated to
-                # higher magnitude activations are quantized first
-                perm = torch.argsort(torch.diag(self.H[i, :, :]), descending=True)
-                self.H[i, :, :] = self.H[i, perm, :][:, perm]
-            else:
-                # No permutation, permutation tensor is a ordered index
-                perm = torch.tensor(range(self.H.shape[-1]), device=dev)
-            permutation_list.append(perm)
+        # For groupwise convolution, these operations are groupwise and batched across groups.
+        # If a diagonal element on the Hessian is zero, we can set to 0 the corresponding
+        # column in the weight matrix.
+        # The diagonal element is set to 1 to avoid division-by-zero
+        dead = torch.diagonal(self.H, dim1=1, dim2=2) == 0  # [groups, IC/groups]
+        torch.diagonal(self.H, dim1=1, dim2=2)[dead] = 1
+        # If the diagonal of activations is zero, we set the weight to zero
+        weight.masked_fill_(dead.unsqueeze(1).to(dev), 0)
+        if self.act_order:
+            # Re-order Hessian so that weights associated to
+            # higher magnitude activations are quantized first
+            perm = torch.argsort(torch.diagonal(self.H, dim1=1, dim2=2), dim=-1, descending=True)
+            self.H = self.H.gather(1, perm.unsqueeze(2).expand(-1, -1, self.columns))
+            self.H = self.H.gather(2, perm.unsqueeze(1).expand(-1, self.columns, -1))
+        else:
+            # No permutation, permutation tensor is a ordered index
+            perm = torch.arange(self.columns).expand(self.groups, -1)
+        perm = perm.to(dev)  # [groups, IC/groups]
+        permutation_list = list(perm.unbind(0))
 
         # Try/Except in case the inverse Hessian cannot be computed
         try:
-            for i in range(self.groups):
-                damp = percdamp * torch.mean(torch.diag(self.H[i, :, :]))
-                diag = torch.arange(self.columns, device='cpu')
-                self.H[i, diag, diag] += damp
-                self.H[i, :, :] = torch.linalg.cholesky(self.H[i, :, :])
-                self.H[i, :, :] = torch.cholesky_inverse(self.H[i, :, :])
-                self.H[i, :, :] = torch.linalg.cholesky(self.H[i, :, :], upper=True)
+            damp = percdamp * torch.mean(torch.diagonal(self.H, dim1=1, dim2=2), dim=-1)
+            torch.diagonal(self.H, dim1=1, dim2=2).add_(damp.unsqueeze(1))
+            self.H = torch.linalg.cholesky(self.H)
+            self.H = _cholesky_inverse(self.H)
+            self.H = torch.linalg.cholesky(self.H, upper=True)
             h_inv = self.H
         except LinAlgError as e:
             warnings.warn(
@@ -248,31 +262,67 @@ class GPTQ(GPxQ):
         finally:
             del self.H
 
+        # All groups are updated at once, each following its own permutation.
+        # Columns of the layer weights are accessed through gather/scatter on the permutation indexes
+        rows = weight.shape[1]
+
+        def permuted_index(start, end):
+            return perm[:, start:end].unsqueeze(1).expand(-1, rows, -1)
+
+        if self.lazy_weight_update:
+            # Work on a pre-permuted float32 copy of the weights, so that columns are updated
+            # in-place with plain slicing. Only the column being quantized is written back to the
+            # layer, while the rest of the block is written back once it has been processed
+            weight_perm = weight.gather(2, permuted_index(0, self.columns)).to(torch.float32)
+        else:
+            self.write_back_grouped_weight(weight)
+
         for i1 in range(0, self.columns, self.blocksize):
             i2 = min(i1 + self.blocksize, self.columns)
             count = i2 - i1
-            error_block = torch.zeros_like(
-                weight[:, :, perm[i1:i2]], dtype=torch.float32)  # [groups, OC/groups, i2-i1]
+            error_block = torch.zeros((self.groups, rows, count), device=dev,
+                                      dtype=torch.float32)  # [groups, OC/groups, i2-i1]
 
-            h_inv_block = h_inv[:, i1:i2, i1:i2]
+            # Move the inverse Hessian block to the weight device once per block
+            h_inv_block = h_inv[:, i1:i2, i1:i2].to(device=dev, dtype=torch.float32)
             for i in range(count):
-                q_groups = self.get_quant_weights(i, i1, permutation_list)  # [groups, OC/groups]
-                for group_index in range(self.groups):
-                    perm = permutation_list[group_index]
-                    q = q_groups[group_index]  # [OC/groups]
-                    w = weight[group_index, :, perm[i1:i2][i]].to(torch.float32)  # [OC/groups]
-                    d = h_inv_block[group_index, i, i]  # [1]
-                    error = (w - q) / d  # [OC/groups]
-                    error_block[group_index, :, i] = error
+                if self.lazy_weight_update:
+                    weight.scatter_(
+                        2,
+                        permuted_index(i1 + i, i1 + i + 1),
+                        weight_perm[:, :, i1 + i:i1 + i + 1].to(dtype))
+                    self.write_back_grouped_weight(weight, permuted_index(i1 + i, i1 + i + 1))
+                q = self.get_quant_weights(i, i1, permutation_list)  # [groups, OC/groups]
+                d = h_inv_block[:, i, i].unsqueeze(1)  # [groups, 1]
+                if self.lazy_weight_update:
+                    w = weight_perm[:, :, i1 + i]  # [groups, OC/groups]
+                    error = (w - q) / d  # [groups, OC/groups]
+                    weight_perm[:, :, i1 +
+                                i:i2] -= error.unsqueeze(2) * h_inv_block[:, i, i:].unsqueeze(1)
+                else:
+                    index = permuted_index(i1 + i, i2)
+                    w_block = weight.gather(2, index)  # [groups, OC/groups, i2-i1-i]
+                    w = w_block[:, :, 0].to(torch.float32)  # [groups, OC/groups]
+                    error = (w - q) / d  # [groups, OC/groups]
                     # We need to update the original weights
-                    weight[group_index, :, perm[i1:i2][i:]] -= (
-                        error.unsqueeze(1).matmul(
-                            h_inv_block[group_index, i, i:].unsqueeze(0).to(dev))).to(dtype)
-
-            for group_index in range(self.groups):
-                perm = permutation_list[group_index]
-                weight[group_index, :, perm[i2:]] -= (
-                    error_block[group_index].matmul(h_inv[group_index, i1:i2,
-                                                          i2:].to(dev))).to(dtype)
+                    weight.scatter_(
+                        2,
+                        index,
+                        w_block -
+                        (error.unsqueeze(2) * h_inv_block[:, i, i:].unsqueeze(1)).to(dtype))
+                    # Only the remaining columns of the block have changed
+                    self.write_back_grouped_weight(weight, index)
+                error_block[:, :, i] = error
+
+            h_inv_tail = h_inv[:, i1:i2, i2:].to(device=dev, dtype=torch.float32)
+            if self.lazy_weight_update:
+                weight_perm[:, :, i2:] -= error_block.bmm(h_inv_tail)
+                index = permuted_index(i1, self.columns)
+                weight.scatter_(2, index, weight_perm[:, :, i1:].to(dtype))
+            else:
+                index = permuted_index(i2, self.columns)
+                weight.scatter_(
+                    2, index, weight.gather(2, index) - (error_block.bmm(h_inv_tail)).to(dtype))
+            self.write_back_grouped_weight(weight)
         if hasattr(self.layer, 'offload_params'):
             self.layer.offload_params(self.layer)
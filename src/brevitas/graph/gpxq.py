@@ -3,17 +3,27 @@
 
 from abc import ABC
 from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from copy import deepcopy
 from dataclasses import dataclass
 from dataclasses import field
 from functools import partial
+import math
 from operator import attrgetter
-from typing import List, Optional, Set
+import os
+import shutil
+import tempfile
+from typing import Iterable, List, Optional, Set
 import warnings
 
+from packaging import version
 import torch
 from torch.fx import GraphModule as TorchGraphModule
+import torch.nn.functional as F
+import unfoldNd
 
+from brevitas import torch_version
 from brevitas.fx import GraphModule
 from brevitas.graph.calibrate import DisableEnableQuantization
 import brevitas.nn as qnn
@@ -33,6 +43,65 @@ class LayerHandler:
     forward_count: int = 0
 
 
+class ActivationCache:
+    """
+    Store the inputs of a block for each calibration batch. The first positional argument is the
+    activation flowing from block to block, and it can be spilled to disk to save memory. All the
+    other arguments are kept in memory and shared across blocks.
+
+    Args:
+        cache_dir (Optional, str): If specified, activations are stored in a temporary directory
+            created under this path. Default: None
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None) -> None:
+        self.tmp_dir = tempfile.mkdtemp(dir=cache_dir) if cache_dir is not None else None
+        self.inputs = []
+        self.args = []
+        self.kwargs = []
+        self.num_stored = 0
+
+    def store(self, inp):
+        if self.tmp_dir is None:
+            return inp
+        path = os.path.join(self.tmp_dir, f'{self.num_stored}.pt')
+        self.num_stored += 1
+        torch.save(inp, path)
+        return path
+
+    def append(self, inp, args, kwargs):
+        self.inputs.append(self.store(inp))
+        self.args.append(args)
+        self.kwargs.append(kwargs)
+
+    def __setitem__(self, index, inp):
+        # Replace the cached activation, keeping all the other arguments
+        old_inp = self.inputs[index]
+        self.inputs[index] = self.store(inp)
+        if self.tmp_dir is not None:
+            os.remove(old_inp)
+
+    def clear(self):
+        self.inputs.clear()
+        self.args.clear()
+        self.kwargs.clear()
+        if self.tmp_dir is not None:
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def __len__(self):
+        return len(self.inputs)
+
+    def __getitem__(self, index):
+        inp = self.inputs[index]
+        if self.tmp_dir is not None:
+            # Memory map the activation instead of reading it all at once, when supported
+            if torch_version >= version.parse('2.1'):
+                inp = torch.load(inp, mmap=True)
+            else:
+                inp = torch.load(inp)
+        return (inp,) + self.args[index], self.kwargs[index]
+
+
 class gpxq_mode(ABC):
     """
     Apply GPxQ algorithm.
@@ -49,6 +118,14 @@ class gpxq_mode(ABC):
         act_order (bool): Whether to order greedy path following by Hessian approximation. Default: False
         return_forward_output (bool): If True, returns the output of the forward pass. Otherwise the
             forward call inside the context manager returns None. Default: False
+        input_chunk_size (Optional, int): If specified, the unfolded input of each layer is
+            processed in chunks of roughly this many input vectors, split along the spatial
+            dimension, so that peak memory does not depend on the size of the input. Default: None
+        accumulator_dtype (torch.dtype): The dtype used to accumulate statistics over the
+            calibration inputs. Default: torch.float32
+        num_workers (int): Number of threads used to update the layers of a group of parallel layers
+            concurrently. Layers sharing a weight quantizer are always updated sequentially, so
+            results do not depend on the number of workers. Default: 1
 
     Example:
         >>> with torch.no_grad():
@@ -69,7 +146,10 @@ class gpxq_mode(ABC):
             create_weight_orig: bool = True,
             use_quant_activations: bool = True,
             act_order: bool = False,
-            return_forward_output: bool = False) -> None:
+            return_forward_output: bool = False,
+            input_chunk_size: Optional[int] = None,
+            accumulator_dtype: torch.dtype = torch.float32,
+            num_workers: int = 1) -> None:
 
         if not inplace:
             model = deepcopy(model)
@@ -90,6 +170,9 @@ class gpxq_mode(ABC):
 
         self.group_of_parallel_layers = group_of_parallel_layers
         self.return_forward_output = return_forward_output
+        self.input_chunk_size = input_chunk_size
+        self.accumulator_dtype = accumulator_dtype
+        self.num_workers = num_workers
 
         self.orig_forward = self.model.forward
         if isinstance(self.model, (GraphModule, TorchGraphModule)):
@@ -167,11 +250,132 @@ class gpxq_mode(ABC):
                 self.model, is_training=self.model.training)
 
     def update(self):
-        for name in self.current_layer.layer_names:
-            self.gpxq_layers[name].single_layer_update()
+        # Iterate in a fixed order, independently of how the set of names is hashed
+        layer_names = sorted(self.current_layer.layer_names)
+        # Each layer reads its own statistics and writes its own weights, so the updates are
+        # independent unless the layers share the same weight quantizer
+        weight_quants = set(id(self.gpxq_layers[name].layer.weight_quant) for name in layer_names)
+        if self.num_workers > 1 and len(weight_quants) == len(layer_names) > 1:
+            with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+                futures = [
+                    executor.submit(self.gpxq_layers[name].single_layer_update)
+                    for name in layer_names]
+                for future in futures:
+                    future.result()
+        else:
+            for name in layer_names:
+                self.gpxq_layers[name].single_layer_update()
+        for name in layer_names:
             self.hook_dict[name].remove()
         self.current_layer.layer_names.clear()
 
+    def forward_contexts(self):
+        """
+        Contexts under which each calibration input is forwarded. By default, inputs are forwarded
+        once in the current quantization state.
+        """
+        return [nullcontext]
+
+    @staticmethod
+    def _restore_forward(module, forward):
+        if forward is not None:
+            module.forward = forward
+        else:
+            module.__dict__.pop('forward', None)
+
+    def blockwise_update(self, blocks, calib_inputs, cache_dir: Optional[str] = None):
+        """
+        Apply GPxQ sequentially block by block. The inputs of the first block are collected once,
+        then each block is executed only on its cached inputs, both to optimize its layers and to
+        compute the inputs of the next block. The whole calibration set goes through the model
+        roughly once, rather than once per layer.
+
+        Layers outside of the blocks are not optimized. Blocks are expected to be executed in the
+        given order, to take their input activation as first positional argument, and to return
+        it (or a tuple starting with it) as output. All the other arguments of the first block are
+        reused for every block.
+
+        Args:
+            blocks (List[Module]): The sequence of blocks that make up the model.
+            calib_inputs (Iterable): The calibration inputs of the model. Each element is a tensor,
+                a tuple of positional arguments or a dict of keyword arguments.
+            cache_dir (Optional, str): If specified, cached activations are spilled to a temporary
+                directory under this path instead of being kept in memory. Default: None
+
+        Example:
+            >>> with torch.no_grad():
+            >>>     with gptq_mode(model) as gptq:
+            >>>         gptq.blockwise_update(model.model.layers, calib_inputs)
+        """
+        block_layers = [[
+            name for name,
+            gpxq_layer in self.gpxq_layers.items() if any(
+                gpxq_layer.layer is m for m in block.modules())] for block in blocks]
+        outside_layers = set(self.gpxq_layers.keys()).difference(*block_layers)
+        if len(outside_layers) > 0:
+            warnings.warn(
+                f'Layers {sorted(outside_layers)} are outside of the blocks and will be skipped.')
+        for name in outside_layers:
+            self.gpxq_layers[name].disable_pre_forward_hook = True
+
+        # Collect the inputs of the first block, once for every forward context
+        caches = [ActivationCache(cache_dir) for _ in self.forward_contexts()]
+        # The forward of the block might already be overridden at the instance level, e.g. by hooks
+        first_block_forward = blocks[0].__dict__.get('forward')
+
+        def cache_first_block_input(cache, inp, *args, **kwargs):
+            cache.append(inp, args, kwargs)
+            raise StopFwdException
+
+        try:
+            for cache, forward_context in zip(caches, self.forward_contexts()):
+                blocks[0].forward = partial(cache_first_block_input, cache)
+                with forward_context():
+                    for calib_input in calib_inputs:
+                        try:
+                            if isinstance(calib_input, dict):
+                                self.orig_forward(**calib_input)
+                            elif isinstance(calib_input, (tuple, list)):
+                                self.orig_forward(*calib_input)
+                            else:
+                                self.orig_forward(calib_input)
+                        except StopFwdException:
+                            pass
+            self._restore_forward(blocks[0], first_block_forward)
+            for block, layer_names in zip(blocks, block_layers):
+                remaining_layers = set(layer_names)
+                while len(remaining_layers) > 0:
+                    # Each step runs the block up to the first layer left to optimize. Forward
+                    # contexts are interleaved so that the same sample goes through all of them
+                    # before the next one is processed
+                    for i in range(len(caches[0])):
+                        for cache, forward_context in zip(caches, self.forward_contexts()):
+                            with forward_context():
+                                args, kwargs = cache[i]
+                                try:
+                                    block(*args, **kwargs)
+                                except StopFwdException:
+                                    pass
+                    updated_layers = set(self.current_layer.layer_names)
+                    if len(updated_layers) == 0:
+                        # The remaining layers are not executed by the block
+                        break
+                    self.update()
+                    remaining_layers -= updated_layers
+                # Compute the inputs of the next block with the optimized layers
+                for cache, forward_context in zip(caches, self.forward_contexts()):
+                    with forward_context():
+                        for i in range(len(cache)):
+                            args, kwargs = cache[i]
+                            out = block(*args, **kwargs)
+                            cache[i] = out[0] if isinstance(out, (tuple, list)) else out
+        finally:
+            self._restore_forward(blocks[0], first_block_forward)
+            for cache in caches:
+                cache.clear()
+            for name in outside_layers:
+                self.gpxq_layers[name].disable_pre_forward_hook = False
+
     @abstractmethod
     def catch_stopfwd(self, *args, **kwargs):
         pass
@@ -180,15 +384,28 @@ class gpxq_mode(ABC):
 class GPxQ(ABC):
 
     def __init__(
-            self, layer, name, act_order, len_parallel_layers=1, create_weight_orig=True) -> None:
+            self,
+            layer,
+            name,
+            act_order,
+            len_parallel_layers=1,
+            create_weight_orig=True,
+            input_chunk_size=None,
+            accumulator_dtype=torch.float32) -> None:
         self.layer = layer
         self.name = name
         self.act_order = act_order
+        self.input_chunk_size = input_chunk_size
+        self.accumulator_dtype = accumulator_dtype
 
         weight = layer.weight.data
 
         if create_weight_orig and not hasattr(self.layer, 'weight_orig'):
+            if hasattr(self.layer, 'allocate_params'):
+                self.layer.allocate_params(self.layer)
             self.layer.register_buffer('weight_orig', layer.weight.detach().clone())
+            if hasattr(self.layer, 'offload_params'):
+                self.layer.offload_params(self.layer)
 
         # By default, use groups = 1
         self.groups = 1
@@ -273,6 +490,134 @@ class GPxQ(ABC):
             inp = inp.transpose(0, batch_dim)
         return inp
 
+    def unfold_input(self, inp):
+        """
+        Iterate over the input of the layer unfolded into a matrix of shape [groups, IC/groups, N],
+        where each of the N columns is an input vector to the flattened weight matrix.
+        If input_chunk_size is set, the columns are yielded in chunks of roughly that size.
+        Convolutions, including ConvTranspose, are split along the first spatial dimension of their
+        output, and linear layers along the flattened batch dimension.
+        """
+        chunk_size = self.input_chunk_size
+        if isinstance(self.layer, qnn.QuantLinear):
+            if len(inp.shape) > 2:
+                inp = inp.reshape((-1, sum(inp.shape[2:])))
+            # For QuantLinear layer, groups will be 1
+            inp = inp.t().unsqueeze(0)
+            if chunk_size is None:
+                yield inp
+            else:
+                yield from torch.split(inp, chunk_size, dim=-1)
+            return
+
+        def group_unfolded(inp):
+            # [B, IC * kernel_size, L] -> [groups, IC/groups * kernel_size, B * L]
+            batch_size, num_blocks = inp.shape[0], inp.shape[-1]
+            inp = inp.view(batch_size, self.groups, -1, num_blocks)
+            return inp.permute(1, 2, 0, 3).flatten(2)
+
+        kernel_size = self.layer.kernel_size
+        dilation = self.layer.dilation
+        stride = self.layer.stride
+        padding = self.layer.padding
+        if isinstance(self.layer, (qnn.QuantConvTranspose1d, qnn.QuantConvTranspose2d)):
+            if chunk_size is None:
+                unfold = unfoldNd.UnfoldTransposeNd(
+                    kernel_size, dilation=dilation, padding=padding, stride=stride)
+                yield group_unfolded(unfold(inp))
+                return
+            # Unfold slices of rows of the input without padding along the rows, and crop the
+            # output rows that only depend on each slice. Output row o gets input row i through
+            # kernel row j when o = i * stride - padding + j * dilation
+            unfold = unfoldNd.UnfoldTransposeNd(
+                kernel_size, dilation=dilation, padding=(0,) + tuple(padding[1:]), stride=stride)
+            out_shape = [(size - 1) * s - 2 * p + d * (k - 1) + 1 for size,
+                         k,
+                         s,
+                         d,
+                         p in zip(inp.shape[2:], kernel_size, stride, dilation, padding)]
+            vectors_per_row = inp.shape[0] * math.prod(out_shape[1:])
+            rows_per_chunk = max(1, chunk_size // vectors_per_row)
+            k, s, d, p = kernel_size[0], stride[0], dilation[0], padding[0]
+            for row in range(0, out_shape[0], rows_per_chunk):
+                num_rows = min(rows_per_chunk, out_shape[0] - row)
+                # Extra input rows at the boundaries only contribute to cropped output rows
+                first = max(0, (row + p - d * (k - 1)) // s)
+                last = min(inp.shape[2], (row + num_rows - 1 + p) // s + 2)
+                unfolded = unfold(inp.narrow(2, first, last - first))
+                unfolded = unfolded.view(*unfolded.shape[:2], -1, math.prod(out_shape[1:]))
+                unfolded = unfolded.narrow(2, row + p - first * s, num_rows)
+                yield group_unfolded(unfolded.flatten(2))
+        else:
+            # Pad once and unfold overlapping slices of rows of the padded input
+            inp = F.pad(inp, [p for pads in self.explicit_padding()[::-1] for p in pads])
+            unfold = unfoldNd.UnfoldNd(kernel_size, dilation=dilation, stride=stride)
+            if chunk_size is None:
+                yield group_unfolded(unfold(inp))
+                return
+            out_shape = [(size - d * (k - 1) - 1) // s + 1 for size,
+                         k,
+                         s,
+                         d in zip(inp.shape[2:], kernel_size, stride, dilation)]
+            vectors_per_row = inp.shape[0] * math.prod(out_shape[1:])
+            rows_per_chunk = max(1, chunk_size // vectors_per_row)
+            for row in range(0, out_shape[0], rows_per_chunk):
+                num_rows = min(rows_per_chunk, out_shape[0] - row)
+                inp_chunk = inp.narrow(
+                    2,
+                    row * stride[0],
+                    (num_rows - 1) * stride[0] + dilation[0] * (kernel_size[0] - 1) + 1)
+                yield group_unfolded(unfold(inp_chunk))
+
+    def explicit_padding(self):
+        """
+        Return the padding of a convolution as a (left, right) pair per spatial dimension. String
+        padding is resolved as in PyTorch, where 'same' puts the extra element on the right side.
+        """
+        padding = self.layer.padding
+        if padding == 'valid':
+            return [(0, 0)] * len(self.layer.kernel_size)
+        elif padding == 'same':
+            total_padding = [
+                d * (k - 1) for k, d in zip(self.layer.kernel_size, self.layer.dilation)]
+            return [(p // 2, p - p // 2) for p in total_padding]
+        return [(p, p) for p in padding]
+
+    def grouped_weight(self):
+        """
+        Return the weight of the layer as a [groups, OC/groups, IC/groups] matrix, where input
+        channels are flattened together with the kernel dimensions. For ConvTranspose this is a
+        copy, which needs to be written back with write_back_grouped_weight after any update.
+        """
+        weight = self.layer.weight.data
+        if isinstance(self.layer, SUPPORTED_CONV_OP):
+            if isinstance(self.layer, (qnn.QuantConvTranspose1d, qnn.QuantConvTranspose2d)):
+                weight = weight.transpose(1, 0)  # This performs a view
+            weight = weight.flatten(1)
+        return weight.view(self.groups, -1, weight.shape[-1])
+
+    def write_back_grouped_weight(self, weight, index=None):
+        # Flattening the transposed weight of a ConvTranspose creates a copy,
+        # so we need to write it back before quantizing the next column.
+        # If index is specified, only the selected columns of each group are written back
+        if isinstance(self.layer, (qnn.QuantConvTranspose1d, qnn.QuantConvTranspose2d)):
+            layer_weight = self.layer.weight.data
+            if index is None:
+                layer_weight.copy_(weight.view(layer_weight.transpose(1, 0).shape).transpose(1, 0))
+                return
+            # Columns are the flattened input channels and kernel dimensions,
+            # rows are the output channels of all groups
+            groups, rows, _ = index.shape
+            out_index = torch.arange(groups * rows, device=index.device).view(groups, rows, 1)
+            nd_index = []
+            residual_index = index
+            for shape in (layer_weight.shape[:1] + layer_weight.shape[2:])[::-1]:
+                nd_index.append(residual_index % shape)
+                residual_index = residual_index // shape
+            nd_index = nd_index[::-1]
+            nd_index.insert(1, out_index.expand_as(index))
+            layer_weight[tuple(nd_index)] = weight.gather(2, index)
+
     @abstractmethod
     def update_batch(self):
         pass
@@ -294,39 +639,49 @@ class GPxQ(ABC):
                 subtensor_slice_list=subtensor_slice_list,
                 quant_input=self.quant_input).value.unsqueeze(0)  # [1, OC, 1]
         elif isinstance(self.layer, SUPPORTED_CONV_OP):
-            # For depthwise and ConvTranspose we fall back to quantizing the entire martix.
-            # For all other cases, we create a mask that represent the slicing we will perform on the weight matrix
-            # and we quantize only the selected dimensions.
-            if self.groups > 1 or (self.groups == 1 and isinstance(
-                    self.layer, (qnn.QuantConvTranspose1d, qnn.QuantConvTranspose2d))):
-
+            is_conv_transpose = isinstance(
+                self.layer, (qnn.QuantConvTranspose1d, qnn.QuantConvTranspose2d))
+            # With act_order, each group follows its own permutation, so the active columns are not
+            # aligned across groups. Grouped ConvTranspose does not lay out its groups along the
+            # output channels. In both cases we fall back to quantizing the entire matrix.
+            # For all other cases, we create a mask that represent the slicing we will perform on
+            # the weight matrix and we quantize only the selected dimensions.
+            if self.groups > 1 and (self.act_order or is_conv_transpose):
                 quant_weight = self.layer.quant_weight(quant_input=self.quant_input)
                 quant_weight = quant_weight.value
 
-                if isinstance(self.layer, (qnn.QuantConvTranspose1d, qnn.QuantConvTranspose2d)):
+                if is_conv_transpose:
                     quant_weight = quant_weight.transpose(1, 0)  # This performs a view
                 quant_weight = quant_weight.flatten(1)
                 quant_weight = quant_weight.view(self.groups, -1, quant_weight.shape[-1])
 
-                if self.act_order:
-                    for ii, perm in enumerate(permutation_list):
-                        quant_weight[ii, :, :] = quant_weight[ii, :, perm]
-
-                q = quant_weight[:, :, i:i + 1]  # [groups, OC/groups, 1]
+                # Pick the active column of each group according to its own permutation
+                group_index = torch.arange(self.groups, device=quant_weight.device)
+                index = torch.stack(permutation_list)[:, i].to(quant_weight.device)
+                q = quant_weight[group_index, :, index].unsqueeze(2)  # [groups, OC/groups, 1]
             else:
+                # Columns are the flattened input channels and kernel dimensions.
+                # For ConvTranspose, input channels are the first dimension of the weight tensor
                 index = permutation_list[0][i]
-                shapes = self.layer.weight.shape[1:]
+                if is_conv_transpose:
+                    shapes = self.layer.weight.shape[:1] + self.layer.weight.shape[2:]
+                else:
+                    shapes = self.layer.weight.shape[1:]
                 index_2d_to_nd = []
                 residual_index = index.item()
                 for shape in shapes[::-1]:
                     index_2d_to_nd.append((residual_index % shape, residual_index % shape + 1))
                     residual_index = residual_index // shape
                 index_2d_to_nd = index_2d_to_nd[::-1]
-                index_2d_to_nd.insert(0, None)
+                # Keep all the output channels
+                index_2d_to_nd.insert(1 if is_conv_transpose else 0, None)
                 q = self.layer.quant_weight(
-                    subtensor_slice_list=index_2d_to_nd,
-                    quant_input=self.quant_input).value.flatten(1)  # [OC, 1]
-                q = q.unsqueeze(0)  # [1, OC, 1]
+                    subtensor_slice_list=index_2d_to_nd, quant_input=self.quant_input).value
+                if is_conv_transpose:
+                    q = q.transpose(1, 0)  # This performs a view
+                q = q.flatten(1)  # [OC, 1]
+                # For depthwise and grouped convolution, the same column is shared by all groups
+                q = q.view(self.groups, -1, 1)  # [groups, OC/groups, 1]
         # We need to remove the last dim
         q = q.squeeze(2)  # [groups, OC/groups] or [1, OC]
         return q
@@ -0,0 +1,636 @@
+# Copyright (C) 2023, Advanced Micro Devices, Inc. All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+
+from abc import ABC
+from abc import abstractmethod
+from functools import partial
+from typing import Optional
+
+import torch
+from torch import nn
+from torch import Tensor
+
+from brevitas.nn import QuantCat
+from brevitas.nn import QuantConv1d
+from brevitas.nn import QuantConv2d
+from brevitas.nn import QuantDropout
+from brevitas.nn import QuantEltwiseAdd
+from brevitas.nn import QuantLinear
+from brevitas.nn import QuantMaxPool1d
+from brevitas.nn import QuantMaxPool2d
+from brevitas.nn import QuantMultiheadAttention
+from brevitas.nn.mixin import QuantBiasMixin
+from brevitas.nn.mixin import QuantLayerMixin
+from brevitas.nn.mixin import QuantWeightMixin
+from brevitas.nn.mixin.base import QuantRecurrentLayerMixin
+from brevitas.nn.quant_layer import QuantNonLinearActLayer
+from brevitas.nn.quant_layer import QuantWeightBiasInputOutputLayer
+from brevitas.quant_tensor import QuantTensor
+
+__all__ = [
+    'freeze_quant_params',
+    'unfreeze_quant_params',
+    'frozen_inference_mode',
+    'is_int_inference_available',
+    'is_int8_accumulation_exact',
+    'enable_int_inference',
+    'disable_int_inference',
+    'int_inference_mode',
+    'enable_compile_mode',
+    'disable_compile_mode',
+    'compile_mode',
+    'enable_fused_attention',
+    'disable_fused_attention',
+    'fused_attention_mode',
+    'pack_quant_weights',
+    'unpack_quant_weights']
+
+_ONEDNN_INT_OPS = (
+    'qlinear_prepack',
+    'qlinear_pointwise',
+    'qconv_prepack',
+    'qconv1d_pointwise',
+    'qconv2d_pointwise')
+
+
+def _set_freeze_quant_params(module, enabled):
+    if isinstance(module, QuantWeightMixin):
+        module.freeze_quant_weight = enabled
+        module._frozen_quant_weight = None
+    if isinstance(module, QuantBiasMixin):
+        module.freeze_quant_bias = enabled
+        module._frozen_quant_bias = None
+
+
+def freeze_quant_params(model: nn.Module) -> nn.Module:
+    """
+    Cache the quantized weights and biases of every quantized layer in ``model`` on their first
+    forward pass in eval mode, and reuse them in the following ones instead of re-running the
+    weight and bias quantizers.
+
+    A cached value is recomputed whenever the parameter or any parameter or buffer of its
+    quantizer is replaced or updated in-place (e.g. by an optimizer step or by loading a state
+    dict), or when the quantizer is re-initialized. Updates through ``.data`` are not tracked by
+    PyTorch, so they require calling :func:`unfreeze_quant_params` first. Caches keep a copy of
+    each dequantized weight alive alongside the float one.
+    """
+    model.apply(partial(_set_freeze_quant_params, enabled=True))
+    return model
+
+
+def unfreeze_quant_params(model: nn.Module) -> nn.Module:
+    """
+    Disable the caching enabled by :func:`freeze_quant_params` and drop the cached values.
+    """
+    model.apply(partial(_set_freeze_quant_params, enabled=False))
+    return model
+
+
+class frozen_inference_mode:
+    """
+    Context manager that sets ``model`` to eval mode and caches its quantized weights and biases,
+    see :func:`freeze_quant_params`. The training state of the model and its caches are restored
+    on exit.
+
+    Examples:
+        >>> with torch.no_grad(), frozen_inference_mode(model):
+        ...     for x in requests:
+        ...         model(x)
+    """
+
+    def __init__(self, model: nn.Module, enabled: bool = True):
+        self.model = model
+        self.previous_training_state = model.training
+        self.enabled = enabled
+
+    def __enter__(self):
+        if self.enabled:
+            self.previous_training_state = self.model.training
+            self.model.eval()
+            freeze_quant_params(self.model)
+
+    def __exit__(self, type, value, traceback):
+        if self.enabled:
+            unfreeze_quant_params(self.model)
+            self.model.train(self.previous_training_state)
+
+
+def _onednn_op(name):
+    try:
+        return getattr(torch.ops.onednn, name)
+    except (AttributeError, RuntimeError):
+        return None
+
+
+def _fp32_output_kwargs(op):
+    # The arguments controlling the output of oneDNN quantized ops changed across PyTorch releases
+    arg_names = [arg.name for arg in op.default._schema.arguments]
+    kwargs = {'output_zero_point': 0}
+    for name in ('inv_output_scale', 'output_scale'):
+        if name in arg_names:
+            kwargs[name] = 1.0
+    if 'fp32_output' in arg_names:
+        kwargs['fp32_output'] = True
+    else:
+        kwargs['output_dtype'] = torch.float32
+    return kwargs
+
+
+def is_int_inference_available() -> bool:
+    """
+    Return whether the oneDNN quantized CPU kernels required by :func:`enable_int_inference` are
+    available, which is the case from PyTorch 2.1 on x86 builds with oneDNN.
+    """
+    return torch.backends.mkldnn.is_available() and all(
+        _onednn_op(name) is not None for name in _ONEDNN_INT_OPS)
+
+
+def is_int8_accumulation_exact() -> bool:
+    """
+    Return whether the CPU supports VNNI instructions, with which oneDNN accumulates uint8 by int8
+    products exactly in int32. Without them, pairs of products are first summed in int16 with
+    saturation, which is exact only for inputs of at most 7 bits.
+    """
+    cpu = getattr(torch._C, '_cpu', None)
+    # The name of the check changed across PyTorch releases
+    for name in ('_is_avx512_vnni_supported', '_is_cpu_support_vnni'):
+        is_supported = getattr(cpu, name, None)
+        if is_supported is not None:
+            return is_supported()
+    return False
+
+
+class _IntInferenceImpl(ABC):
+    """
+    Executes the matmul of a quantized layer on uint8 inputs and int8 weights through the oneDNN
+    quantized CPU kernels, accumulating in int32 and rescaling once to a float32 output. The packed
+    weight is cached for as long as the quantized weight tensor and the input scale and zero-point
+    stay the same, which with frozen quantized weights (see :func:`freeze_quant_params`) means
+    it is packed only once.
+
+    Calling it returns None whenever the inputs are not supported, in which case the layer falls
+    back to float computations.
+    """
+
+    def __init__(self):
+        self.is_accumulation_exact = is_int8_accumulation_exact()
+        self.packed_weight = None
+        self.packed_weight_key = None
+        self.weight_scale = None
+        self.weight_zero_point = None
+
+    @abstractmethod
+    def pack_weight(
+            self, int_weight: Tensor, weight_scale: Tensor, input_scale: float,
+            input_zero_point: int):
+        pass
+
+    @abstractmethod
+    def int_forward(
+            self, int_input: Tensor, input_scale: float, input_zero_point: int,
+            bias: Optional[Tensor]) -> Optional[Tensor]:
+        pass
+
+    @staticmethod
+    def is_int8_quant_tensor(quant_tensor: QuantTensor) -> bool:
+        return (
+            quant_tensor.scale is not None and quant_tensor.zero_point is not None and
+            quant_tensor.bit_width is not None and quant_tensor.signed is not None and
+            bool(quant_tensor.bit_width <= 8.))
+
+    def update_packed_weight(
+            self, quant_weight: QuantTensor, input_scale: float, input_zero_point: int):
+        key = (quant_weight.value, input_scale, input_zero_point)
+        if (self.packed_weight_key is not None and key[0] is self.packed_weight_key[0] and
+                key[1:] == self.packed_weight_key[1:]):
+            return
+        self.packed_weight_key = key
+        self.packed_weight = None
+        weight = quant_weight.value
+        scale = quant_weight.scale
+        out_channels = weight.shape[0]
+        supported = (
+            self.is_int8_quant_tensor(quant_weight) and quant_weight.signed and
+            not bool(quant_weight.zero_point.any()) and (
+                scale.numel() == 1 or
+                scale.numel() == out_channels and scale.shape[0] == out_channels))
+        if not supported:
+            return
+        int_weight = torch.round(weight / scale).to(torch.int8)
+        self.weight_scale = scale.detach().reshape(-1).expand(out_channels).contiguous().float()
+        self.weight_zero_point = torch.zeros(out_channels, dtype=torch.long)
+        self.packed_weight = self.pack_weight(
+            int_weight, self.weight_scale, input_scale, input_zero_point)
+
+    def __call__(
+            self, quant_input: QuantTensor, quant_weight: QuantTensor,
+            quant_bias: Optional[Tensor]) -> Optional[Tensor]:
+        x = quant_input.value
+        if (x.device.type != 'cpu' or x.dtype != torch.float32 or torch.is_grad_enabled() and
+            (x.requires_grad or quant_weight.value.requires_grad)):
+            return None
+        if not self.is_int8_quant_tensor(quant_input):
+            return None
+        if quant_input.scale.numel() != 1 or quant_input.zero_point.numel() != 1:
+            return None
+        bit_width = int(quant_input.bit_width.item())
+        # Without VNNI, inputs of 8 bits could saturate the int16 sums of pairs of products
+        if bit_width > 7 and not self.is_accumulation_exact:
+            return None
+        input_scale = quant_input.scale.item()
+        zero_point = quant_input.zero_point.item()
+        # Inputs are fed as uint8, so signed values are shifted to [0, 2 ** bit_width) together
+        # with the zero-point
+        input_zero_point = int(round(zero_point))
+        if quant_input.signed:
+            input_zero_point += 2 ** (bit_width - 1)
+        if zero_point != round(zero_point) or not 0 <= input_zero_point <= 255:
+            return None
+        self.update_packed_weight(quant_weight, input_scale, input_zero_point)
+        if self.packed_weight is None:
+            return None
+        # The input is already on the quantization grid, so this is exact
+        int_input = torch.quantize_per_tensor(x, input_scale, input_zero_point,
+                                              torch.quint8).int_repr()
+        if quant_bias is not None:
+            quant_bias = quant_bias.float()
+        return self.int_forward(int_input, input_scale, input_zero_point, quant_bias)
+
+
+class _IntLinearImpl(_IntInferenceImpl):
+
+    def pack_weight(self, int_weight, weight_scale, input_scale, input_zero_point):
+        return torch.ops.onednn.qlinear_prepack(int_weight, None)
+
+    def int_forward(self, int_input, input_scale, input_zero_point, bias):
+        op = torch.ops.onednn.qlinear_pointwise
+        out = op(
+            int_input.reshape(-1, int_input.shape[-1]),
+            input_scale,
+            input_zero_point,
+            self.packed_weight,
+            self.weight_scale,
+            self.weight_zero_point,
+            bias,
+            post_op_name='none',
+            post_op_args=[],
+            post_op_algorithm='',
+            **_fp32_output_kwargs(op))
+        return out.reshape(int_input.shape[:-1] + (out.shape[-1],))
+
+
+class _IntConvNdImpl(_IntInferenceImpl):
+
+    def __init__(self, module, op_name):
+        super(_IntConvNdImpl, self).__init__()
+        self.op_name = op_name
+        self.input_dim = len(module.kernel_size) + 2
+        self.stride = list(module.stride)
+        self.padding = list(module.padding)
+        self.dilation = list(module.dilation)
+        self.groups = module.groups
+
+    @staticmethod
+    def is_supported(module):
+        return (
+            module.padding_mode == 'zeros' and not isinstance(module.padding, str) and
+            not module.is_same_padded_strided)
+
+    def pack_weight(self, int_weight, weight_scale, input_scale, input_zero_point):
+        return torch.ops.onednn.qconv_prepack(
+            int_weight,
+            weight_scale,
+            input_scale,
+            input_zero_point,
+            self.stride,
+            self.padding,
+            self.dilation,
+            self.groups,
+            None)
+
+    def int_forward(self, int_input, input_scale, input_zero_point, bias):
+        # Unbatched inputs are not supported by the kernels
+        if int_input.dim() != self.input_dim:
+            return None
+        op = getattr(torch.ops.onednn, self.op_name)
+        out = op(
+            int_input,
+            input_scale,
+            input_zero_point,
+            self.packed_weight,
+            self.weight_scale,
+            self.weight_zero_point,
+            bias,
+            self.stride,
+            self.padding,
+            self.dilation,
+            self.groups,
+            attr='none',
+            scalars=[],
+            algorithm=None,
+            **_fp32_output_kwargs(op))
+        # oneDNN returns channels last outputs
+        return out.contiguous()
+
+
+def _int_inference_impl(module):
+    if isinstance(module, QuantLinear):
+        return _IntLinearImpl()
+    elif isinstance(module, QuantConv1d) and _IntConvNdImpl.is_supported(module):
+        return _IntConvNdImpl(module, 'qconv1d_pointwise')
+    elif isinstance(module, QuantConv2d) and _IntConvNdImpl.is_supported(module):
+        return _IntConvNdImpl(module, 'qconv2d_pointwise')
+    return None
+
+
+def enable_int_inference(model: nn.Module) -> nn.Module:
+    """
+    Execute ``QuantLinear``, ``QuantConv1d`` and ``QuantConv2d`` layers of ``model`` with integer
+    arithmetic on CPU in eval mode, through the oneDNN quantized kernels of PyTorch. The layer input
+    and weight are converted to uint8 and int8 respectively, the matmul is accumulated in int32
+    and the result is rescaled once to float32, with the bias added in float. Quantized weights
+    and biases are frozen, see :func:`freeze_quant_params`.
+
+    A layer is executed in integer arithmetic when its input is quantized per-tensor to at most 8
+    bits with an integer zero-point, and its weight is signed, quantized per-tensor or
+    per-output-channel to at most 8 bits, with zero zero-point. Anything else, including training
+    mode, non-CPU or non-float32 inputs and inputs requiring grad, falls back to the regular float
+    simulation of quantization. Outputs match the float simulation up to float32 rounding.
+
+    Note:
+        On CPUs without VNNI instructions, oneDNN sums pairs of uint8 by int8 products in int16
+        with saturation, so only layers with inputs of at most 7 bits are executed in integer
+        arithmetic there, and 8-bit inputs fall back to the float simulation. See
+        :func:`is_int8_accumulation_exact`.
+
+    Raises:
+        RuntimeError: if the oneDNN quantized kernels are not available.
+    """
+    if not is_int_inference_available():
+        raise RuntimeError(
+            "Integer inference requires the oneDNN quantized CPU kernels of PyTorch >= 2.1.")
+    freeze_quant_params(model)
+    for module in model.modules():
+        impl = _int_inference_impl(module)
+        if impl is not None:
+            module.int_inference_impl = impl
+    return model
+
+
+def disable_int_inference(model: nn.Module) -> nn.Module:
+    """
+    Revert :func:`enable_int_inference`, including the freezing of quantized weights and biases.
+    """
+    for module in model.modules():
+        if getattr(module, 'int_inference_impl', None) is not None:
+            module.int_inference_impl = None
+    unfreeze_quant_params(model)
+    return model
+
+
+class int_inference_mode:
+    """
+    Context manager that sets ``model`` to eval mode and executes its quantized layers with integer
+    arithmetic, see :func:`enable_int_inference`. The training state of the model is restored on
+    exit.
+    """
+
+    def __init__(self, model: nn.Module, enabled: bool = True):
+        self.model = model
+        self.previous_training_state = model.training
+        self.enabled = enabled
+
+    def __enter__(self):
+        if self.enabled:
+            self.previous_training_state = self.model.training
+            self.model.eval()
+            enable_int_inference(self.model)
+
+    def __exit__(self, type, value, traceback):
+        if self.enabled:
+            disable_int_inference(self.model)
+            self.model.train(self.previous_training_state)
+
+
+# Layers that can run on plain tensors in compile mode
+_COMPILE_MODE_LAYERS = (
+    QuantNonLinearActLayer,
+    QuantWeightBiasInputOutputLayer,
+    QuantEltwiseAdd,
+    QuantCat,
+    QuantMaxPool1d,
+    QuantMaxPool2d,
+    QuantDropout,
+    QuantMultiheadAttention)
+
+
+def _compile_quant_weight(module: QuantWeightBiasInputOutputLayer) -> Optional[Tensor]:
+    if not module.is_weight_quant_enabled and not module.is_weight_packed:
+        return None
+    if module._frozen_quant_weight is not None:
+        return module._frozen_quant_weight.quant_tensor.value
+    return module.quant_weight().value
+
+
+def _compile_quant_bias(module: QuantWeightBiasInputOutputLayer, name: str) -> Optional[Tensor]:
+    if module.bias is None or not module.is_bias_quant_enabled:
+        return None
+    if module._frozen_quant_bias is not None:
+        return module._frozen_quant_bias.quant_tensor.value
+    if module.bias_quant.requires_input_scale or module.bias_quant.requires_input_bit_width:
+        raise RuntimeError(
+            f"The quantized bias of {name} depends on the scale of its input, pass example inputs "
+            "that go through it.")
+    return module.bias_quant(module.bias).value
+
+
+def enable_compile_mode(model: nn.Module, example_inputs: Optional[tuple] = None) -> nn.Module:
+    """
+    Set ``model`` to eval mode and execute its quantized layers on plain tensors, so that its
+    forward pass can be captured by ``torch.compile`` without graph breaks. Quantized weights and
+    biases are computed once and captured as constants, while inputs, outputs and activations are
+    still quantized at every forward pass. Layers return the dequantized value of their output,
+    including the ones with ``return_quant_tensor=True``, since no QuantTensor is built.
+
+    ``example_inputs`` is a tuple of positional arguments for a forward pass of ``model``, run
+    in eager mode to capture the quantized biases that depend on the scale of their input
+    (e.g. ``Int32Bias``). The captured values become stale when the model is updated, in which
+    case compile mode has to be enabled again. Layers frozen with :func:`freeze_quant_params`
+    stay frozen. Training mode is unaffected, and falls back to
+    the regular execution of quantized layers. A QuantMultiheadAttention with a packed input
+    projection is assumed to run self-attention while traced by ``torch.compile``, since its inputs
+    can't be compared then, while this is still checked in eager mode.
+
+    Examples:
+        >>> enable_compile_mode(model, (x,))
+        >>> compiled_model = torch.compile(model)
+        >>> out = compiled_model(x)
+
+    Raises:
+        RuntimeError: if ``model`` contains quantized layers that don't support compile mode, such
+            as recurrent or average pooling layers, or if a quantized bias that depends on its input
+            scale is not reached by ``example_inputs``.
+    """
+    unsupported = [
+        name for name,
+        module in model.named_modules()
+        if isinstance(module, (QuantLayerMixin, QuantRecurrentLayerMixin,
+                               QuantWeightMixin)) and not isinstance(module, _COMPILE_MODE_LAYERS)]
+    if unsupported:
+        raise RuntimeError(f"Compile mode is not supported by layers {', '.join(unsupported)}.")
+    training = model.training
+    model.eval()
+    # Layers frozen by the user stay frozen, only the other ones are unfrozen afterwards
+    to_freeze = [
+        module for module in model.modules()
+        if not getattr(module, 'freeze_quant_weight', False) and
+        not getattr(module, 'freeze_quant_bias', False)]
+    for module in to_freeze:
+        _set_freeze_quant_params(module, enabled=True)
+    try:
+        with torch.no_grad():
+            if example_inputs is not None:
+                model(*example_inputs)
+            for name, module in model.named_modules():
+                if isinstance(module, QuantWeightBiasInputOutputLayer):
+                    module._compile_quant_weight = _compile_quant_weight(module)
+                    module._compile_quant_bias = _compile_quant_bias(module, name)
+    except Exception:
+        # leave the model as it was, without any of the values captured so far
+        disable_compile_mode(model)
+        model.train(training)
+        raise
+    finally:
+        # the captured values make the frozen ones redundant
+        for module in to_freeze:
+            _set_freeze_quant_params(module, enabled=False)
+    for module in model.modules():
+        if isinstance(module, _COMPILE_MODE_LAYERS):
+            module.compile_mode = True
+    return model
+
+
+def disable_compile_mode(model: nn.Module) -> nn.Module:
+    """
+    Revert :func:`enable_compile_mode`, dropping the captured quantized weights and biases.
+    Models compiled in compile mode have to be compiled again.
+    """
+    for module in model.modules():
+        if isinstance(module, _COMPILE_MODE_LAYERS):
+            module.compile_mode = False
+        if isinstance(module, QuantWeightBiasInputOutputLayer):
+            module._compile_quant_weight = None
+            module._compile_quant_bias = None
+    return model
+
+
+class compile_mode:
+    """
+    Context manager that executes the quantized layers of ``model`` on plain tensors, so that it can
+    be compiled with ``torch.compile``, see :func:`enable_compile_mode`. The training state of the
+    model is restored on exit.
+
+    Examples:
+        >>> with torch.no_grad(), compile_mode(model, (x,)):
+        ...     compiled_model = torch.compile(model)
+        ...     for x in requests:
+        ...         compiled_model(x)
+    """
+
+    def __init__(
+            self, model: nn.Module, example_inputs: Optional[tuple] = None, enabled: bool = True):
+        self.model = model
+        self.example_inputs = example_inputs
+        self.previous_training_state = model.training
+        self.enabled = enabled
+
+    def __enter__(self):
+        if self.enabled:
+            self.previous_training_state = self.model.training
+            enable_compile_mode(self.model, self.example_inputs)
+
+    def __exit__(self, type, value, traceback):
+        if self.enabled:
+            disable_compile_mode(self.model)
+            self.model.train(self.previous_training_state)
+
+
+def enable_fused_attention(model: nn.Module, query_chunk_size: int = 128) -> nn.Module:
+    """
+    Compute the attention of every QuantMultiheadAttention in ``model`` without materializing its
+    full ``(N * num_heads, L, S)`` attention weights, whenever it runs in eval mode with
+    ``need_weights=False``. Without quantization of the input or output of the softmax, attention
+    is computed by ``F.scaled_dot_product_attention`` (requires torch>=2.1). Otherwise, queries are
+    processed in chunks of ``query_chunk_size``, so that memory grows with ``query_chunk_size * S``
+    rather than ``L * S``.
+
+    Results match the regular execution up to floating point differences, as long as the
+    quantizers of the attention weights don't depend on the whole attention matrix, e.g.
+    quantizers with a static or calibrated scale.
+    """
+    for module in model.modules():
+        if isinstance(module, QuantMultiheadAttention):
+            module.fused_attention = True
+            module.query_chunk_size = query_chunk_size
+    return model
+
+
+def disable_fused_attention(model: nn.Module) -> nn.Module:
+    """
+    Revert :func:`enable_fused_attention`.
+    """
+    for module in model.modules():
+        if isinstance(module, QuantMultiheadAttention):
+            module.fused_attention = False
+    return model
+
+
+class fused_attention_mode:
+    """
+    Context manager that computes attention without materializing the full attention weights, see
+    :func:`enable_fused_attention`.
+
+    Examples:
+        >>> with torch.no_grad(), fused_attention_mode(model, query_chunk_size=256):
+        ...     model(x)
+    """
+
+    def __init__(self, model: nn.Module, query_chunk_size: int = 128, enabled: bool = True):
+        self.model = model
+        self.query_chunk_size = query_chunk_size
+        self.enabled = enabled
+
+    def __enter__(self):
+        if self.enabled:
+            enable_fused_attention(self.model, self.query_chunk_size)
+
+    def __exit__(self, type, value, traceback):
+        if self.enabled:
+            disable_fused_attention(self.model)
+
+
+def pack_quant_weights(model: nn.Module) -> nn.Module:
+    """
+    Store the weights of every layer of ``model`` with weight quantization enabled as packed
+    integer codes, see :meth:`~brevitas.nn.mixin.QuantWeightMixin.pack_quant_weight`. Each weight
+    takes ``bit_width / 8`` bytes per element plus its scale and zero-point, e.g. a 4-bit
+    per-group weight shrinks about 8x from float32.
+
+    The state dict of the packed model can be loaded into a freshly instantiated (unpacked) model
+    with the same quantizers, which packs the corresponding layers on load.
+    """
+    for module in model.modules():
+        if isinstance(module, QuantWeightMixin) and module.is_weight_quant_enabled:
+            module.pack_quant_weight()
+    return model
+
+
+def unpack_quant_weights(model: nn.Module) -> nn.Module:
+    """
+    Restore the float weights of the layers packed by :func:`pack_quant_weights`, set to their
+    dequantized values.
+    """
+    for module in model.modules():
+        if isinstance(module, QuantWeightMixin):
+            module.unpack_quant_weight()
+    return model
@@ -0,0 +1,403 @@
+# Copyright (C) 2023, Advanced Micro Devices, Inc. All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+
+from collections import Counter
+from collections import defaultdict
+import glob
+import os
+import shutil
+import tempfile
+from typing import Dict, Optional, Tuple, Type, Union
+
+from packaging import version
+import torch
+from torch import nn
+from torch import Tensor
+
+try:
+    from safetensors import safe_open
+    from safetensors.torch import load_file as safetensors_load_file
+    from safetensors.torch import save_file as safetensors_save_file
+except ImportError:
+    safe_open = None
+    safetensors_load_file = None
+    safetensors_save_file = None
+
+from brevitas import torch_version
+
+__all__ = ['enable_param_offload', 'disable_param_offload', 'param_offload_mode']
+
+_OFFLOAD_LAYERS = (nn.Linear, nn.modules.conv._ConvNd, nn.Embedding)
+
+
+# Name of a tensor in a checkpoint, as the path of its file, its key and the dtype to load it in
+CheckpointKey = Tuple[str, str, torch.dtype]
+
+
+def _placeholder(tensor: Tensor, device: Optional[torch.device] = None) -> Tensor:
+    # A single element expanded to the original shape, so that the dtype, device and shape of an
+    # offloaded tensor can still be queried
+    device = tensor.device if device is None else device
+    return torch.zeros((), dtype=tensor.dtype, device=device).expand(tensor.shape)
+
+
+def _is_meta(tensor: Tensor) -> bool:
+    return tensor.device.type == 'meta'
+
+
+def _set_param(module: nn.Module, name: str, tensor: Tensor) -> None:
+    param = module._parameters[name]
+    if _is_meta(param):
+        # The data of a meta parameter can't be swapped for a tensor of another device
+        module._parameters[name] = nn.Parameter(tensor, requires_grad=param.requires_grad)
+    else:
+        param.data = tensor
+
+
+def _checkpoint_files(checkpoint: str) -> Dict[str, str]:
+    # Map the key of each tensor to the safetensors file storing it, from a single file or a
+    # directory of shards
+    if safe_open is None:
+        raise RuntimeError("Loading parameters from a checkpoint requires safetensors.")
+    if os.path.isdir(checkpoint):
+        paths = sorted(glob.glob(os.path.join(checkpoint, '*.safetensors')))
+    else:
+        paths = [checkpoint]
+    files = {}
+    for path in paths:
+        with safe_open(path, framework='pt') as f:
+            files.update({key: path for key in f.keys()})
+    return files
+
+
+def _load_checkpoint(keys: Dict[str, CheckpointKey]) -> Dict[str, Tensor]:
+    keys_by_path = defaultdict(list)
+    for name, (path, key, dtype) in keys.items():
+        keys_by_path[path].append((name, key, dtype))
+    tensors = {}
+    for path, path_keys in keys_by_path.items():
+        with safe_open(path, framework='pt') as f:
+            for name, key, dtype in path_keys:
+                tensors[name] = f.get_tensor(key).to(dtype)
+    return tensors
+
+
+class _OffloadedParams:
+    """
+    Parameters and buffers owned directly by a module, stored in a file under ``path`` or in CPU
+    memory whenever the module is not in use.
+    """
+
+    def __init__(self, path: Optional[str], shared_ids: set, resident: list) -> None:
+        self.path = path
+        self.shared_ids = shared_ids
+        # Layers of the model left materialized by their last forward pass
+        self.resident = resident
+        self.in_forward = False
+        self.param_names = []
+        self.buffer_names = []
+        self.devices = {}
+        self.tensors = None
+        # Tensors are read from a checkpoint until they are written back for the first time
+        self.checkpoint_keys = None
+        self.is_materialized = True
+        self.hook_handles = []
+
+    def named_tensors(self, module: nn.Module) -> Dict[str, Tensor]:
+        tensors = {name: module._parameters[name].data for name in self.param_names}
+        tensors.update({name: module._buffers[name] for name in self.buffer_names})
+        return tensors
+
+    def save(self, tensors: Dict[str, Tensor]) -> None:
+        if self.path is None:
+            pin_memory = torch.cuda.is_available()
+            self.tensors = {
+                name: t.detach().to('cpu').pin_memory() if pin_memory else t.detach().to('cpu')
+                for name, t in tensors.items()}
+            return
+        # The tensors might be memory-mapped from the current file, so a new one replaces it
+        tmp_path = self.path + '.tmp'
+        if safetensors_save_file is not None:
+            safetensors_save_file({
+                name: t.detach().to('cpu').contiguous() for name, t in tensors.items()},
+                                  tmp_path)
+        else:
+            torch.save({name: t.detach().to('cpu') for name, t in tensors.items()}, tmp_path)
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> Dict[str, Tensor]:
+        if self.checkpoint_keys is not None:
+            return _load_checkpoint(self.checkpoint_keys)
+        elif self.path is None:
+            return self.tensors
+        elif safetensors_load_file is not None:
+            return safetensors_load_file(self.path)
+        elif torch_version >= version.parse('2.1'):
+            return torch.load(self.path, mmap=True)
+        else:
+            return torch.load(self.path)
+
+    def allocate(self, module: nn.Module) -> None:
+        if self.is_materialized:
+            return
+        tensors = self.load()
+        for name in self.param_names:
+            _set_param(module, name, tensors[name].to(self.devices[name], non_blocking=True))
+        for name in self.buffer_names:
+            module._buffers[name] = tensors[name].to(self.devices[name], non_blocking=True)
+        self.is_materialized = True
+
+    def offload(self, module: nn.Module, write_back: bool = True) -> None:
+        self.in_forward = False
+        if module in self.resident:
+            self.resident.remove(module)
+        if not self.is_materialized:
+            return
+        if write_back:
+            self.collect_names(module)
+            tensors = self.named_tensors(module)
+            self.devices = {name: t.device for name, t in tensors.items()}
+            self.save(tensors)
+            self.checkpoint_keys = None
+        self.replace_with_placeholders(module)
+
+    def offload_to_checkpoint(
+            self, module: nn.Module, checkpoint_keys: Dict[str, CheckpointKey],
+            device: torch.device) -> None:
+        """
+        Back the tensors of a module on the meta device with the corresponding ones of a
+        checkpoint, which are materialized on ``device``.
+        """
+        self.collect_names(module)
+        self.checkpoint_keys = {
+            name: checkpoint_keys[name] for name in self.param_names + self.buffer_names}
+        self.devices = {name: device for name in self.checkpoint_keys}
+        self.replace_with_placeholders(module)
+
+    def collect_names(self, module: nn.Module) -> None:
+        # Parameters and buffers are collected every time, since they might have been added
+        self.param_names = [
+            name for name, p in module._parameters.items()
+            if p is not None and id(p) not in self.shared_ids]
+        self.buffer_names = [
+            name for name, b in module._buffers.items()
+            if b is not None and id(b) not in self.shared_ids]
+
+    def replace_with_placeholders(self, module: nn.Module) -> None:
+        for name in self.param_names:
+            param = module._parameters[name]
+            _set_param(module, name, _placeholder(param.data, self.devices[name]))
+        for name in self.buffer_names:
+            module._buffers[name] = _placeholder(module._buffers[name], self.devices[name])
+        self.is_materialized = False
+
+
+def _allocate_params(module: nn.Module) -> None:
+    module._param_offload.allocate(module)
+
+
+def _offload_params(module: nn.Module) -> None:
+    module._param_offload.offload(module, write_back=True)
+
+
+def _allocate_params_pre_hook(module, inp) -> None:
+    param_offload = module._param_offload
+    # Layers are offloaded when the next one is materialized rather than right after their forward
+    # pass, since hooks registered after the offloading ones might still need their parameters.
+    # Weights are not modified by a forward pass, so they don't need to be written back
+    for other in list(param_offload.resident):
+        if other is not module and not other._param_offload.in_forward:
+            other._param_offload.offload(other, write_back=False)
+    param_offload.allocate(module)
+    param_offload.in_forward = True
+
+
+def _offload_params_hook(module, inp, out) -> None:
+    param_offload = module._param_offload
+    param_offload.in_forward = False
+    if module not in param_offload.resident:
+        param_offload.resident.append(module)
+
+
+def _materialize_from_checkpoint(
+        model: nn.Module, checkpoint_files: Dict[str, str], device: torch.device) -> None:
+    # Load the tensors of model on the meta device that are not offloaded, keeping them tied
+    names = defaultdict(list)
+    for module_name, module in model.named_modules():
+        prefix = module_name + '.' if module_name else ''
+        for tensors in (module._parameters, module._buffers):
+            for name, t in tensors.items():
+                if t is not None and _is_meta(t):
+                    names[id(t)].append((module, tensors, name, prefix + name))
+    missing = []
+    for owners in names.values():
+        keys = [key for _, _, _, key in owners if key in checkpoint_files]
+        if not keys:
+            missing.append(owners[0][3])
+            continue
+        module, tensors, name, _ = owners[0]
+        meta_tensor = tensors[name]
+        key = keys[0]
+        tensor = _load_checkpoint({key: (checkpoint_files[key], key, meta_tensor.dtype)})[key]
+        tensor = tensor.to(device)
+        if isinstance(meta_tensor, nn.Parameter):
+            tensor = nn.Parameter(tensor, requires_grad=meta_tensor.requires_grad)
+        for _, tensors, name, _ in owners:
+            tensors[name] = tensor
+    if missing:
+        raise RuntimeError(f"Tensors on the meta device missing from the checkpoint: {missing}")
+
+
+def enable_param_offload(
+        model: nn.Module,
+        offload_dir: Optional[str] = None,
+        layer_types: Tuple[Type[nn.Module], ...] = _OFFLOAD_LAYERS,
+        checkpoint: Optional[str] = None,
+        device: Union[str, torch.device] = 'cpu') -> nn.Module:
+    """
+    Offload the parameters and buffers of every layer of ``model`` of type ``layer_types``, so
+    that only the layers in use are materialized in memory. By default, these are linear,
+    convolutional and embedding layers, including their quantized variants, while the small state
+    of their quantizers stays in memory. Tensors shared by more than one layer are not offloaded.
+
+    A layer is materialized on its original device by its forward pass, until the forward pass of
+    another layer, or between calls to its ``allocate_params`` and ``offload_params`` attributes,
+    which are called by PTQ algorithms that update weights, such as GPTQ, GPFQ, equalization and
+    bias correction. Only ``offload_params`` writes updated values back to storage. While
+    offloaded, parameters and buffers are replaced by zero-filled tensors of the same shape, dtype
+    and device that don't allocate memory, and they have to be materialized to be read or modified
+    outside of those algorithms, e.g. by :func:`disable_param_offload` before exporting the model.
+
+    Offloading an already materialized model only bounds the memory needed afterwards, so the
+    whole model still has to fit in memory once. To process models larger than RAM, ``model`` can
+    instead be created on the meta device, e.g. with ``torch.device('meta')`` as a context manager,
+    and its tensors read from a safetensors ``checkpoint``: the ones of offloaded layers are read
+    lazily, every time the layer is materialized and until it is first written back to storage,
+    while the others are loaded right away. Every tensor on the meta device has to be in the
+    checkpoint under its name in the state dict of ``model``, so quantizers with state that is not
+    saved in a state dict can't be created on the meta device.
+
+    Args:
+        model (Module): The model to offload.
+        offload_dir (Optional, str): If specified, each layer is stored in a file of a temporary
+            directory created under this path, memory-mapped with safetensors when installed.
+            Otherwise layers are kept in CPU memory, pinned when CUDA is available. Default: None
+        layer_types (Tuple[Type[Module]]): The types of layers to offload.
+        checkpoint (Optional, str): A safetensors file, or a directory of safetensors shards,
+            storing the tensors of ``model`` on the meta device. Default: None
+        device (str or device): The device where tensors read from ``checkpoint`` are
+            materialized. Default: 'cpu'
+
+    Examples:
+        >>> enable_param_offload(model, offload_dir='/tmp')
+        >>> with torch.no_grad(), gptq_mode(model, create_weight_orig=False) as gptq:
+        ...     gptq.blockwise_update(model.layers, calib_inputs)
+        >>> disable_param_offload(model)
+
+        >>> with torch.device('meta'):
+        ...     model = Model()
+        >>> enable_param_offload(model, offload_dir='/tmp', checkpoint='model.safetensors')
+    """
+    if hasattr(model, '_param_offload_dir'):
+        raise RuntimeError("Parameters of the model are already offloaded.")
+    layers = [
+        m for m in model.modules()
+        if isinstance(m, layer_types) and not hasattr(m, '_param_offload')]
+    # Tensors referenced by more than one module, e.g. tied embeddings, are kept in memory
+    counts = Counter(
+        id(t) for m in model.modules()
+        for t in list(m._parameters.values()) + list(m._buffers.values()) if t is not None)
+    shared_ids = set(tensor_id for tensor_id, count in counts.items() if count > 1)
+    device = torch.device(device)
+    checkpoint_files = _checkpoint_files(checkpoint) if checkpoint is not None else {}
+    layer_names = {m: name for name, m in model.named_modules()}
+    tmp_dir = tempfile.mkdtemp(dir=offload_dir) if offload_dir is not None else None
+    model._param_offload_dir = tmp_dir
+    extension = 'safetensors' if safetensors_save_file is not None else 'pt'
+    resident = []
+    for i, layer in enumerate(layers):
+        path = os.path.join(tmp_dir, f'{i}.{extension}') if tmp_dir is not None else None
+        param_offload = _OffloadedParams(path, shared_ids, resident)
+        layer._param_offload = param_offload
+        layer.allocate_params = _allocate_params
+        layer.offload_params = _offload_params
+        param_offload.hook_handles = [
+            layer.register_forward_pre_hook(_allocate_params_pre_hook),
+            layer.register_forward_hook(_offload_params_hook)]
+        param_offload.collect_names(layer)
+        tensors = param_offload.named_tensors(layer)
+        if any(_is_meta(t) for t in tensors.values()):
+            # All the tensors of the layer are read from the checkpoint
+            prefix = layer_names[layer] + '.' if layer_names[layer] else ''
+            checkpoint_keys = {}
+            for name, t in tensors.items():
+                key = prefix + name
+                if key not in checkpoint_files:
+                    raise RuntimeError(
+                        f"Tensor {key} of a meta device layer is missing from the checkpoint."
+                    )
+                checkpoint_keys[name] = (checkpoint_files[key], key, t.dtype)
+            param_offload.offload_to_checkpoint(layer, checkpoint_keys, device)
+        else:
+            param_offload.offload(layer)
+    if checkpoint is not None:
+        _materialize_from_checkpoint(model, checkpoint_files, device)
+    return model
+
+
+def disable_param_offload(model: nn.Module) -> nn.Module:
+    """
+    Revert :func:`enable_param_offload`, materializing the parameters and buffers of every
+    offloaded layer of ``model`` and deleting their storage.
+    """
+    for module in model.modules():
+        param_offload = module.__dict__.pop('_param_offload', None)
+        if param_offload is None:
+            continue
+        param_offload.allocate(module)
+        for handle in param_offload.hook_handles:
+            handle.remove()
+        del module.allocate_params
+        del module.offload_params
+    tmp_dir = model.__dict__.pop('_param_offload_dir', None)
+    if tmp_dir is not None:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return model
+
+
+class param_offload_mode:
+    """
+    Context manager that offloads the parameters of ``model`` and materializes them back on exit,
+    see :func:`enable_param_offload`.
+
+    Examples:
+        >>> with torch.no_grad(), param_offload_mode(model, offload_dir='/tmp'):
+        ...     with calibration_mode(model):
+        ...         for x in calib_inputs:
+        ...             model(x)
+    """
+
+    def __init__(
+            self,
+            model: nn.Module,
+            offload_dir: Optional[str] = None,
+            layer_types: Tuple[Type[nn.Module], ...] = _OFFLOAD_LAYERS,
+            enabled: bool = True,
+            checkpoint: Optional[str] = None,
+            device: Union[str, torch.device] = 'cpu'):
+        self.model = model
+        self.offload_dir = offload_dir
+        self.layer_types = layer_types
+        self.enabled = enabled
+        self.checkpoint = checkpoint
+        self.device = device
+
+    def __enter__(self):
+        if self.enabled:
+            enable_param_offload(
+                self.model, self.offload_dir, self.layer_types, self.checkpoint, self.device)
+        return self.model
+
+    def __exit__(self, type, value, traceback):
+        if self.enabled:
+            disable_param_offload(self.model)
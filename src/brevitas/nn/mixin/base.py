@@ -15,6 +15,8 @@ from torch.nn.utils.rnn import PackedSequence
 
 from brevitas import config
 from brevitas.common import ExportMixin
+from brevitas.function.ops import pack_uint
+from brevitas.function.ops import unpack_uint
 from brevitas.inject import ExtendedInjector
 from brevitas.inject import Injector
 from brevitas.nn.utils import compute_channel_view_shape
@@ -49,6 +51,121 @@ class _CachedIO:
         return self.quant_tensor.signed
 
 
+class _FrozenQuantParam:
+    """
+    Quantized parameter cached in frozen inference mode. The cache is valid as long as the
+    parameter and the state of its quantizer are the same objects and have not been updated
+    in-place since, and as long as the inputs the quantization depends on (e.g. the input scale
+    of a bias quantizer) are unchanged.
+    """
+
+    def __init__(self, quant_tensor: QuantTensor, param: Tensor, quant_proxy: nn.Module, inputs):
+        self.quant_tensor = quant_tensor.detach()
+        self.param = param
+        self.tensor_quant = getattr(quant_proxy, 'tensor_quant', None)
+        self.state = [param] + list(quant_proxy.parameters()) + list(quant_proxy.buffers())
+        self.versions = [t._version for t in self.state]
+        self.inputs = inputs
+
+    def is_valid(self, param: Tensor, quant_proxy: nn.Module, inputs) -> bool:
+        if param is not self.param or getattr(quant_proxy, 'tensor_quant',
+                                              None) is not self.tensor_quant:
+            return False
+        for t, version in zip(self.state, self.versions):
+            if t._version != version:
+                return False
+        for inp, cached_inp in zip(inputs, self.inputs):
+            if isinstance(inp, Tensor) and isinstance(cached_inp, Tensor):
+                if inp is not cached_inp and (inp.shape != cached_inp.shape or
+                                              not torch.equal(inp, cached_inp)):
+                    return False
+            elif inp is not cached_inp and inp != cached_inp:
+                return False
+        return True
+
+
+class _PackedQuantParam(nn.Module):
+    """
+    Quantized parameter stored as unsigned integer codes packed in a uint8 buffer, together with
+    the scale and zero-point required to dequantize it. Group-wise scales and zero-points are
+    stored once per group rather than expanded to the shape of the parameter.
+    """
+
+    def __init__(
+            self,
+            shape: Tuple[int, ...],
+            signed: bool,
+            group_size: Optional[int],
+            packed: Tensor,
+            scale: Tensor,
+            zero_point: Tensor,
+            bit_width: Tensor):
+        super(_PackedQuantParam, self).__init__()
+        self.shape = torch.Size(shape)
+        self.signed = signed
+        self.group_size = group_size
+        self.num_bits = int(bit_width.item())
+        self.register_buffer('packed', packed)
+        self.register_buffer('scale', scale)
+        self.register_buffer('zero_point', zero_point)
+        self.register_buffer('bit_width', bit_width)
+
+    @staticmethod
+    def group_view_shape(shape: torch.Size, group_size: Optional[int]) -> Tuple[int, ...]:
+        if group_size is None:
+            return tuple(shape)
+        return (shape[0], shape[1] // group_size, group_size) + tuple(shape[2:])
+
+    @classmethod
+    def from_quant_tensor(cls, quant_tensor: QuantTensor, group_size: Optional[int] = None):
+        bit_width = quant_tensor.bit_width.detach()
+        if bit_width.numel() != 1 or bit_width.item() > 8 or bit_width.item() != round(
+                bit_width.item()):
+            raise RuntimeError("Packing requires a constant integer bit-width of at most 8 bits.")
+        if not quant_tensor.is_valid:
+            raise RuntimeError("Packing requires a valid integer QuantTensor.")
+        shape = quant_tensor.value.shape
+        signed = bool(quant_tensor.signed)
+        num_bits = int(bit_width.item())
+        int_value = quant_tensor.int(float_datatype=True).detach()
+        if signed:
+            int_value = int_value + 2 ** (num_bits - 1)
+        packed = pack_uint(int_value, num_bits)
+        view_shape = cls.group_view_shape(shape, group_size)
+        scale, zero_point = [
+            t.detach().reshape(view_shape).narrow(2, 0, 1).contiguous()
+            if group_size is not None and t.shape == shape else t.detach()
+            for t in (quant_tensor.scale, quant_tensor.zero_point)]
+        return cls(shape, signed, group_size, packed, scale, zero_point, bit_width)
+
+    @classmethod
+    def from_state_dict(cls, shape: torch.Size, signed: bool, state_dict, prefix: str, device=None):
+        """
+        Allocate a packed parameter matching the entries under ``prefix`` in ``state_dict``, so
+        that they can be loaded into it.
+        """
+        scale = state_dict[prefix + 'scale']
+        group_size = shape[1] // scale.shape[1] if scale.dim() == len(shape) + 1 else None
+        packed, scale, zero_point = [
+            torch.empty_like(state_dict[prefix + name], device=device)
+            for name in ('packed', 'scale', 'zero_point')]
+        bit_width = state_dict[prefix + 'bit_width'].to(device=device, copy=True)
+        return cls(shape, signed, group_size, packed, scale, zero_point, bit_width)
+
+    def forward(self) -> QuantTensor:
+        view_shape = self.group_view_shape(self.shape, self.group_size)
+        int_value = unpack_uint(self.packed, self.num_bits, self.shape.numel())
+        int_value = int_value.view(view_shape).to(self.scale.dtype)
+        if self.signed:
+            int_value = int_value - 2 ** (self.num_bits - 1)
+        value = ((int_value - self.zero_point) * self.scale).view(self.shape)
+        # restore the layout of group-wise scales and zero-points produced by the quantizer
+        scale, zero_point = [
+            t.expand(view_shape).reshape(self.shape) if t.dim() == len(view_shape) and
+            self.group_size is not None else t for t in (self.scale, self.zero_point)]
+        return QuantTensor(value, scale, zero_point, self.bit_width, self.signed, self.training)
+
+
 class QuantProxyMixin(object):
     __metaclass__ = ABCMeta
 
@@ -95,6 +212,8 @@ class QuantLayerMixin(ExportMixin):
         self.cache_quant_io_metadata_only = cache_quant_io_metadata_only
         self._cached_inp = None
         self._cached_out = None
+        # Plain tensor execution in eval mode, see brevitas.graph.inference.enable_compile_mode
+        self.compile_mode = False
 
     @property
     @abstractmethod
@@ -173,7 +292,7 @@ class QuantLayerMixin(ExportMixin):
                 self._cached_inp = cached_inp
         # Remove any naming metadata to avoid dowmstream errors
         # Avoid inplace operations on the input in case of forward hooks
-        if not torch._C._get_tracing_state():
+        if not torch._C._get_tracing_state() and inp.value.has_names():
             inp = inp.set(value=inp.value.rename(None))
         return inp
 
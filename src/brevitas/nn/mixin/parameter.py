@@ -6,6 +6,10 @@ from abc import abstractmethod
 from typing import List, Optional, Tuple, Type, Union
 from warnings import warn
 
+import torch
+from torch import nn
+from torch import Tensor
+
 from brevitas.inject import ExtendedInjector
 from brevitas.inject import Injector
 from brevitas.proxy.parameter_quant import BiasQuantProxyFromInjector
@@ -16,6 +20,8 @@ from brevitas.quant import NoneBiasQuant
 from brevitas.quant import NoneWeightQuant
 from brevitas.quant_tensor import QuantTensor
 
+from .base import _FrozenQuantParam
+from .base import _PackedQuantParam
 from .base import QuantProxyMixin
 
 WeightQuantType = Union[WeightQuantProxyProtocol, Type[Injector], Type[ExtendedInjector]]
@@ -35,6 +41,9 @@ class QuantWeightMixin(QuantProxyMixin):
             proxy_prefix='weight_',
             **kwargs)
         self._cached_sub_tensor_slice_list_modules = None
+        self.freeze_quant_weight = False
+        self._frozen_quant_weight = None
+        self.packed_weight = None
 
     @property
     @abstractmethod
@@ -57,10 +66,85 @@ class QuantWeightMixin(QuantProxyMixin):
     def weight_quant_requires_quant_input(self):
         return self.weight_quant.requires_quant_input
 
+    @property
+    def is_weight_packed(self):
+        return self.packed_weight is not None
+
+    def pack_quant_weight(self):
+        """
+        Replace the float weight with its quantized integer codes, packed in a uint8 buffer at the
+        current bit-width of the quantizer, together with its scale and zero-point. The packed
+        weight is unpacked on the fly by :meth:`quant_weight`, and is saved to and loaded from
+        the state dict in its packed form.
+
+        This requires a constant integer bit-width of at most 8 bits. The float weight is
+        dropped, so the layer can't be trained anymore until :meth:`unpack_quant_weight` is
+        called.
+        """
+        if self.is_weight_packed:
+            return
+        if not self.is_weight_quant_enabled:
+            raise RuntimeError("Packing requires weight quantization to be enabled.")
+        group_size = None
+        if self.weight_quant.is_groupwise:
+            group_size = self.weight_quant.quant_injector.group_size
+        with torch.no_grad():
+            quant_weight = self.quant_weight()
+        self.packed_weight = _PackedQuantParam.from_quant_tensor(quant_weight, group_size)
+        self._delete_float_weight()
+
+    def _delete_float_weight(self):
+        weight = self.weight
+        del self.weight
+        self._frozen_quant_weight = None
+        # The weight quantizer references the float weight too, which would keep it alive
+        self.weight_quant.untrack_parameter(weight)
+
+    def unpack_quant_weight(self):
+        """
+        Restore a float weight from the packed one, set to its dequantized value. The state of
+        the weight quantizer is preserved.
+        """
+        if not self.is_weight_packed:
+            return
+        with torch.no_grad():
+            weight = self.packed_weight().value
+        self.packed_weight = None
+        self._frozen_quant_weight = None
+        weight_quant_state_dict = self.weight_quant.state_dict()
+        self.weight = nn.Parameter(weight)
+        # Values that were never initialized, e.g. a zero-point computed on the fly from the
+        # weight, are not part of the state dict and keep their current value
+        self.weight_quant.load_state_dict(weight_quant_state_dict, strict=False)
+
+    def _packed_quant_weight(self, subtensor_slice_list: List[Optional[Tuple[int, int]]]):
+        if subtensor_slice_list is not None:
+            raise RuntimeError("Sub-tensor quantization is not supported with packed weights.")
+        freeze = self.freeze_quant_weight and not self.training
+        if freeze and self._frozen_quant_weight is not None and self._frozen_quant_weight.is_valid(
+                self.packed_weight.packed, self.packed_weight, ()):
+            return self._frozen_quant_weight.quant_tensor
+        out = self.packed_weight()
+        if freeze:
+            self._frozen_quant_weight = _FrozenQuantParam(
+                out, self.packed_weight.packed, self.packed_weight, ())
+        return out
+
     def quant_weight(
             self,
             quant_input: Optional[QuantTensor] = None,
             subtensor_slice_list: List[Optional[Tuple[int, int]]] = None):
+        if self.is_weight_packed:
+            return self._packed_quant_weight(subtensor_slice_list)
+        # In frozen inference mode, the quantized weight is computed once and then reused
+        freeze = (
+            self.freeze_quant_weight and not self.training and subtensor_slice_list is None and
+            self.is_weight_quant_enabled and not self.weight_quant.export_mode)
+        if freeze:
+            frozen_inputs = self._frozen_quant_weight_inputs(quant_input)
+            if self._frozen_quant_weight is not None and self._frozen_quant_weight.is_valid(
+                    self.weight, self.weight_quant, frozen_inputs):
+                return self._frozen_quant_weight.quant_tensor
         weights_to_quantize = self.weight
         if not self.weight_quant.is_quant_enabled and hasattr(self, 'weight_orig'):
             weights_to_quantize = self.weight_orig
@@ -107,8 +191,18 @@ class QuantWeightMixin(QuantProxyMixin):
             assert self._cached_sub_tensor_slice_list_modules is not None, "Missing cache of modules to slice."
             for m in self._cached_sub_tensor_slice_list_modules:
                 m.subtensor_slice_list = [None]
+        if freeze:
+            self._frozen_quant_weight = _FrozenQuantParam(
+                out, self.weight, self.weight_quant, frozen_inputs)
         return out
 
+    def _frozen_quant_weight_inputs(self, quant_input: Optional[QuantTensor]):
+        if not self.weight_quant_requires_quant_input:
+            return ()
+        if quant_input is None:
+            return (self.quant_input_bit_width(), self.is_quant_input_signed)
+        return (quant_input.bit_width, quant_input.signed)
+
     def int_weight(self, float_datatype=False):
         return self.quant_weight().int(float_datatype)
 
@@ -130,6 +224,22 @@ class QuantWeightMixin(QuantProxyMixin):
             self.weight_quant.init_tensor_quant()
             self.weight_quant.to(self.weight.device)
 
+    def _load_from_state_dict(
+            self, state_dict, prefix, local_metadata, strict, missing_keys, unexpected_keys,
+            error_msgs):
+        # a packed weight replaces the float one, allocate it so that its buffers can be loaded
+        packed_prefix = prefix + 'packed_weight.'
+        if not self.is_weight_packed and packed_prefix + 'packed' in state_dict:
+            self.packed_weight = _PackedQuantParam.from_state_dict(
+                self.weight.shape,
+                self.is_quant_weight_signed,
+                state_dict,
+                packed_prefix,
+                device=self.weight.device)
+            self._delete_float_weight()
+        super(QuantWeightMixin, self)._load_from_state_dict(
+            state_dict, prefix, local_metadata, strict, missing_keys, unexpected_keys, error_msgs)
+
 
 class QuantBiasMixin(QuantProxyMixin):
     __metaclass__ = ABCMeta
@@ -149,6 +259,8 @@ class QuantBiasMixin(QuantProxyMixin):
             **kwargs)
         self.cache_inference_quant_bias = cache_inference_bias
         self._cached_bias = None
+        self.freeze_quant_bias = False
+        self._frozen_quant_bias = None
 
     @property
     def is_bias_quant_enabled(self):
@@ -180,6 +292,27 @@ class QuantBiasMixin(QuantProxyMixin):
         quant_bias = self.bias_quant(self.bias, scale, bit_width)
         return quant_bias
 
+    def forward_quant_bias(
+            self, input_scale: Optional[Tensor], input_bit_width: Optional[Tensor]) -> QuantTensor:
+        """
+        Quantize the bias given the scale and bit-width of its input. In frozen inference mode, the
+        result is computed once and then reused while the bias, the state of its quantizer and the
+        input scale and bit-width are unchanged.
+        """
+        freeze = (
+            self.freeze_quant_bias and not self.training and self.is_bias_quant_enabled and
+            not self.bias_quant.export_mode)
+        if not freeze:
+            return self.bias_quant(self.bias, input_scale, input_bit_width)
+        frozen_inputs = (input_scale, input_bit_width)
+        if self._frozen_quant_bias is not None and self._frozen_quant_bias.is_valid(
+                self.bias, self.bias_quant, frozen_inputs):
+            return self._frozen_quant_bias.quant_tensor
+        quant_bias = self.bias_quant(self.bias, input_scale, input_bit_width)
+        self._frozen_quant_bias = _FrozenQuantParam(
+            quant_bias, self.bias, self.bias_quant, frozen_inputs)
+        return quant_bias
+
     def quant_bias_scale(self):
         if self.bias is None or not self.is_bias_quant_enabled:
             return None
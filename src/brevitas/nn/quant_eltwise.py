@@ -3,6 +3,7 @@
 
 from typing import List, Optional, Type, Union
 
+import torch
 from torch import Tensor
 from torch.nn import Module
 
@@ -32,6 +33,9 @@ class QuantEltwiseAdd(QuantInputOutputLayer, Module):
 
     def forward(self, input: Union[Tensor, QuantTensor],
                 other: Union[Tensor, QuantTensor]) -> Union[Tensor, QuantTensor]:
+        if self.compile_mode and not self.training:
+            output = self.input_quant.forward_value(input) + self.input_quant.forward_value(other)
+            return self.output_quant.forward_value(output)
         input = self.unpack_input(input)
         other = self.unpack_input(other)
         if self.export_mode:
@@ -66,6 +70,9 @@ class QuantCat(QuantInputOutputLayer, Module):
     def forward(self,
                 tensor_list: Union[List[Tensor], List[QuantTensor]],
                 dim: int = 1) -> Union[Tensor, QuantTensor]:
+        if self.compile_mode and not self.training:
+            output = torch.cat([self.input_quant.forward_value(t) for t in tensor_list], dim=dim)
+            return self.output_quant.forward_value(output)
         quant_tensor_list = [self.unpack_input(t) for t in tensor_list]
         # shortcut execution through the export impl during export
         if self.export_mode:
@@ -131,6 +131,8 @@ class QuantNonLinearActLayer(QuantNonLinearActMixin, QuantInputMixin, QuantLayer
         return self.quant_act_bit_width()
 
     def forward(self, input: Union[Tensor, QuantTensor]):
+        if self.compile_mode and not self.training:
+            return self.act_quant.forward_value(self.input_quant.forward_value(input))
         input = self.unpack_input(input)
         quant_input = self.input_quant(input)
         # shortcut execution through the export impl during export
@@ -264,6 +266,11 @@ class QuantWeightBiasInputOutputLayer(QuantBiasMixin, QuantWeightMixin, QuantInp
             **kwargs)
         QuantWeightMixin.__init__(self, weight_quant, **kwargs)
         QuantBiasMixin.__init__(self, bias_quant, **kwargs)
+        # Optional integer arithmetic implementation, see brevitas.graph.inference
+        self.int_inference_impl = None
+        # Quantized weight and bias captured for compile mode, see brevitas.graph.inference
+        self._compile_quant_weight = None
+        self._compile_quant_bias = None
 
     @abstractmethod
     def inner_forward_impl(self, x: Tensor, quant_weight: Tensor, quant_bias: Optional[Tensor]):
@@ -293,7 +300,30 @@ class QuantWeightBiasInputOutputLayer(QuantBiasMixin, QuantWeightMixin, QuantInp
     def merge_bn_in(self, bn):
         merge_bn(self, bn, output_channel_dim=self.output_channel_dim)
 
+    def quant_inner_forward_impl(
+            self, quant_input: QuantTensor, quant_weight: QuantTensor,
+            quant_bias: Optional[Tensor]) -> Tensor:
+        if self.int_inference_impl is not None and not self.training:
+            output_tensor = self.int_inference_impl(quant_input, quant_weight, quant_bias)
+            if output_tensor is not None:
+                return output_tensor
+        return self.inner_forward_impl(quant_input.value, quant_weight.value, quant_bias)
+
+    def compile_forward_impl(self, inp: Tensor) -> Tensor:
+        quant_input = self.input_quant.forward_value(inp)
+        quant_weight = self._compile_quant_weight
+        if quant_weight is None:
+            quant_weight = self.weight
+        quant_bias = self._compile_quant_bias
+        if quant_bias is None:
+            quant_bias = self.bias
+        output_tensor = self.inner_forward_impl(quant_input, quant_weight, quant_bias)
+        return self.output_quant.forward_value(output_tensor)
+
     def forward_impl(self, inp: Union[Tensor, QuantTensor]) -> Union[Tensor, QuantTensor]:
+        if self.compile_mode and not self.training:
+            return self.compile_forward_impl(inp)
+
         output_scale = None
         output_bit_width = None
         output_zero_point = None
@@ -323,12 +353,12 @@ class QuantWeightBiasInputOutputLayer(QuantBiasMixin, QuantWeightMixin, QuantInp
                 output_signed = inp.signed or quant_weight.signed
 
         if self.bias is not None:
-            quant_bias = self.bias_quant(self.bias, output_scale, output_bit_width)
+            quant_bias = self.forward_quant_bias(output_scale, output_bit_width)
             if not self.training and self.cache_inference_quant_bias:
                 self._cached_bias = _CachedIO(quant_bias.detach(), metadata_only=False)
 
-            output_tensor = self.inner_forward_impl(
-                quant_input.value, quant_weight.value, quant_bias.value)
+            output_tensor = self.quant_inner_forward_impl(
+                quant_input, quant_weight, quant_bias.value)
 
             if (self.return_quant_tensor and output_scale is not None and
                 (quant_bias.scale is None or
@@ -343,7 +373,7 @@ class QuantWeightBiasInputOutputLayer(QuantBiasMixin, QuantWeightMixin, QuantInp
                     quant_bias.bit_width > output_bit_width, quant_bias.bit_width, output_bit_width)
                 output_bit_width = output_bit_width + 1
         else:
-            output_tensor = self.inner_forward_impl(quant_input.value, quant_weight.value, None)
+            output_tensor = self.quant_inner_forward_impl(quant_input, quant_weight, None)
 
         if self.return_quant_tensor and not self.is_output_quant_enabled:
             if (quant_input.zero_point is not None and quant_weight.zero_point is not None and
@@ -352,6 +382,12 @@ class QuantWeightBiasInputOutputLayer(QuantBiasMixin, QuantWeightMixin, QuantInp
             elif quant_input.zero_point is not None and output_zero_point is None:
                 output_zero_point = quant_input.zero_point
 
+        # Without output quantization, a plain tensor output doesn't need any metadata
+        if (not self.return_quant_tensor and not self.is_output_quant_enabled and
+                not self.cache_inference_quant_out):
+            self._set_global_is_quant_layer(False)
+            return output_tensor
+
         quant_output = QuantTensor(
             value=output_tensor,
             scale=output_scale,
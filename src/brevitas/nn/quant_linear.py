@@ -75,7 +75,7 @@ class QuantLinear(QuantWBIOL, Linear):
             input_broadcast_shape = tuple([1] * len(inp.size()))
             quant_input_scale = quant_input_scale.view(input_broadcast_shape)
         if quant_weight_scale.shape == ():
-            weight_broadcast_shape = tuple([1] * len(self.weight.size()))
+            weight_broadcast_shape = (1, 1)
             quant_weight_scale = quant_weight_scale.view(weight_broadcast_shape)
         quant_output_scale = linear(quant_input_scale, quant_weight_scale)
         return quant_output_scale
@@ -42,6 +42,8 @@ class QuantMaxPool1d(QuantLayerMixin, MaxPool1d):
         return False
 
     def forward(self, input: Union[Tensor, QuantTensor]):
+        if self.compile_mode and not self.training:
+            return super().forward(input)
         x = self.unpack_input(input)
         if self.export_mode:
             return self.export_handler(x.value)
@@ -79,6 +81,8 @@ class QuantMaxPool2d(QuantLayerMixin, MaxPool2d):
         return False
 
     def forward(self, input: Union[Tensor, QuantTensor]):
+        if self.compile_mode and not self.training:
+            return super().forward(input)
         x = self.unpack_input(input)
         if self.export_mode:
             out = self.export_handler(x.value)
@@ -63,6 +63,99 @@ from brevitas.quant.scaled_int import Int8WeightPerTensorFloat
 from brevitas.quant.scaled_int import Int32Bias
 from brevitas.quant.scaled_int import Uint8ActPerTensorFloat
 from brevitas.quant_tensor import QuantTensor
+from brevitas.utils.torch_utils import is_dynamo_compiling
+
+
+class _QuantSeqCache:
+    """
+    Keys or values of shape (N*num_heads, S, E/num_heads) grown along the sequence dimension S.
+    Quantized inputs are stored as integers, together with the scale and zero-point that they share
+    across steps. Only per-tensor scale and zero-point are supported.
+    """
+
+    def __init__(self) -> None:
+        self.data = None
+        self.seq_len = 0
+        self.scale = None
+        self.zero_point = None
+        self.dtype = None
+
+    def reserve(self, seq_len: int) -> None:
+        # Capacity is at least doubled when exceeded, so that appending a step doesn't copy the
+        # whole cache every time
+        capacity = self.data.size(1)
+        if seq_len <= capacity:
+            return
+        data = self.data.new_empty(
+            (self.data.size(0), max(seq_len, 2 * capacity), self.data.size(2)))
+        data[:, :self.seq_len] = self.data[:, :self.seq_len]
+        self.data = data
+
+    def append(self, x: Union[Tensor, QuantTensor]) -> Tensor:
+        is_quant = isinstance(x, QuantTensor)
+        if self.data is not None and is_quant != (self.scale is not None):
+            raise RuntimeError("Quantization of cached keys and values can't change across steps.")
+        if is_quant:
+            if self.data is None:
+                if x.scale.numel() != 1 or x.zero_point.numel() != 1:
+                    raise RuntimeError(
+                        "Cached keys and values support only per-tensor scale and zero-point, "
+                        f"found scale of shape {tuple(x.scale.shape)} and zero-point of shape "
+                        f"{tuple(x.zero_point.shape)}.")
+                self.scale, self.zero_point = x.scale.detach(), x.zero_point.detach()
+            elif not (torch.equal(x.scale, self.scale) and
+                      torch.equal(x.zero_point, self.zero_point)):
+                raise RuntimeError(
+                    "Scale and zero-point of cached keys and values can't change across steps, "
+                    "make sure the model is in eval mode and that their quantizers are static.")
+            self.dtype = x.value.dtype
+            x = x.int()
+        else:
+            self.dtype = x.dtype
+            x = x.detach()
+        if self.data is None:
+            self.data = x.new_empty((x.size(0), 0, x.size(2)))
+        step_len = x.size(1)
+        self.reserve(self.seq_len + step_len)
+        self.data[:, self.seq_len:self.seq_len + step_len] = x
+        self.seq_len += step_len
+        return self.dequantize()
+
+    def dequantize(self) -> Tensor:
+        data = self.data[:, :self.seq_len]
+        if self.scale is None:
+            return data
+        data = (data.to(self.scale.dtype) - self.zero_point) * self.scale
+        return data.to(self.dtype)
+
+
+class QuantKVCache:
+    """
+    Cache of keys and values for incremental decoding with :class:`QuantMultiheadAttention`.
+    Passing the same instance to each call of the layer, only the keys and values of the new steps
+    are projected and quantized, and they are appended to the ones of the previous steps. Keys and
+    values quantized by ``k_transposed_quant`` and ``v_quant`` are stored as integers, e.g. int8,
+    together with their scale and zero-point, which therefore have to be static across steps, as in
+    eval mode with per-tensor activation quantizers.
+
+    Examples:
+        >>> mha.eval()
+        >>> kv_cache = QuantKVCache()
+        >>> out, _ = mha(prompt, prompt, prompt, attn_mask=causal_mask, kv_cache=kv_cache)
+        >>> out, _ = mha(next_token, next_token, next_token, kv_cache=kv_cache)
+    """
+
+    def __init__(self) -> None:
+        self.keys = _QuantSeqCache()
+        self.values = _QuantSeqCache()
+
+    @property
+    def seq_len(self) -> int:
+        return self.keys.seq_len
+
+    def reset(self) -> None:
+        self.keys = _QuantSeqCache()
+        self.values = _QuantSeqCache()
 
 
 class QuantMultiheadAttention(Module):
@@ -203,6 +296,12 @@ class QuantMultiheadAttention(Module):
         self.v_quant = QuantIdentity(act_quant=v_quant, **filter_kwargs('v_'))
 
         self.add_zero_attn = add_zero_attn
+        # Plain tensor execution in eval mode, see brevitas.graph.inference.enable_compile_mode
+        self.compile_mode = False
+        # Attention without the full attention weights in eval mode, see
+        # brevitas.graph.inference.enable_fused_attention
+        self.fused_attention = False
+        self.query_chunk_size = 128
         self._reset_parameters()
 
     def _reset_parameters(self):
@@ -228,6 +327,62 @@ class QuantMultiheadAttention(Module):
         if self.bias_v is not None:
             xavier_normal_(self.bias_v)
 
+    @property
+    def is_softmax_quant_enabled(self):
+        return (
+            self.softmax_input_quant.act_quant.is_quant_enabled or
+            self.attn_output_weights_quant.act_quant.is_quant_enabled)
+
+    @staticmethod
+    def _kv_cache_quant(quant: QuantIdentity, x: Tensor) -> Union[Tensor, QuantTensor]:
+        # The cache stores the integer representation of its inputs, so it needs the output of
+        # the quantizer as a QuantTensor
+        return_quant_tensor = quant.return_quant_tensor
+        quant.return_quant_tensor = True
+        try:
+            out = quant(x)
+        finally:
+            quant.return_quant_tensor = return_quant_tensor
+        if isinstance(out, QuantTensor) and not out.is_valid:
+            return out.value
+        return out
+
+    def fused_attention_forward(
+            self,
+            q_scaled: Union[Tensor, QuantTensor],
+            k_transposed: Union[Tensor, QuantTensor],
+            v: Union[Tensor, QuantTensor],
+            attn_mask: Optional[Tensor]) -> Tensor:
+        """
+        Compute the attention output without materializing the attention weights of all the
+        queries at once. Without quantization of the input or output of the softmax, the whole
+        computation is performed by ``F.scaled_dot_product_attention``, which can dispatch to
+        memory efficient or flash attention kernels. Otherwise, queries are processed in chunks of
+        ``query_chunk_size``, so that memory grows linearly with the target sequence length.
+        """
+        q_scaled, k_transposed, v = [
+            t.value if isinstance(t, QuantTensor) else t for t in (q_scaled, k_transposed, v)]
+        if not self.is_softmax_quant_enabled and torch_version >= version.parse('2.1'):
+            # q_scaled is already scaled by the square root of the head dimension
+            return F.scaled_dot_product_attention(
+                q_scaled, k_transposed.transpose(-2, -1), v, attn_mask=attn_mask, scale=1.)
+        attn_outputs = []
+        for start in range(0, q_scaled.size(1), self.query_chunk_size):
+            q_chunk = q_scaled[:, start:start + self.query_chunk_size]
+            if attn_mask is not None:
+                mask_chunk = attn_mask
+                # attn_mask might be broadcast along the target sequence length
+                if attn_mask.size(1) > 1:
+                    mask_chunk = attn_mask[:, start:start + self.query_chunk_size]
+                attn_output_weights = torch.baddbmm(mask_chunk, q_chunk, k_transposed)
+            else:
+                attn_output_weights = torch.bmm(q_chunk, k_transposed)
+            attn_output_weights = self.softmax_input_quant(attn_output_weights)
+            attn_output_weights = F.softmax(attn_output_weights, dim=-1)
+            attn_output_weights = self.attn_output_weights_quant(attn_output_weights)
+            attn_outputs.append(torch.bmm(attn_output_weights, v))
+        return torch.cat(attn_outputs, dim=1)
+
     def mha_shape_check(
             self,
             query: Union[Tensor, QuantTensor],
@@ -235,7 +390,8 @@ class QuantMultiheadAttention(Module):
             value: Union[Tensor, QuantTensor],
             key_padding_mask: Optional[Tensor],
             attn_mask: Optional[Tensor],
-            num_heads: int):
+            num_heads: int,
+            cache_len: int = 0):
         # Verifies the expected shape for `query, `key`, `value`, `key_padding_mask` and `attn_mask`
         # and returns if the input is batched or not.
         # Raises an error if `query` is not 2-D (unbatched) or 3-D (batched) tensor.
@@ -272,7 +428,7 @@ class QuantMultiheadAttention(Module):
                     ("For unbatched (2-D) `query`, expected `attn_mask` to be `None`, 2-D or 3-D"
                      f" but found {attn_mask.dim()}-D tensor instead")
                 if attn_mask.dim() == 3:
-                    expected_shape = (num_heads, query.shape[0], key.shape[0])
+                    expected_shape = (num_heads, query.shape[0], cache_len + key.shape[0])
                     assert attn_mask.shape == expected_shape, \
                         (f"Expected `attn_mask` shape to be {expected_shape} but got {attn_mask.shape}")
         else:
@@ -300,7 +456,8 @@ class QuantMultiheadAttention(Module):
             use_separate_proj_weight: bool = False,
             static_k: Optional[Tensor] = None,
             static_v: Optional[Tensor] = None,
-            average_attn_weights: bool = True) -> Tuple[Tensor, Optional[Tensor]]:
+            average_attn_weights: bool = True,
+            kv_cache: Optional[QuantKVCache] = None) -> Tuple[Tensor, Optional[Tensor]]:
         r"""
         Args:
             query, key, value: map a query and a set of key-value pairs to an output.
@@ -328,6 +485,8 @@ class QuantMultiheadAttention(Module):
             average_attn_weights: If true, indicates that the returned ``attn_weights`` should be averaged across heads.
                 Otherwise, ``attn_weights`` are provided separately per head. Note that this flag only has an effect
                 when ``need_weights=True.``. Default: True
+            kv_cache: keys and values of the previous steps of incremental decoding, to which the
+                ones of the current step are appended, see :class:`QuantKVCache`.
 
 
         Shape:
@@ -353,6 +512,7 @@ class QuantMultiheadAttention(Module):
               N is the batch size, E is the embedding dimension. E/num_heads is the head dimension.
             - static_v: :math:`(N*num_heads, S, E/num_heads)`, where S is the source sequence length,
               N is the batch size, E is the embedding dimension. E/num_heads is the head dimension.
+            With a ``kv_cache``, S in the shape of the masks includes the length of the cache.
 
             Outputs:
             - attn_output: :math:`(L, E)` or :math:`(L, N, E)` where L is the target sequence length, N is the batch size,
@@ -364,7 +524,16 @@ class QuantMultiheadAttention(Module):
               head of shape :math:`(num_heads, L, S)` when input is unbatched or :math:`(N, num_heads, L, S)`.
         """
 
-        is_batched = self.mha_shape_check(query, key, value, key_padding_mask, attn_mask, num_heads)
+        if kv_cache is not None and (bias_k is not None or add_zero_attn or static_k is not None or
+                                     static_v is not None):
+            raise RuntimeError(
+                "KV-cache is not supported with add_bias_kv, add_zero_attn, static_k or static_v.")
+        cache_len = kv_cache.seq_len if kv_cache is not None else 0
+        is_batched = self.mha_shape_check(
+            query, key, value, key_padding_mask, attn_mask, num_heads, cache_len)
+        compile_mode = self.compile_mode and not self.training
+        # Named dimensions are only required by PTQ algorithms, and not supported when tracing
+        use_names = not torch._C._get_tracing_state() and not compile_mode
 
         # For unbatched input, we unsqueeze at the expected batch-dim to pretend that the input
         # is batched, run the computation and before returning squeeze the
@@ -380,6 +549,8 @@ class QuantMultiheadAttention(Module):
         # set up shape vars
         tgt_len, bsz, embed_dim = query.shape
         src_len, _, _ = key.shape
+        # Keys and values of the previous steps are read from the cache
+        src_len = cache_len + src_len
         if key_padding_mask is not None:
             _kpm_dtype = key_padding_mask.dtype
             if _kpm_dtype != torch.bool and not torch.is_floating_point(key_padding_mask):
@@ -405,9 +576,11 @@ class QuantMultiheadAttention(Module):
         #
 
         if self.in_proj is not None:
-            if check_tensors_same_ptr([key, query, value]):
+            # data pointers are not available while tracing with torch.compile, in which case
+            # self-attention is assumed, as enforced in eager mode
+            if is_dynamo_compiling() or check_tensors_same_ptr([key, query, value]):
                 # Mark dimensions through named tensors.
-                if not torch._C._get_tracing_state():
+                if use_names:
                     if isinstance(query, QuantTensor):
                         query.value.rename_('L', 'N', 'E')
                     else:
@@ -423,7 +596,7 @@ class QuantMultiheadAttention(Module):
             assert self.k_proj is not None, "use_separate_proj_weight is True but k_proj is None"
             assert self.v_proj is not None, "use_separate_proj_weight is True but v_proj is None"
             # Mark dimensions through named tensors.
-            if not torch._C._get_tracing_state():
+            if use_names:
                 for t in [query, key, value]:
                     if isinstance(t, QuantTensor):
                         t.value.rename_('L', 'N', 'E')
@@ -431,7 +604,7 @@ class QuantMultiheadAttention(Module):
                         t.rename_('L', 'N', 'E')
             q, k, v = self.q_proj(query), self.k_proj(key), self.v_proj(value)
         # Remove names to avoid errors downstream
-        if not torch._C._get_tracing_state():
+        if use_names:
             for t in [q, k, v]:
                 t.rename_(None)
 
@@ -510,7 +683,7 @@ class QuantMultiheadAttention(Module):
                 key_padding_mask = F.pad(key_padding_mask, (0, 1))
 
         # update source sequence length after adjustments
-        src_len = k.size(1)
+        src_len = cache_len + k.size(1)
 
         # merge key padding and attention masks
         if key_padding_mask is not None:
@@ -545,33 +718,47 @@ class QuantMultiheadAttention(Module):
 
         # Quantize q_scaled and k_transposed
         q_scaled = self.q_scaled_quant(q_scaled)
-        k_transposed = self.k_transposed_quant(k_transposed)
-
-        if attn_mask is not None:
-            attn_output_weights = torch.baddbmm(attn_mask, q_scaled, k_transposed)
+        if kv_cache is not None:
+            # Keys and values of the current step are stored quantized, and the attention is
+            # computed over all the steps so far
+            k_transposed = self._kv_cache_quant(self.k_transposed_quant, k_transposed)
+            k_transposed = kv_cache.keys.append(k_transposed.transpose(-2, -1)).transpose(-2, -1)
+            v = kv_cache.values.append(self._kv_cache_quant(self.v_quant, v))
+        else:
+            k_transposed = self.k_transposed_quant(k_transposed)
+            v = self.v_quant(v)
+
+        # The fused path doesn't return the attention weights, and it's not traced for export
+        fused_attention = (
+            self.fused_attention and not self.training and not need_weights and
+            not torch._C._get_tracing_state())
+        if fused_attention:
+            attn_output = self.fused_attention_forward(q_scaled, k_transposed, v, attn_mask)
         else:
-            attn_output_weights = torch.bmm(q_scaled, k_transposed)
+            if attn_mask is not None:
+                attn_output_weights = torch.baddbmm(attn_mask, q_scaled, k_transposed)
+            else:
+                attn_output_weights = torch.bmm(q_scaled, k_transposed)
 
-        # Quantize the input to softmax, if any
-        attn_output_weights = self.softmax_input_quant(attn_output_weights)
+            # Quantize the input to softmax, if any
+            attn_output_weights = self.softmax_input_quant(attn_output_weights)
 
-        attn_output_weights = F.softmax(attn_output_weights, dim=-1)
-        if dropout_p > 0.0:
-            attn_output_weights = F.dropout(attn_output_weights, p=dropout_p)
+            attn_output_weights = F.softmax(attn_output_weights, dim=-1)
+            if dropout_p > 0.0:
+                attn_output_weights = F.dropout(attn_output_weights, p=dropout_p)
 
-        # Quantize attn_output_weights and value
-        attn_output_weights = self.attn_output_weights_quant(attn_output_weights)
-        v = self.v_quant(v)
+            # Quantize attn_output_weights
+            attn_output_weights = self.attn_output_weights_quant(attn_output_weights)
 
-        attn_output = torch.bmm(attn_output_weights, v)
+            attn_output = torch.bmm(attn_output_weights, v)
         # preserve the 3D input compared to the float version to be able to do row wise scaling
         attn_output = attn_output.transpose(0, 1).contiguous().view(tgt_len, bsz, embed_dim)
         # Set dim names for PTQ algorithms that requires it
-        if not torch._C._get_tracing_state():
+        if use_names:
             attn_output.rename_('L', 'N', 'E')
         attn_output = self.out_proj(attn_output)
         # Remove names to avoid errors un unsupported downstream ops
-        if not torch._C._get_tracing_state():
+        if use_names:
             if isinstance(attn_output, QuantTensor):
                 attn_output.value.rename_(None)
             else:
@@ -602,7 +789,8 @@ class QuantMultiheadAttention(Module):
             key_padding_mask: Optional[Tensor] = None,
             need_weights: bool = True,
             attn_mask: Optional[Tensor] = None,
-            average_attn_weights: bool = True) -> Tuple[Tensor, Optional[Tensor]]:
+            average_attn_weights: bool = True,
+            kv_cache: Optional[QuantKVCache] = None) -> Tuple[Tensor, Optional[Tensor]]:
         r"""
     Args:
         query: Query embeddings of shape :math:`(L, E_q)` for unbatched input, :math:`(L, N, E_q)` when ``batch_first=False``
@@ -636,6 +824,10 @@ class QuantMultiheadAttention(Module):
         average_attn_weights: If true, indicates that the returned ``attn_weights`` should be averaged across
             heads. Otherwise, ``attn_weights`` are provided separately per head. Note that this flag only has an
             effect when ``need_weights=True``. Default: ``True`` (i.e. average weights across heads)
+        kv_cache: If specified, keys and values of the previous steps of incremental decoding, which are
+            attended to together with ``key`` and ``value`` of the current step, after these are appended
+            to it. :math:`S` in the shape of the masks then includes the length of the cache. Requires
+            ``add_bias_kv=False`` and ``add_zero_attn=False``. See :class:`QuantKVCache`.
 
     Outputs:
         - **attn_output** - Attention outputs of shape :math:`(L, E)` when input is unbatched,
@@ -652,10 +844,13 @@ class QuantMultiheadAttention(Module):
             `batch_first` argument is ignored for unbatched inputs.
         """
         is_batched = query.dim() == 3
-        if any([hasattr(t, 'is_nested') and t.is_nested for t in (query, key, value)]):
+        if any([isinstance(t, Tensor) and t.is_nested for t in (query, key, value)]):
             raise RuntimeError("Nested inputs not supported for quantization.")
 
-        if self.batch_first and is_batched:
+        if self.batch_first and is_batched and is_dynamo_compiling():
+            # identity checks on tensors are not supported while tracing with torch.compile
+            query, key, value = [x.transpose(1, 0) for x in (query, key, value)]
+        elif self.batch_first and is_batched:
             # make sure that the transpose op does not affect the "is" property
             if key is value:
                 if query is key:
@@ -680,7 +875,8 @@ class QuantMultiheadAttention(Module):
             key_padding_mask=key_padding_mask,
             need_weights=need_weights,
             attn_mask=attn_mask,
-            average_attn_weights=average_attn_weights)
+            average_attn_weights=average_attn_weights,
+            kv_cache=kv_cache)
         if self.batch_first and is_batched:
             return attn_output.transpose(1, 0), attn_output_weights
         else:
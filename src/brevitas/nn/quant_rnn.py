@@ -3,8 +3,11 @@
 
 from abc import ABCMeta
 from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
 from functools import partial
 import math
+import threading
 from typing import List, Optional, Tuple
 
 import torch
@@ -23,6 +26,7 @@ from brevitas.quant import Int8ActPerTensorFloat
 from brevitas.quant import Int8WeightPerTensorFloat
 from brevitas.quant import Int32Bias
 from brevitas.quant import Uint8ActPerTensorFloat
+from brevitas.quant_tensor import QuantTensor
 
 QuantTupleShortEnabled = List[Tuple[Tensor, Tensor, Tensor, Tensor]]
 QuantTupleShortDisabled = List[Tuple[Tensor, Optional[Tensor], Optional[Tensor], Optional[Tensor]]]
@@ -52,7 +56,7 @@ class GateWeight(QuantWeightMixin, nn.Module):
         return self.weight.size(self.output_channel_dim)
 
     def forward(self):
-        return self.weight_quant(self.weight)
+        return self.quant_weight()
 
 
 class GateParams(QuantBiasMixin, nn.Module):
@@ -118,7 +122,7 @@ class _QuantStatesInit(nn.Module):
 
 
 class _QuantRNNCell(nn.Module):
-    __constants__ = ['reverse_input', 'batch_first']
+    __constants__ = ['reverse_input', 'batch_first', 'fused_gates']
 
     def __init__(
             self,
@@ -128,17 +132,22 @@ class _QuantRNNCell(nn.Module):
             reverse_input: bool,
             batch_first: bool,
             output_quant_enabled: bool,
-            fast_impl: bool):
+            fast_impl: bool,
+            fused_gates: bool = False):
         super(_QuantRNNCell, self).__init__()
         self.act_fn = act_fn
         self.gate_acc_quant = gate_acc_quant
         self.output_quant = output_quant
         self.reverse_input = reverse_input
         self.batch_first = batch_first
+        self.fused_gates = fused_gates
         self.hidden_states_init = _QuantStatesInit(fast_impl, output_quant_enabled)
 
     def forward_iter(self, quant_input, quant_state, quant_weight_ih, quant_weight_hh, quant_bias):
         quant_gate_ih = F.linear(quant_input, quant_weight_ih)
+        return self.forward_gate(quant_gate_ih, quant_state, quant_weight_hh, quant_bias)
+
+    def forward_gate(self, quant_gate_ih, quant_state, quant_weight_hh, quant_bias):
         quant_gate_hh = F.linear(quant_state, quant_weight_hh)
         quant_gate = self.gate_acc_quant(quant_gate_ih + quant_gate_hh + quant_bias)[0]
         quant_gate = self.act_fn(quant_gate)
@@ -153,9 +162,15 @@ class _QuantRNNCell(nn.Module):
             quant_weight_hh: Tensor,
             quant_bias: Tensor):
         if self.batch_first:
-            quant_inputs = quant_input.unbind(1)
+            seq_dim = 1
         else:
-            quant_inputs = quant_input.unbind(0)
+            seq_dim = 0
+        if self.fused_gates:
+            # The input projection doesn't depend on the state, so it's computed for the whole
+            # sequence at once
+            quant_inputs = F.linear(quant_input, quant_weight_ih).unbind(seq_dim)
+        else:
+            quant_inputs = quant_input.unbind(seq_dim)
         end = len(quant_inputs)
         step = 1
         index = 0
@@ -165,8 +180,12 @@ class _QuantRNNCell(nn.Module):
             step = -1
         for _ in range(end):
             quant_input = quant_inputs[index]
-            quant_state_tuple = self.forward_iter(
-                quant_input, quant_state, quant_weight_ih, quant_weight_hh, quant_bias)
+            if self.fused_gates:
+                quant_state_tuple = self.forward_gate(
+                    quant_input, quant_state, quant_weight_hh, quant_bias)
+            else:
+                quant_state_tuple = self.forward_iter(
+                    quant_input, quant_state, quant_weight_ih, quant_weight_hh, quant_bias)
             index = index + step
             quant_outputs += [quant_state_tuple]
             quant_state = quant_state_tuple[0]
@@ -174,7 +193,7 @@ class _QuantRNNCell(nn.Module):
 
 
 class _QuantLSTMCell(nn.Module):
-    __constants__ = ['reverse_input', 'batch_first', 'cifg']
+    __constants__ = ['reverse_input', 'batch_first', 'cifg', 'fused_gates']
 
     def __init__(
             self,
@@ -194,7 +213,8 @@ class _QuantLSTMCell(nn.Module):
             cifg: bool,
             output_quant_enabled: bool,
             cell_state_quant_enabled: bool,
-            fast_impl: bool):
+            fast_impl: bool,
+            fused_gates: bool = False):
         super(_QuantLSTMCell, self).__init__()
         self.output_quant = output_quant
         self.cell_state_quant = cell_state_quant
@@ -210,6 +230,7 @@ class _QuantLSTMCell(nn.Module):
         self.reverse_input = reverse_input
         self.batch_first = batch_first
         self.cifg = cifg
+        self.fused_gates = fused_gates
         self.hidden_states_init = _QuantStatesInit(fast_impl, output_quant_enabled)
         self.cell_states_init = _QuantStatesInit(fast_impl, cell_state_quant_enabled)
 
@@ -230,9 +251,50 @@ class _QuantLSTMCell(nn.Module):
             quant_bias_forget: Tensor,
             quant_bias_cell: Tensor,
             quant_bias_output: Tensor):
-        # Input gate
         quant_ii_gate = F.linear(quant_input, quant_weight_ii)
         quant_hi_gate = F.linear(quant_hidden_state, quant_weight_hi)
+        if self.cifg:
+            # The forget gate is computed from the input gate, set its projections to the input ones
+            quant_if_gate = quant_ii_gate
+            quant_hf_gate = quant_hi_gate
+        else:
+            quant_if_gate = F.linear(quant_input, quant_weight_if)
+            quant_hf_gate = F.linear(quant_hidden_state, quant_weight_hf)
+        quant_ic_gate = F.linear(quant_input, quant_weight_ic)
+        quant_hc_gate = F.linear(quant_hidden_state, quant_weight_hc)
+        quant_io_gate = F.linear(quant_input, quant_weight_io)
+        quant_ho_gate = F.linear(quant_hidden_state, quant_weight_ho)
+        return self.forward_gates(
+            quant_ii_gate,
+            quant_if_gate,
+            quant_ic_gate,
+            quant_io_gate,
+            quant_hi_gate,
+            quant_hf_gate,
+            quant_hc_gate,
+            quant_ho_gate,
+            quant_cell_state,
+            quant_bias_input,
+            quant_bias_forget,
+            quant_bias_cell,
+            quant_bias_output)
+
+    def forward_gates(
+            self,
+            quant_ii_gate: Tensor,
+            quant_if_gate: Tensor,
+            quant_ic_gate: Tensor,
+            quant_io_gate: Tensor,
+            quant_hi_gate: Tensor,
+            quant_hf_gate: Tensor,
+            quant_hc_gate: Tensor,
+            quant_ho_gate: Tensor,
+            quant_cell_state: Tensor,
+            quant_bias_input: Tensor,
+            quant_bias_forget: Tensor,
+            quant_bias_cell: Tensor,
+            quant_bias_output: Tensor):
+        # Input gate
         quant_input_gate = self.input_acc_quant(quant_ii_gate + quant_hi_gate + quant_bias_input)[0]
         quant_input_gate = self.input_sigmoid_quant(quant_input_gate)[0]
         # Forget gate
@@ -241,19 +303,13 @@ class _QuantLSTMCell(nn.Module):
             # CIFG is defined as 1 - input_gate, in line with ONNXRuntime
             quant_forget_gate = quant_ones - quant_input_gate
         else:
-            quant_if_gate = F.linear(quant_input, quant_weight_if)
-            quant_hf_gate = F.linear(quant_hidden_state, quant_weight_hf)
             quant_forget_gate = self.forget_acc_quant(
                 quant_if_gate + quant_hf_gate + quant_bias_forget)[0]
             quant_forget_gate = self.forget_sigmoid_quant(quant_forget_gate)[0]
         # Cell gate
-        quant_ic_gate = F.linear(quant_input, quant_weight_ic)
-        quant_hc_gate = F.linear(quant_hidden_state, quant_weight_hc)
         quant_cell_gate = self.cell_acc_quant(quant_ic_gate + quant_hc_gate + quant_bias_cell)[0]
         quant_cell_gate = self.cell_tanh_quant(quant_cell_gate)[0]
         # Output gate
-        quant_io_gate = F.linear(quant_input, quant_weight_io)
-        quant_ho_gate = F.linear(quant_hidden_state, quant_weight_ho)
         quant_out_gate = self.output_acc_quant(quant_io_gate + quant_ho_gate + quant_bias_output)[0]
         quant_out_gate = self.output_sigmoid_quant(quant_out_gate)[0]
         quant_forget_cell = self.cell_state_quant(quant_forget_gate * quant_cell_state)[0]
@@ -264,6 +320,24 @@ class _QuantLSTMCell(nn.Module):
         quant_hidden_state_tuple = self.output_quant(quant_hidden_state)
         return quant_hidden_state_tuple, quant_cell_state_tuple
 
+    def cat_gates(
+            self, quant_input_gate: Tensor, quant_forget_gate: Tensor, quant_cell_gate: Tensor,
+            quant_output_gate: Tensor):
+        if self.cifg:
+            return torch.cat([quant_input_gate, quant_cell_gate, quant_output_gate], dim=0)
+        else:
+            return torch.cat(
+                [quant_input_gate, quant_forget_gate, quant_cell_gate, quant_output_gate], dim=0)
+
+    def split_gates(self, quant_gates: Tensor) -> Tuple[Tensor, Tensor, Tensor, Tensor]:
+        if self.cifg:
+            gates = quant_gates.chunk(3, dim=-1)
+            # The forget gate is computed from the input gate, set it to the input one
+            return gates[0], gates[0], gates[1], gates[2]
+        else:
+            gates = quant_gates.chunk(4, dim=-1)
+            return gates[0], gates[1], gates[2], gates[3]
+
     def forward(
             self,
             quant_input: Tensor,
@@ -285,7 +359,17 @@ class _QuantLSTMCell(nn.Module):
             seq_dim = 1
         else:
             seq_dim = 0
-        quant_inputs = quant_input.unbind(seq_dim)
+        if self.fused_gates:
+            # Input projections don't depend on the state, so they are computed for the whole
+            # sequence at once, while the hidden ones are computed by a single matmul per step
+            quant_weight_i = self.cat_gates(
+                quant_weight_ii, quant_weight_if, quant_weight_ic, quant_weight_io)
+            quant_weight_h = self.cat_gates(
+                quant_weight_hi, quant_weight_hf, quant_weight_hc, quant_weight_ho)
+            quant_inputs = F.linear(quant_input, quant_weight_i).unbind(seq_dim)
+        else:
+            quant_weight_h = quant_weight_hi
+            quant_inputs = quant_input.unbind(seq_dim)
         end = len(quant_inputs)
         step = 1
         index = 0
@@ -296,22 +380,42 @@ class _QuantLSTMCell(nn.Module):
         quant_cell_states = self.cell_states_init()
         for _ in range(end):
             quant_input = quant_inputs[index]
-            quant_hidden_state_tuple, quant_cell_state_tuple = self.forward_iter(
-                quant_input,
-                quant_hidden_state,
-                quant_cell_state,
-                quant_weight_ii,
-                quant_weight_if,
-                quant_weight_ic,
-                quant_weight_io,
-                quant_weight_hi,
-                quant_weight_hf,
-                quant_weight_hc,
-                quant_weight_ho,
-                quant_bias_input,
-                quant_bias_forget,
-                quant_bias_cell,
-                quant_bias_output)
+            if self.fused_gates:
+                quant_ii_gate, quant_if_gate, quant_ic_gate, quant_io_gate = self.split_gates(
+                    quant_input)
+                quant_hi_gate, quant_hf_gate, quant_hc_gate, quant_ho_gate = self.split_gates(
+                    F.linear(quant_hidden_state, quant_weight_h))
+                quant_hidden_state_tuple, quant_cell_state_tuple = self.forward_gates(
+                    quant_ii_gate,
+                    quant_if_gate,
+                    quant_ic_gate,
+                    quant_io_gate,
+                    quant_hi_gate,
+                    quant_hf_gate,
+                    quant_hc_gate,
+                    quant_ho_gate,
+                    quant_cell_state,
+                    quant_bias_input,
+                    quant_bias_forget,
+                    quant_bias_cell,
+                    quant_bias_output)
+            else:
+                quant_hidden_state_tuple, quant_cell_state_tuple = self.forward_iter(
+                    quant_input,
+                    quant_hidden_state,
+                    quant_cell_state,
+                    quant_weight_ii,
+                    quant_weight_if,
+                    quant_weight_ic,
+                    quant_weight_io,
+                    quant_weight_hi,
+                    quant_weight_hf,
+                    quant_weight_hc,
+                    quant_weight_ho,
+                    quant_bias_input,
+                    quant_bias_forget,
+                    quant_bias_cell,
+                    quant_bias_output)
             index = index + step
             quant_hidden_states += [quant_hidden_state_tuple]
             quant_hidden_state = quant_hidden_state_tuple[0]
@@ -340,6 +444,7 @@ class _QuantRNNLayer(QuantRecurrentLayerMixin, nn.Module):
             dtype: Optional[torch.dtype],
             device: Optional[torch.device],
             input_weight: GateWeight = None,
+            fuse_gate_gemms: bool = False,
             **kwargs):
         nn.Module.__init__(self)
         io_quant = QuantIdentity(io_quant, act_kwargs_prefix='io_', **kwargs)
@@ -358,7 +463,8 @@ class _QuantRNNLayer(QuantRecurrentLayerMixin, nn.Module):
             reverse_input,
             batch_first,
             io_quant.act_quant.is_quant_enabled,
-            fast_impl=False)
+            fast_impl=False,
+            fused_gates=fuse_gate_gemms)
         QuantRecurrentLayerMixin.__init__(
             self,
             cell=cell,
@@ -407,19 +513,30 @@ class _QuantRNNLayer(QuantRecurrentLayerMixin, nn.Module):
                 self.cell.reverse_input,
                 self.cell.batch_first,
                 self.cell.output_quant.is_quant_enabled,
-                fast_impl=True)
+                fast_impl=True,
+                fused_gates=self.cell.fused_gates)
             if brevitas.config.JIT_ENABLED:
                 self._fast_cell = torch.jit.script(self._fast_cell)
             return self._fast_cell
 
-    def forward(self, inp, state):
-        quant_input = self.maybe_quantize_input(inp)
+    def quant_gate_params(self, quant_input):
+        """
+        Quantized input-to-hidden weight, hidden-to-hidden weight and bias of the gate, given the
+        quantized input of the layer.
+        """
         quant_weight_ih, quant_weight_hh, quant_bias = self.gate_params_fwd(
             self.gate_params, quant_input)
         if quant_bias.value is None:
             quant_bias = torch.tensor(0., device=quant_input.value.device)
         else:
             quant_bias = quant_bias.value
+        return quant_weight_ih.value, quant_weight_hh.value, quant_bias
+
+    def forward(self, inp, state, quant_gate_params=None):
+        quant_input = self.maybe_quantize_input(inp)
+        if quant_gate_params is None:
+            quant_gate_params = self.quant_gate_params(quant_input)
+        quant_weight_ih, quant_weight_hh, quant_bias = quant_gate_params
         quant_state = self.maybe_quantize_state(quant_input.value, state, self.cell.output_quant)
         if self.export_mode:
             cell = self.export_handler
@@ -428,11 +545,7 @@ class _QuantRNNLayer(QuantRecurrentLayerMixin, nn.Module):
         else:
             cell = self.cell
         quant_outputs = cell(
-            quant_input.value,
-            quant_state.value,
-            quant_weight_ih.value,
-            quant_weight_hh.value,
-            quant_bias)
+            quant_input.value, quant_state.value, quant_weight_ih, quant_weight_hh, quant_bias)
         quant_output = self.pack_quant_outputs(quant_outputs)
         quant_state = self.pack_quant_state(quant_outputs[-1], self.cell.output_quant)
         return quant_output, quant_state
@@ -499,6 +612,7 @@ class _QuantLSTMLayer(QuantRecurrentLayerMixin, nn.Module):
             input_forget_weight: GateWeight = None,
             input_cell_weight: GateWeight = None,
             input_output_weight: GateWeight = None,
+            fuse_gate_gemms: bool = False,
             **kwargs):
         nn.Module.__init__(self)
         io_quant = QuantIdentity(io_quant, act_kwargs_prefix='io_', **kwargs)
@@ -551,7 +665,8 @@ class _QuantLSTMLayer(QuantRecurrentLayerMixin, nn.Module):
             cifg=cifg,
             output_quant_enabled=io_quant.act_quant.is_quant_enabled,
             cell_state_quant_enabled=cell_state_quant.act_quant.is_quant_enabled,
-            fast_impl=False)
+            fast_impl=False,
+            fused_gates=fuse_gate_gemms)
         QuantRecurrentLayerMixin.__init__(
             self,
             cell=cell,
@@ -659,13 +774,17 @@ class _QuantLSTMLayer(QuantRecurrentLayerMixin, nn.Module):
                 cifg=self.cell.cifg,
                 output_quant_enabled=self.cell.output_quant.is_quant_enabled,
                 cell_state_quant_enabled=self.cell.cell_state_quant.is_quant_enabled,
-                fast_impl=True)
+                fast_impl=True,
+                fused_gates=self.cell.fused_gates)
             if brevitas.config.JIT_ENABLED:
                 self._fast_cell = torch.jit.script(self._fast_cell)
             return self._fast_cell
 
-    def forward(self, inp, hidden_state, cell_state):
-        quant_input = self.maybe_quantize_input(inp)
+    def quant_gate_params(self, quant_input):
+        """
+        Quantized input-to-hidden weights, hidden-to-hidden weights and biases of the input,
+        forget, cell and output gates, in this order, given the quantized input of the layer.
+        """
         quant_weight_ii, quant_weight_hi, quant_bias_input = self.gate_params_fwd(
             self.input_gate_params, quant_input)
         quant_weight_ic, quant_weight_hc, quant_bias_cell = self.gate_params_fwd(
@@ -696,6 +815,37 @@ class _QuantLSTMLayer(QuantRecurrentLayerMixin, nn.Module):
             quant_bias_output = torch.tensor(0., device=quant_input.value.device)
         else:
             quant_bias_output = quant_bias_output.value
+        return (
+            quant_weight_ii.value,
+            quant_weight_if.value,
+            quant_weight_ic.value,
+            quant_weight_io.value,
+            quant_weight_hi.value,
+            quant_weight_hf.value,
+            quant_weight_hc.value,
+            quant_weight_ho.value,
+            quant_bias_input,
+            quant_bias_forget,
+            quant_bias_cell,
+            quant_bias_output)
+
+    def forward(self, inp, hidden_state, cell_state, quant_gate_params=None):
+        quant_input = self.maybe_quantize_input(inp)
+        if quant_gate_params is None:
+            quant_gate_params = self.quant_gate_params(quant_input)
+        (
+            quant_weight_ii,
+            quant_weight_if,
+            quant_weight_ic,
+            quant_weight_io,
+            quant_weight_hi,
+            quant_weight_hf,
+            quant_weight_hc,
+            quant_weight_ho,
+            quant_bias_input,
+            quant_bias_forget,
+            quant_bias_cell,
+            quant_bias_output) = quant_gate_params
         quant_hidden_state = self.maybe_quantize_state(
             quant_input.value, hidden_state, self.cell.output_quant)
         quant_cell_state = self.maybe_quantize_state(
@@ -711,14 +861,14 @@ class _QuantLSTMLayer(QuantRecurrentLayerMixin, nn.Module):
             quant_input.value,
             quant_hidden_state.value,
             quant_cell_state.value,
-            quant_weight_ii=quant_weight_ii.value,
-            quant_weight_if=quant_weight_if.value,
-            quant_weight_ic=quant_weight_ic.value,
-            quant_weight_io=quant_weight_io.value,
-            quant_weight_hi=quant_weight_hi.value,
-            quant_weight_hf=quant_weight_hf.value,
-            quant_weight_hc=quant_weight_hc.value,
-            quant_weight_ho=quant_weight_ho.value,
+            quant_weight_ii=quant_weight_ii,
+            quant_weight_if=quant_weight_if,
+            quant_weight_ic=quant_weight_ic,
+            quant_weight_io=quant_weight_io,
+            quant_weight_hi=quant_weight_hi,
+            quant_weight_hf=quant_weight_hf,
+            quant_weight_hc=quant_weight_hc,
+            quant_weight_ho=quant_weight_ho,
             quant_bias_input=quant_bias_input,
             quant_bias_forget=quant_bias_forget,
             quant_bias_cell=quant_bias_cell,
@@ -770,6 +920,51 @@ class _QuantLSTMLayer(QuantRecurrentLayerMixin, nn.Module):
             state_dict, prefix, local_metadata, strict, missing_keys, unexpected_keys, error_msgs)
 
 
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _shared_executor():
+    # A single pool, created on first use, is shared by every recurrent stack so that worker
+    # threads don't grow with the number of models. Callables don't submit other callables, so
+    # they can't deadlock waiting for a worker
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(thread_name_prefix='brevitas_recurrent')
+        return _EXECUTOR
+
+
+def _run_concurrently(fns):
+    # Grad mode is propagated to the workers, since it's thread local. The number of intra-op
+    # threads is process-wide and left untouched
+    grad_enabled = torch.is_grad_enabled()
+    executor = _shared_executor()
+
+    def run(fn):
+        with torch.set_grad_enabled(grad_enabled):
+            return fn()
+
+    futures = [executor.submit(run, fn) for fn in fns]
+    # Every callable is done before returning, also when one of them fails
+    wait(futures)
+    return [future.result() for future in futures]
+
+
+def _split_seq(x, split_size: int, seq_dim: int):
+    if isinstance(x, QuantTensor):
+        return [x.set(value=value) for value in x.value.split(split_size, dim=seq_dim)]
+    return list(x.split(split_size, dim=seq_dim))
+
+
+def _unpack_state(state):
+    # Output states have a leading dimension of size 1, while input states don't. Their quant
+    # metadata is dropped, since states are quantized again by the layer they are fed to
+    if isinstance(state, QuantTensor):
+        state = state.value
+    return state[0]
+
+
 class QuantRecurrentStackBase(nn.Module):
 
     def __init__(
@@ -784,6 +979,8 @@ class QuantRecurrentStackBase(nn.Module):
             dtype: Optional[torch.dtype],
             device: Optional[torch.device],
             return_quant_tensor: bool,
+            concurrent_directions: bool = False,
+            wavefront_chunk_size: Optional[int] = None,
             **kwargs):
         super(QuantRecurrentStackBase, self).__init__()
         if shared_input_hidden_weights and not bidirectional:
@@ -792,6 +989,8 @@ class QuantRecurrentStackBase(nn.Module):
             raise RuntimeError("return_quant_tensor=True requires io_quant != None.")
 
         self.num_directions = 2 if bidirectional else 1
+        self.concurrent_directions = concurrent_directions
+        self.wavefront_chunk_size = wavefront_chunk_size
         layers = []
         # Add io_quant to kwargs. This allows easy overwriting during sharing
         kwargs['io_quant'] = io_quant
@@ -833,27 +1032,117 @@ class QuantRecurrentStackBase(nn.Module):
             layers.append(nn.ModuleList(directions))
         self.layers = nn.ModuleList(layers)
 
-    def forward(self, inp, hx=None):
-        output_states = []
-        for l, layer in enumerate(self.layers):
-            dir_outputs, dir_states = [], []
-            for d, direction in enumerate(layer):
-                layer_state = hx[2 * l + d] if hx is not None else hx
-                out, out_state = direction(inp, layer_state)
-                dir_outputs += [out]
-                dir_states += [out_state]
-            if len(dir_outputs) > 1:
-                out = torch.cat(dir_outputs, dim=-1)
-                output_states += [torch.cat(dir_states, dim=0)]
+    @property
+    def is_wavefront_enabled(self):
+        # Stepping through a layer in chunks matches processing the whole sequence only when
+        # quantizers don't collect statistics, and when it's not reversed by another direction
+        return (
+            self.wavefront_chunk_size is not None and not self.training and
+            self.num_directions == 1 and len(self.layers) > 1 and
+            not self.layers[0][0].export_mode)
+
+    @property
+    def is_concurrent_directions_enabled(self):
+        # Directions share their quantizers, which can't collect statistics concurrently
+        return (
+            self.concurrent_directions and not self.training and self.num_directions > 1 and
+            not self.layers[0][0].export_mode)
+
+    def forward_layers(self, inp, layers_states):
+        """
+        Forward ``inp`` through the stack of layers, where ``layers_states`` holds the tuple of
+        input states of each direction of each layer. Returns the output of the last layer and
+        the tuples of output states, in the same order.
+        """
+        if self.is_wavefront_enabled:
+            return self.wavefront_forward_layers(inp, layers_states)
+        outputs_states = []
+        for layer, dir_states in zip(self.layers, layers_states):
+            fns = [
+                partial(direction, inp, *states) for direction, states in zip(layer, dir_states)]
+            if self.is_concurrent_directions_enabled:
+                dir_results = _run_concurrently(fns)
+            else:
+                dir_results = [fn() for fn in fns]
+            if len(dir_results) > 1:
+                out = torch.cat([result[0] for result in dir_results], dim=-1)
             else:
-                out = dir_outputs[0]
-                output_states += [dir_states[0]]
+                out = dir_results[0][0]
+            outputs_states += [[result[1:] for result in dir_results]]
             inp = out
+        return out, outputs_states
+
+    def wavefront_forward_layers(self, inp, layers_states):
+        """
+        Variant of :meth:`forward_layers` for unidirectional stacks, which splits the sequence in
+        chunks of ``wavefront_chunk_size`` steps so that layer l + 1 processes chunk c
+        concurrently to layer l processing chunk c + 1.
+        """
+        seq_dim = 1 if self.layers[0][0].cell.batch_first else 0
+        chunks = _split_seq(inp, self.wavefront_chunk_size, seq_dim)
+        num_layers = len(self.layers)
+        layer_outputs = [[None] * len(chunks) for _ in range(num_layers)]
+        layer_states = [dir_states[0] for dir_states in layers_states]
+        for wave in range(len(chunks) + num_layers - 1):
+            active = [(l, wave - l) for l in range(num_layers) if 0 <= wave - l < len(chunks)]
+            fns = []
+            for l, c in active:
+                layer_inp = chunks[c] if l == 0 else layer_outputs[l - 1][c]
+                fns.append(partial(self.layers[l][0], layer_inp, *layer_states[l]))
+            if len(fns) > 1:
+                results = _run_concurrently(fns)
+            else:
+                results = [fns[0]()]
+            for (l, c), result in zip(active, results):
+                layer_outputs[l][c] = result[0]
+                if c < len(chunks) - 1:
+                    layer_states[l] = tuple(_unpack_state(state) for state in result[1:])
+                else:
+                    layer_states[l] = result[1:]
+        out = torch.cat(layer_outputs[-1], dim=seq_dim)
+        return out, [[states] for states in layer_states]
+
+    def input_layers_states(self, hx=None):
+        """
+        Split the input states of the stack into the tuple of input states of each direction of
+        each layer, as expected by :meth:`forward_layers`.
+        """
+        layers_states = []
+        for l, layer in enumerate(self.layers):
+            dir_states = []
+            for d in range(len(layer)):
+                layer_state = hx[self.num_directions * l + d] if hx is not None else hx
+                dir_states += [(layer_state,)]
+            layers_states += [dir_states]
+        return layers_states
+
+    def pack_output_states(self, outputs_states):
+        """
+        Inverse of :meth:`input_layers_states` for the output states returned by
+        :meth:`forward_layers`.
+        """
+        output_states = []
+        for dir_states in outputs_states:
+            if len(dir_states) > 1:
+                output_states += [torch.cat([states[0] for states in dir_states], dim=0)]
+            else:
+                output_states += [dir_states[0][0]]
         if len(output_states) > 1:
             output_states = torch.cat(output_states, dim=0)
         else:
             output_states = output_states[0]
-        return out, output_states
+        return output_states
+
+    def forward(self, inp, hx=None):
+        out, outputs_states = self.forward_layers(inp, self.input_layers_states(hx))
+        return out, self.pack_output_states(outputs_states)
+
+    def streaming_session(self, *states):
+        """
+        Create a :class:`QuantRecurrentStreamingSession` over this model, starting from the
+        optional input ``states`` accepted by :meth:`forward`.
+        """
+        return QuantRecurrentStreamingSession(self, *states)
 
     def _load_from_state_dict(
             self, state_dict, prefix, local_metadata, strict, missing_keys, unexpected_keys,
@@ -891,6 +1180,9 @@ class QuantRNN(QuantRecurrentStackBase):
             gate_acc_quant=Int8ActPerTensorFloat,
             shared_input_hidden_weights=False,
             return_quant_tensor: bool = False,
+            fuse_gate_gemms: bool = False,
+            concurrent_directions: bool = False,
+            wavefront_chunk_size: Optional[int] = None,
             dtype: Optional[torch.dtype] = None,
             device: Optional[torch.device] = None,
             **kwargs):
@@ -909,6 +1201,9 @@ class QuantRNN(QuantRecurrentStackBase):
             gate_acc_quant=gate_acc_quant,
             shared_input_hidden_weights=shared_input_hidden_weights,
             return_quant_tensor=return_quant_tensor,
+            fuse_gate_gemms=fuse_gate_gemms,
+            concurrent_directions=concurrent_directions,
+            wavefront_chunk_size=wavefront_chunk_size,
             dtype=dtype,
             device=device,
             **kwargs)
@@ -938,6 +1233,9 @@ class QuantLSTM(QuantRecurrentStackBase):
             shared_intra_layer_gate_acc_quant=False,
             shared_cell_state_quant=True,
             return_quant_tensor: bool = False,
+            fuse_gate_gemms: bool = False,
+            concurrent_directions: bool = False,
+            wavefront_chunk_size: Optional[int] = None,
             device: Optional[torch.device] = None,
             dtype: Optional[torch.dtype] = None,
             **kwargs):
@@ -962,6 +1260,9 @@ class QuantLSTM(QuantRecurrentStackBase):
             shared_intra_layer_gate_acc_quant=shared_intra_layer_gate_acc_quant,
             shared_cell_state_quant=shared_cell_state_quant,
             return_quant_tensor=return_quant_tensor,
+            fuse_gate_gemms=fuse_gate_gemms,
+            concurrent_directions=concurrent_directions,
+            wavefront_chunk_size=wavefront_chunk_size,
             dtype=dtype,
             device=device,
             **kwargs)
@@ -969,32 +1270,34 @@ class QuantLSTM(QuantRecurrentStackBase):
             raise RuntimeError("Concatenating cell states requires shared cell quantizers.")
         self.cat_output_cell_states = cat_output_cell_states
 
-    def forward(self, inp, hx=None, cx=None):
-        output_hidden_states, output_cell_states = [], []
+    def input_layers_states(self, hx=None, cx=None):
+        layers_states = []
         for l, layer in enumerate(self.layers):
-            dir_outputs, dir_hidden_states, dir_cell_states = [], [], []
-            for d, direction in enumerate(layer):
-                layer_hidden_state = hx[2 * l + d] if hx is not None else hx
-                layer_cell_state = cx[2 * l + d] if cx is not None else cx
-                out, out_hidden_state, out_cell_state = direction(inp, layer_hidden_state, layer_cell_state)
-                dir_outputs += [out]
-                dir_hidden_states += [out_hidden_state]
-                dir_cell_states += [out_cell_state]
-            if len(dir_outputs) > 1:
-                out = torch.cat(dir_outputs, dim=-1)
+            dir_states = []
+            for d in range(len(layer)):
+                layer_hidden_state = hx[self.num_directions * l + d] if hx is not None else hx
+                layer_cell_state = cx[self.num_directions * l + d] if cx is not None else cx
+                dir_states += [(layer_hidden_state, layer_cell_state)]
+            layers_states += [dir_states]
+        return layers_states
+
+    def pack_output_states(self, outputs_states):
+        output_hidden_states, output_cell_states = [], []
+        for dir_states in outputs_states:
+            dir_hidden_states = [states[0] for states in dir_states]
+            dir_cell_states = [states[1] for states in dir_states]
+            if len(dir_states) > 1:
                 output_hidden_states += [torch.cat(dir_hidden_states, dim=0)]
                 if self.cat_output_cell_states:
                     output_cell_states += [torch.cat(dir_cell_states, dim=0)]
                 else:
                     output_cell_states.extend(dir_cell_states)
             else:
-                out = dir_outputs[0]
                 output_hidden_states += [dir_hidden_states[0]]
                 if self.cat_output_cell_states:
                     output_cell_states += [dir_cell_states[0]]
                 else:
                     output_cell_states.extend(dir_cell_states)
-            inp = out
         if len(output_hidden_states) > 1:
             output_hidden_states = torch.cat(output_hidden_states, dim=0)
             if self.cat_output_cell_states:
@@ -1003,4 +1306,59 @@ class QuantLSTM(QuantRecurrentStackBase):
             output_hidden_states = output_hidden_states[0]
             if self.cat_output_cell_states:
                 output_cell_states = output_cell_states[0]
-        return out, (output_hidden_states, output_cell_states)
+        return output_hidden_states, output_cell_states
+
+    def forward(self, inp, hx=None, cx=None):
+        out, outputs_states = self.forward_layers(inp, self.input_layers_states(hx, cx))
+        return out, self.pack_output_states(outputs_states)
+
+
+class QuantRecurrentStreamingSession:
+    """
+    Stateful session that runs a unidirectional :class:`QuantRNN` or :class:`QuantLSTM` over a
+    sequence fed one chunk at a time, e.g. for streaming speech recognition. The quantized states
+    of each layer are carried from one chunk to the next, and the quantized gate weights and
+    biases are computed on the first chunk and reused afterwards, so that the overhead of each
+    chunk doesn't depend on the number of chunks processed so far.
+
+    The model is expected to be in eval mode and not to be modified while the session is in use.
+    Under these conditions, the concatenated outputs of the chunks and the states returned after
+    the last one match the ones of a single call over the whole sequence.
+
+    Args:
+        model (QuantRecurrentStackBase): The model to run, with bidirectional=False.
+        *states: Optional input states accepted by the forward of the model, e.g. ``hx`` and
+            ``cx`` for :class:`QuantLSTM`.
+
+    Examples:
+        >>> lstm = QuantLSTM(input_size=40, hidden_size=128, num_layers=2).eval()
+        >>> session = lstm.streaming_session()
+        >>> with torch.no_grad():
+        ...     for chunk in audio_chunks:
+        ...         out, (h, c) = session(chunk)
+    """
+
+    def __init__(self, model: QuantRecurrentStackBase, *states):
+        if model.num_directions > 1:
+            raise RuntimeError("Streaming requires bidirectional=False.")
+        if model.training:
+            raise RuntimeError("Streaming requires the model to be in eval mode.")
+        self.model = model
+        self.layers_states = [dir_states[0] for dir_states in model.input_layers_states(*states)]
+        self.layers_quant_gate_params = [None] * len(model.layers)
+
+    def __call__(self, inp):
+        outputs_states = []
+        for l, layer in enumerate(self.model.layers):
+            direction = layer[0]
+            if self.layers_quant_gate_params[l] is None:
+                # Bias quantization depends on the scale of the quantized input, which is
+                # computed once here and then reused
+                inp = direction.maybe_quantize_input(inp)
+                self.layers_quant_gate_params[l] = direction.quant_gate_params(inp)
+            out, *out_states = direction(
+                inp, *self.layers_states[l], quant_gate_params=self.layers_quant_gate_params[l])
+            self.layers_states[l] = tuple(_unpack_state(state) for state in out_states)
+            outputs_states += [[tuple(out_states)]]
+            inp = out
+        return out, self.model.pack_output_states(outputs_states)
@@ -30,6 +30,7 @@ __all__ = [
     'RoundSteFn',
     'AbsBinarySignGradFn',
     'DPURoundSteFn',
+    'IntQuantSteFn',
     'round_ste_impl',
     'binary_sign_ste_impl',
     'ternary_sign_ste_impl',
@@ -40,7 +41,8 @@ __all__ = [
     'scalar_clamp_ste_impl',
     'tensor_clamp_ste_impl',
     'abs_binary_sign_grad_impl',
-    'dpu_round_ste_impl']
+    'dpu_round_ste_impl',
+    'int_quant_ste_impl']
 
 
 class ScalarClampSteFn(Function):
@@ -384,6 +386,105 @@ class AbsBinarySignGradFn(Function):
         return y
 
 
+class IntQuantSteFn(Function):
+    """
+    Autograd function that implements scale, shifted, uniform integer fake-quantization of x, i.e.
+    ``(clamp(round(x / scale + zero_point), min_int_val, max_int_val) - zero_point) * scale``, with a
+    straight-through gradient estimator for the rounding.
+
+    Compared to the composition of :func:`~brevitas.function.ops_ste.round_ste` and
+    :func:`~brevitas.function.ops.tensor_clamp`, the whole computation is performed in place on a
+    single output buffer, and no intermediate is saved for backward. The gradients w.r.t. x, scale
+    and zero_point are recomputed from the inputs in the backward pass. With ``ste_clamp=True``
+    the clamp is also treated as a straight-through estimator, matching
+    :func:`~brevitas.function.ops_ste.tensor_clamp_ste`. The gradients w.r.t. min_int_val and
+    max_int_val are always None.
+
+    ``IntQuantSteFn.apply(*args)`` is first aliased to :func:`int_quant_ste_impl(*args)
+    <brevitas.ops.autograd_ste_ops.int_quant_ste_impl>` and then wrapped by
+    :func:`~brevitas.function.ops_ste.int_quant_ste` when env ``BREVITAS_JIT=0``.
+    See :func:`~brevitas.function.ops_ste.int_quant_ste` for details on the interface and examples.
+    """
+
+    @staticmethod
+    def forward(
+            ctx,
+            x: Tensor,
+            scale: Tensor,
+            zero_point: Tensor,
+            min_int_val: Tensor,
+            max_int_val: Tensor,
+            ste_clamp: bool) -> Tensor:
+        ctx.save_for_backward(x, scale, zero_point, min_int_val, max_int_val)
+        ctx.ste_clamp = ste_clamp
+        y = x / scale
+        y = _inplace_binary_op(y, zero_point, torch.add)
+        y = torch.round(y, out=y)
+        y = _inplace_clamp(y, min_int_val, max_int_val)
+        y = _inplace_binary_op(y, zero_point, torch.sub)
+        y = _inplace_binary_op(y, scale, torch.mul)
+        return y
+
+    @staticmethod
+    def backward(ctx, grad_y: Tensor) -> Tuple[Tensor, Tensor, Tensor, None, None, None]:
+        x, scale, zero_point, min_int_val, max_int_val = ctx.saved_tensors
+        needs_grad_x, needs_grad_scale, needs_grad_zero_point = ctx.needs_input_grad[:3]
+        grad_x = grad_scale = grad_zero_point = None
+        # Recompute the quantization, updating in place the few intermediates that are needed
+        y = _inplace_binary_op(x / scale, zero_point, torch.add)
+        y_int = torch.round(y)
+        if ctx.ste_clamp:
+            if needs_grad_x:
+                grad_x = grad_y
+            if needs_grad_zero_point:
+                # The gradient w.r.t. zero_point cancels out when both round and clamp are STE
+                grad_zero_point = torch.zeros_like(zero_point)
+        else:
+            # The clamp lets the gradient through to its input where it doesn't saturate
+            mask = (y_int >= min_int_val) & (y_int <= max_int_val)
+            if needs_grad_x:
+                grad_x = grad_y * mask
+            if needs_grad_zero_point:
+                grad_zero_point = (grad_y * scale).masked_fill_(mask, 0.).neg_()
+            if needs_grad_scale:
+                # (y_int - y) where the clamp is not saturated, (y_int - zero_point) where it is
+                y = torch.where(mask, y, zero_point.type_as(y))
+        if needs_grad_scale:
+            y_int = _inplace_clamp(y_int, min_int_val, max_int_val)
+            grad_scale = _inplace_binary_op(
+                _inplace_binary_op(y_int, y, torch.sub), grad_y, torch.mul)
+        if grad_x is not None:
+            grad_x = _reduce_to_shape(grad_x, x)
+        if grad_scale is not None:
+            grad_scale = _reduce_to_shape(grad_scale, scale)
+        if grad_zero_point is not None:
+            grad_zero_point = _reduce_to_shape(grad_zero_point, zero_point)
+        return grad_x, grad_scale, grad_zero_point, None, None, None
+
+
+def _can_update_inplace(y: Tensor, other: Tensor) -> bool:
+    return y.shape == torch.broadcast_shapes(y.shape, other.shape) and torch.result_type(
+        y, other) == y.dtype
+
+
+def _inplace_binary_op(y: Tensor, other: Tensor, op) -> Tensor:
+    if _can_update_inplace(y, other):
+        return op(y, other, out=y)
+    return op(y, other)
+
+
+def _inplace_clamp(y: Tensor, min_val: Tensor, max_val: Tensor) -> Tensor:
+    if _can_update_inplace(y, min_val) and _can_update_inplace(y, max_val):
+        return tensor_clamp_(y, min_val, max_val)
+    return tensor_clamp(y, min_val, max_val)
+
+
+def _reduce_to_shape(grad: Tensor, t: Tensor) -> Tensor:
+    if grad.shape != t.shape:
+        grad = grad.sum_to_size(t.shape)
+    return grad.type_as(t)
+
+
 #: Alias for :class:`RoundSteFn.apply(*args)
 #: <brevitas.ops.autograd_ste_ops.RoundSteFn>`
 round_ste_impl = RoundSteFn.apply
@@ -431,3 +532,7 @@ tensor_clamp_ste_impl_ = InplaceTensorClampSteFn.apply
 #: Alias for :class:`AbsBinarySignGradFn.apply(*args)
 #: <brevitas.ops.autograd_ste_ops.AbsBinarySignGradFn>`
 abs_binary_sign_grad_impl = AbsBinarySignGradFn.apply
+
+#: Alias for :class:`IntQuantSteFn.apply(*args)
+#: <brevitas.ops.autograd_ste_ops.IntQuantSteFn>`
+int_quant_ste_impl = IntQuantSteFn.apply
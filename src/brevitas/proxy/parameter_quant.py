@@ -3,6 +3,7 @@
 
 from abc import ABCMeta
 from abc import abstractmethod
+import inspect
 from typing import List, Optional, Tuple
 
 import torch
@@ -24,6 +25,14 @@ __all__ = [
     'BiasQuantProxyProtocol']
 
 
+def _requires_input_bit_width(quant_injector):
+    return quant_injector.requires_input_bit_width
+
+
+def _requires_input_scale(quant_injector):
+    return quant_injector.requires_input_scale
+
+
 @runtime_checkable
 class WeightQuantProxyProtocol(QuantProxyProtocol, Protocol):
 
@@ -68,6 +77,28 @@ class ParameterQuantProxyFromInjector(QuantProxyFromInjector):
                 config.IGNORE_MISSING_KEYS = ignore_missing_key
                 config.REINIT_ON_STATE_DICT_LOAD = reinit_on_state_dict
 
+    def untrack_parameter(self, param: Tensor):
+        """
+        Drop every reference to ``param`` held by the quantizer, after it has been removed from
+        the tracked modules, so that its memory can be released. If other parameters are still
+        tracked, the quantizer is rebuilt on them. Otherwise the quantizer keeps its state, but it
+        can't quantize anything until a new parameter is tracked.
+        """
+        # Each injector created by init_tensor_quant derives from the previous one, so all of them
+        # keep their list of tracked parameters alive
+        for injector in inspect.getmro(self.quant_injector):
+            if 'tracked_parameter_list' in getattr(injector, '__dependencies__', {}):
+                param_list = injector.tracked_parameter_list
+                param_list[:] = [p for p in param_list if p is not param]
+        if self.tracked_parameter_list:
+            self.init_tensor_quant(preserve_state_dict=True)
+            return
+        # e.g. statistics computed from the parameter wrap it as a parameter of their own
+        for module in self.modules():
+            for name, tracked_param in module._parameters.items():
+                if tracked_param is param:
+                    module._parameters[name] = None
+
     def max_uint_value(self, bit_width):
         return max_int(False, self.is_narrow_range, bit_width)
 
@@ -76,7 +107,9 @@ class WeightQuantProxyFromInjector(ParameterQuantProxyFromInjector, WeightQuantP
 
     @property
     def tracked_parameter_list(self):
-        return [m.weight for m in self.tracked_module_list if m.weight is not None]
+        # packed layers don't have a float weight anymore
+        return [
+            m.weight for m in self.tracked_module_list if getattr(m, 'weight', None) is not None]
 
     @property
     def requires_quant_input(self):
@@ -165,14 +198,14 @@ class BiasQuantProxyFromInjector(ParameterQuantProxyFromInjector, BiasQuantProxy
     @property
     def requires_input_bit_width(self) -> bool:
         if self.is_quant_enabled:
-            return self.quant_injector.requires_input_bit_width
+            return self._injector_property('requires_input_bit_width', _requires_input_bit_width)
         else:
             return False
 
     @property
     def requires_input_scale(self) -> bool:
         if self.is_quant_enabled:
-            return self.quant_injector.requires_input_scale
+            return self._injector_property('requires_input_scale', _requires_input_scale)
         else:
             return False
 
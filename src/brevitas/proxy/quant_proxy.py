@@ -82,6 +82,7 @@ class QuantProxyFromInjector(ExportMixin, nn.Module, QuantProxyProtocol):
         self.update_state_dict_impl = _update_state_dict_impl(quant_injector)
         self.quant_injector = quant_injector
         self.quant_injector = quant_injector.let(proxy_module=self)
+        self._injector_property_cache = None
         self._zero_hw_sentinel = StatelessBuffer(tensor(0.0))
         self.tensor_quant = None
         # Use a normal list and not a ModuleList since this is a pointer to parent modules
@@ -108,21 +109,34 @@ class QuantProxyFromInjector(ExportMixin, nn.Module, QuantProxyProtocol):
     def is_quant_enabled(self):
         return not self.disable_quant and self.tensor_quant is not None
 
+    def _injector_property(self, name, resolve_fn):
+        # Resolving a dependency through the injector is expensive, and properties like is_signed
+        # are queried at every forward pass. They only depend on the injector, which is replaced
+        # rather than modified in-place, so they are cached until the injector changes.
+        cache = self._injector_property_cache
+        if cache is None or cache[0] is not self.quant_injector:
+            cache = (self.quant_injector, {})
+            self._injector_property_cache = cache
+        properties = cache[1]
+        if name not in properties:
+            properties[name] = resolve_fn(self.quant_injector)
+        return properties[name]
+
     @property
     def is_signed(self):
-        return _is_signed(self.quant_injector)
+        return self._injector_property('is_signed', _is_signed)
 
     @property
     def is_groupwise(self):
-        return _is_groupwise(self.quant_injector)
+        return self._injector_property('is_groupwise', _is_groupwise)
 
     @property
     def is_narrow_range(self):
-        return _is_narrow_range(self.quant_injector)
+        return self._injector_property('is_narrow_range', _is_narrow_range)
 
     @property
     def rounding_mode(self):
-        return _rounding_mode(self.quant_injector)
+        return self._injector_property('rounding_mode', _rounding_mode)
 
     def add_tracked_module(self, module: nn.Module) -> None:
         if module is not None:
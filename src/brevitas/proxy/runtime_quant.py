@@ -137,6 +137,18 @@ class ActQuantProxyFromInjector(QuantProxyFromInjector, ActQuantProxyProtocol):
         scale = self.__call__(self._zero_hw_sentinel()).bit_width
         return scale
 
+    def forward_value(self, x: Tensor) -> Tensor:
+        """
+        Quantize ``x`` and return only the quantized value, without building a QuantTensor, as used
+        by quant layers in compile mode (see :func:`brevitas.graph.inference.enable_compile_mode`).
+        """
+        if self.fused_activation_quant_proxy is None:
+            return x
+        elif not self.is_quant_enabled:
+            return self.fused_activation_quant_proxy.activation_impl(x)
+        else:
+            return self.fused_activation_quant_proxy(x)[0]
+
     def forward(self, x: Union[Tensor, QuantTensor]) -> QuantTensor:
         if self.fused_activation_quant_proxy is not None:
             y = x
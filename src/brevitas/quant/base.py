@@ -17,6 +17,7 @@ from brevitas.core.quant import ClampedBinaryQuant
 from brevitas.core.quant.int import DecoupledRescalingIntQuant
 from brevitas.core.quant.int import DecoupledRescalingIntQuantWithInput
 from brevitas.core.quant.int_base import DecoupledIntQuant
+from brevitas.core.quant.int_base import FusedIntQuant
 from brevitas.core.restrict_val import FloatRestrictValue
 from brevitas.core.restrict_val import LogFloatRestrictValue
 from brevitas.core.scaling import AccumulatorAwareParameterPreScaling
@@ -31,6 +32,7 @@ from brevitas.core.scaling import StatsFromParameterScaling
 from brevitas.core.stats import AbsMax
 from brevitas.core.stats import AbsMaxL2
 from brevitas.core.stats import AbsMinMax
+from brevitas.core.stats import HistogramThreshold
 from brevitas.core.stats import L1Norm
 from brevitas.core.stats import L2Norm
 from brevitas.core.stats import MSE
@@ -60,10 +62,12 @@ __all__ = [
     'MinMaxStatsScaling',
     'ParamFromRuntimePercentileScaling',
     'ParamFromRuntimePercentileIntervalScaling',
+    'ParamFromRuntimeHistogramScaling',
     'ParamFromRuntimeMinMaxScaling',
     'ParamMinMaxInitScaling',
     'IntQuant',
     'NarrowIntQuant',
+    'FusedIntQuantMixin',
     'UintQuant',
     'ShiftedMinUintQuant',
     'ShiftedParamFromPercentileUintQuant',
@@ -111,6 +115,20 @@ class ParamFromRuntimePercentileScaling(ExtendedInjector):
     scaling_min_val = 1e-10
 
 
+class ParamFromRuntimeHistogramScaling(ExtendedInjector):
+    """
+    Scaling initialized from a histogram accumulated over the whole calibration, rather than from
+    the average of per-batch statistics. The threshold is computed with the chosen
+    histogram_threshold_method when calibration ends.
+    """
+    scaling_impl_type = ScalingImplType.PARAMETER_FROM_STATS
+    scaling_stats_impl = HistogramThreshold
+    histogram_threshold_method = 'percentile'
+    high_percentile_q = 99.999
+    collect_stats_steps = 300
+    scaling_min_val = 1e-10
+
+
 class BatchQuantStatsScaling1d(ExtendedInjector):
     """
     """
@@ -181,6 +199,14 @@ class NarrowIntQuant(ExtendedInjector):
     zero_point_impl = ZeroZeroPoint
 
 
+class FusedIntQuantMixin(ExtendedInjector):
+    """
+    Mixin to perform integer fake-quantization with a single fused op, e.g.:
+    class Int8ActPerTensorFloatFused(FusedIntQuantMixin, Int8ActPerTensorFloat): pass
+    """
+    int_quant = FusedIntQuant
+
+
 class UintQuant(ExtendedInjector):
     """
     """
@@ -17,6 +17,10 @@ from .torch_handler import QUANT_TENSOR_FN_HANDLER
 IS_VALID_ATOL = 2e-1
 BFLOAT16_IS_VALID_ATOL = 0.5
 
+# Allocating a tensor for the sign and training flags of every QuantTensor is a measurable part
+# of its construction cost, so the flags share these constants instead
+_BOOL_TENSORS = {True: torch.tensor(True), False: torch.tensor(False)}
+
 
 class QuantTensorBase(NamedTuple):
     value: Tensor
@@ -63,9 +67,9 @@ class QuantTensor(QuantTensorBase):
         if bit_width is not None and not isinstance(bit_width, torch.Tensor):
             bit_width = torch.tensor(bit_width, dtype=torch.float)
         if signed is not None and not isinstance(signed, torch.Tensor):
-            signed = torch.tensor(signed, dtype=torch.bool)
+            signed = _BOOL_TENSORS[bool(signed)]
         if training is not None and not isinstance(training, torch.Tensor):
-            training = torch.tensor(training, dtype=torch.bool)
+            training = _BOOL_TENSORS[bool(training)]
         return super().__new__(cls, value, scale, zero_point, bit_width, signed, training)
 
     @property
@@ -101,7 +105,7 @@ class QuantTensor(QuantTensorBase):
     def is_not_none(self):
         return (
             self.value is not None and self.scale is not None and self.zero_point is not None and
-            self.bit_width is not None and self.signed is not None)
+            self.bit_width is not None and self.signed_t is not None)
 
     @property
     def _pre_round_int_value(self):
@@ -217,16 +221,22 @@ class QuantTensor(QuantTensorBase):
     def check_scaling_factors_same(self, other):
         if self.training is not None and self.training:
             return True
+        if self.scale is other.scale:
+            return True
         if not torch.allclose(self.scale, other.scale):
             raise RuntimeError("Scaling factors are different")
 
     def check_zero_points_same(self, other):
         if self.training is not None and self.training:
             return True
+        if self.zero_point is other.zero_point:
+            return True
         if not torch.allclose(self.zero_point, other.zero_point):
             raise RuntimeError("Zero points are different")
 
     def check_bit_width_same(self, other):
+        if self.bit_width is other.bit_width:
+            return True
         if not torch.allclose(self.bit_width, other.bit_width):
             raise RuntimeError("Bit widths are different")
 
@@ -38,6 +38,19 @@ class KwargsForwardHook(torch.nn.Module):
         return out
 
 
+def is_dynamo_compiling() -> bool:
+    """
+    Return whether the code is being traced by TorchDynamo, e.g. within ``torch.compile``.
+    """
+    compiler = getattr(torch, 'compiler', None)
+    if compiler is not None and hasattr(compiler, 'is_compiling'):
+        return compiler.is_compiling()
+    dynamo = getattr(torch, '_dynamo', None)
+    if dynamo is not None and hasattr(dynamo, 'is_compiling'):
+        return dynamo.is_compiling()
+    return False
+
+
 def torch_partial_deepcopy(model):
     """
     Performs a deepcopy of a torch.nn.Module, except for all the parameters that are instead passed by reference
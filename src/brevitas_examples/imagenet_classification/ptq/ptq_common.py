@@ -11,6 +11,7 @@ from brevitas.core.scaling.standalone import ParameterFromStatsFromParameterScal
 from brevitas.core.zero_point import ParameterFromStatsFromParameterZeroPoint
 from brevitas.graph.calibrate import bias_correction_mode
 from brevitas.graph.calibrate import calibration_mode
+from brevitas.graph.calibrate import CalibrationStatsCache
 from brevitas.graph.calibrate import norm_correction_mode
 from brevitas.graph.equalize import activation_equalization_mode
 from brevitas.graph.gpfq import gpfq_mode
@@ -418,19 +419,30 @@ def create_quant_maps(
     return quant_layer_map, quant_layerwise_layer_map, quant_act_map, quant_identity_map
 
 
-def calibrate(calib_loader, model):
+def calibrate(calib_loader, model, cache_dir=None, calib_loader_key=None):
     """
-    Perform calibration and bias correction, if enabled
+    Perform calibration and bias correction, if enabled.
+    If cache_dir is set, the collected statistics are cached on disk, keyed by the float model,
+    the activation quantizers and calib_loader_key, which should identify the calibration set.
     """
     model.eval()
     dtype = next(model.parameters()).dtype
     device = next(model.parameters()).device
+    if cache_dir is not None:
+        # Float weights depend on the preprocessing applied to the model, e.g. equalization
+        cache = CalibrationStatsCache(cache_dir, hash_parameters=True)
+        cache_key = cache.fingerprint(model, calib_loader_key)
+        if cache.load(model, cache_key):
+            print(f"Loaded calibration statistics from {cache.path(cache_key)}")
+            return
     with torch.no_grad():
         with calibration_mode(model):
             for i, (images, target) in enumerate(tqdm(calib_loader)):
                 images = images.to(device)
                 images = images.to(dtype)
                 model(images)
+    if cache_dir is not None:
+        cache.save(model, cache_key)
 
 
 def calibrate_bn(calib_loader, model):
@@ -75,6 +75,13 @@ parser.add_argument(
 parser.add_argument('--gpu', default=None, type=int, help='GPU id to use (default: None)')
 parser.add_argument(
     '--calibration-samples', default=1000, type=int, help='Calibration size (default: 1000)')
+parser.add_argument(
+    '--calibration-cache-dir',
+    default=None,
+    type=str,
+    help=
+    'Directory where to cache activation calibration statistics, to be reused by runs with the same float model, activation quantization and calibration set (default: None)'
+)
 parser.add_argument(
     '--model-name',
     default='resnet18',
@@ -409,7 +416,18 @@ def main():
 
     # Calibrate the quant_model on the calibration dataloader
     print("Starting activation calibration:")
-    calibrate(calib_loader, quant_model)
+    calib_loader_key = (
+        os.path.abspath(args.calibration_dir),
+        args.calibration_samples,
+        args.batch_size_calibration,
+        resize_shape,
+        center_crop_shape,
+        inception_preprocessing)
+    calibrate(
+        calib_loader,
+        quant_model,
+        cache_dir=args.calibration_cache_dir,
+        calib_loader_key=calib_loader_key)
 
     if args.gpfq:
         print("Performing GPFQ:")
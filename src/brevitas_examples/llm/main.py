@@ -16,6 +16,7 @@ from transformers import AutoTokenizer
 
 from brevitas.export import export_torch_qcdq
 from brevitas.export.onnx.standard.qcdq.manager import StdQCDQONNXManager
+from brevitas.graph.calibrate import CalibrationStatsCache
 from brevitas_examples.common.generative.quantize import quantize_model
 from brevitas_examples.common.parse_utils import quant_format_validator
 from brevitas_examples.llm.llm_quant.bias_corr import apply_bias_correction
@@ -141,7 +142,20 @@ parser.add_argument(
     '--quantize-last-layer', action='store_true', help='Quantize last nn.Linear layer.')
 parser.add_argument('--gptq', action='store_true', help='Apply GPTQ.')
 parser.add_argument('--act-calibration', action='store_true', help='Apply activation calibration.')
+parser.add_argument(
+    '--calibration-cache-dir',
+    type=str,
+    default=None,
+    help=
+    'Directory where to cache activation calibration statistics, to be reused by runs with the same float model, input quantization and calibration set. Default: None.'
+)
 parser.add_argument('--bias-corr', action='store_true', help='Apply bias correction.')
+parser.add_argument(
+    '--model-dtype-init',
+    action='store_true',
+    help=
+    'Initialize quantization parameters in the dtype of the model rather than on a float32 copy of it, to save memory. On CPU, float16 requires PyTorch >= 2.1.'
+)
 parser.add_argument('--ln-affine-merge', action='store_true', help='Merge LN affine params.')
 parser.add_argument('--no-quantize', action='store_true', help='Disable quantization.')
 parser.add_argument(
@@ -347,13 +361,32 @@ def main():
     if args.act_equalization is None and not args.weight_equalization:
         model.tie_weights()
 
-    with cast_to_float32(model, dtype):
+    # Look up the calibration cache before offloading, while all parameters are materialized
+    act_calibration_cached = False
+    if args.act_calibration and args.calibration_cache_dir is not None:
+        # Float weights depend on the transformations applied to the model, e.g. equalization
+        calibration_cache = CalibrationStatsCache(
+            args.calibration_cache_dir, hash_parameters=True)
+        calibration_cache_key = calibration_cache.fingerprint(model, calibration_loader)
+        act_calibration_cached = calibration_cache.load(model, calibration_cache_key)
+
+    # Quantizers are numerically safe in float16, so the quantization parameters can be
+    # initialized without materializing a float32 copy of the model, as long as the model dtype
+    # has kernels on its device
+    if args.model_dtype_init:
         model(**calibration_loader[0])
+    else:
+        with cast_to_float32(model, dtype):
+            model(**calibration_loader[0])
     model = offload_model(model)
 
-    if args.act_calibration:
+    if act_calibration_cached:
+        print(f"Act calibration loaded from {calibration_cache.path(calibration_cache_key)}.")
+    elif args.act_calibration:
         print("Apply act calibration...")
         apply_calibration(model, calibration_loader)
+        if args.calibration_cache_dir is not None:
+            calibration_cache.save(model, calibration_cache_key)
         print("Act calibration applied.")
 
     if args.gptq:
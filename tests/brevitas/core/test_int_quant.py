@@ -3,11 +3,15 @@
 
 from hypothesis import given
 import mock
+import pytest
 import torch
 
+from brevitas.core.function_wrapper import FloorSte
 from brevitas.core.function_wrapper import RoundSte
 from brevitas.core.function_wrapper import TensorClamp
+from brevitas.core.function_wrapper import TensorClampSte
 from brevitas.core.quant import *
+import brevitas.nn as qnn
 from tests.brevitas.core.bit_width_fixture import *  # noqa
 from tests.brevitas.core.int_quant_fixture import *  # noqa
 from tests.brevitas.core.shared_quant_fixture import *  # noqa
@@ -59,3 +63,77 @@ class TestIntQuantUnit:
         inp = scale * (arange_int_tensor - zero_point).float()
         output = int_quant(scale, zero_point, bit_width, inp)
         assert torch.isclose(inp, output).all()
+
+
+class TestFusedIntQuantUnit:
+
+    @pytest.mark.parametrize('tensor_clamp_impl', [TensorClamp, TensorClampSte])
+    @pytest.mark.parametrize(
+        'scale_shape, zero_point_shape', [((), ()), ((8, 1), (8, 1)), ((8, 1), ())])
+    def test_fused_int_quant_matches_int_quant(
+            self,
+            narrow_range,
+            signed,
+            bit_width_init,
+            zero_point_init,
+            tensor_clamp_impl,
+            scale_shape,
+            zero_point_shape):
+        int_quant = IntQuant(
+            narrow_range=narrow_range, signed=signed, tensor_clamp_impl=tensor_clamp_impl())
+        fused_int_quant = FusedIntQuant(
+            narrow_range=narrow_range, signed=signed, tensor_clamp_impl=tensor_clamp_impl())
+        bit_width = torch.tensor(bit_width_init).float()
+        inp = torch.randn(8, 16) * 3.
+        scale = torch.rand(scale_shape) * 0.3 + 0.1
+        zero_point = torch.full(zero_point_shape, zero_point_init).float()
+        grad = torch.randn(8, 16)
+        results = []
+        for quant in (int_quant, fused_int_quant):
+            args = [t.clone().requires_grad_() for t in (scale, zero_point, inp)]
+            out = quant(*args[:2], bit_width, args[2])
+            out.backward(grad)
+            results.append([out.detach()] + [t.grad for t in args])
+        for ref, fused in zip(*results):
+            assert torch.allclose(ref, fused, rtol=1e-4, atol=1e-4)
+
+    def test_fused_int_quant_unsupported_impl(self):
+        with pytest.raises(RuntimeError):
+            FusedIntQuant(narrow_range=False, signed=True, float_to_int_impl=FloorSte())
+
+
+@pytest.mark.parametrize('dtype', [torch.float16, torch.bfloat16])
+@pytest.mark.parametrize('quant_class', [IntQuant, FusedIntQuant])
+def test_int_quant_low_precision(dtype, quant_class):
+    int_quant = quant_class(narrow_range=False, signed=True)
+    # 12 bits are wider than the integers representable by float16 and bfloat16
+    bit_width = torch.tensor(12.)
+    scale, zero_point = torch.tensor(0.01, dtype=dtype), torch.tensor(0., dtype=dtype)
+    inp = (torch.randn(64, 64) * 10.).to(dtype)
+    out = int_quant(scale, zero_point, bit_width, inp)
+    expected_out = int_quant(scale.float(), zero_point.float(), bit_width, inp.float()).to(dtype)
+    assert out.dtype == dtype
+    assert torch.equal(out, expected_out)
+
+
+@pytest.mark.parametrize('dtype', [torch.float16, torch.bfloat16])
+@pytest.mark.parametrize('quant_class', [IntQuant, DecoupledIntQuant])
+def test_int_quant_to_int_low_precision(dtype, quant_class):
+    int_quant = quant_class(narrow_range=False, signed=True)
+    bit_width = torch.tensor(8.)
+    scale, zero_point = torch.tensor(0.01, dtype=dtype), torch.tensor(0., dtype=dtype)
+    inp = torch.randn(64, 64).to(dtype)
+    out = int_quant.to_int(scale, zero_point, bit_width, inp)
+    expected_out = int_quant.to_int(scale.float(), zero_point.float(), bit_width, inp.float())
+    assert out.dtype == dtype
+    assert torch.equal(out, expected_out.to(dtype))
+
+
+def test_int_quant_zero_weight_float16():
+    layer = qnn.QuantLinear(8, 8, bias=False)
+    torch.nn.init.zeros_(layer.weight)
+    layer = layer.to(torch.float16)
+    quant_weight = layer.quant_weight()
+    # The minimum scale is not rounded to zero in float16
+    assert (quant_weight.scale > 0).all()
+    assert torch.equal(quant_weight.value, layer.weight)
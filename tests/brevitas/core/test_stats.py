@@ -3,14 +3,25 @@
 
 import math
 
+import pytest
 import torch
 
+from brevitas.core.scaling import ParameterFromRuntimeStatsScaling
 from brevitas.core.stats import AbsPercentile
+from brevitas.core.stats import HistogramThreshold
 from brevitas.core.stats import NegativePercentileOrZero
 from brevitas.core.stats import PercentileInterval
+from brevitas.core.stats.stats_op import KLMinimizerThreshold
+from brevitas.core.stats.stats_op import MSE
+from brevitas.function.ops import max_int
+import brevitas.nn as qnn
+from brevitas.quant.scaled_int import Int8WeightPerTensorFloatMSE
+from brevitas.quant.shifted_scaled_int import ShiftedUint8WeightPerChannelFloatMSE
 # Use custom implementation of kthvalue as work around to (b)float16 kernel limitations
 from brevitas.utils.torch_utils import kthvalue
 
+SEED = 123456
+
 
 def test_abs_percentile_per_tensor():
     values = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
@@ -74,3 +85,187 @@ class TestPercentile:
         low_result = torch.clamp(range[0], max=torch.tensor(0.0))
         expected_out = torch.abs(range[1] - low_result)
         assert torch.allclose(out, expected_out)
+
+
+def kl_minimizer_threshold_reference(x, signed, bit_width, num_bins=1000 + 1, eps=0.0001):
+    """Candidate by candidate implementation of the KL divergence search."""
+
+    def smooth_normalize_distribution(p):
+        is_zeros = (p == 0).float()
+        n_zeros = is_zeros.sum()
+        n_nonzeros = torch.numel(p) - n_zeros
+        if not n_nonzeros:
+            return None
+        eps1 = eps * n_zeros / n_nonzeros
+        hist = p.float()
+        hist += eps * is_zeros + (-eps1) * n_nonzeros
+        return torch.distributions.categorical.Categorical(logits=hist)
+
+    absmax = x.abs().max()
+    num_quantized_bins = int(max_int(signed, False, torch.tensor(bit_width)))
+    thresholds = torch.zeros(num_bins // 2 + 1 - num_quantized_bins // 2)
+    divergence = torch.zeros_like(thresholds)
+    quantized_bins = torch.zeros(num_quantized_bins)
+    hist = torch.histc(x, bins=num_bins, min=-absmax, max=absmax).int()
+    hist_edges = torch.linspace(-absmax, absmax, num_bins + 1)
+    for i in range(num_quantized_bins // 2, num_bins // 2 + 1):
+        p_bin_idx_start = num_bins // 2 - i
+        p_bin_idx_stop = num_bins // 2 + i + 1
+        thresholds[i - num_quantized_bins // 2] = hist_edges[p_bin_idx_stop]
+        sliced_nd_hist = hist[p_bin_idx_start:p_bin_idx_stop]
+        p = sliced_nd_hist.clone()
+        p[0] += torch.sum(hist[0:p_bin_idx_start])
+        p[-1] += torch.sum(hist[p_bin_idx_stop:])
+        is_nonzeros = (sliced_nd_hist != 0).float()
+        num_merged_bins = torch.numel(p) // num_quantized_bins
+        for j in range(num_quantized_bins):
+            start = j * num_merged_bins
+            stop = start + num_merged_bins
+            quantized_bins[j] = sliced_nd_hist[start:stop].sum()
+        quantized_bins[-1] += sliced_nd_hist[num_quantized_bins * num_merged_bins:].sum()
+        q = torch.zeros_like(p, dtype=torch.float32)
+        for j in range(num_quantized_bins):
+            start = j * num_merged_bins
+            stop = -1 if j == num_quantized_bins - 1 else start + num_merged_bins
+            norm = is_nonzeros[start:stop].sum()
+            if norm != 0:
+                q[start:stop] = quantized_bins[j] / norm
+        q[sliced_nd_hist == 0] = 0.
+        p = smooth_normalize_distribution(p)
+        q = smooth_normalize_distribution(q)
+        if q is None:
+            divergence[i - num_quantized_bins // 2] = float('inf')
+        else:
+            divergence[i - num_quantized_bins // 2] = torch.distributions.kl.kl_divergence(p, q)
+    return thresholds[torch.argmin(divergence)]
+
+
+@pytest.mark.parametrize('signed', [True, False])
+@pytest.mark.parametrize('bit_width', [4, 8])
+@pytest.mark.parametrize('distribution', ['normal', 'sparse'])
+def test_kl_minimizer_threshold(signed, bit_width, distribution):
+    torch.manual_seed(SEED)
+    x = torch.randn(4096)
+    if distribution == 'sparse':
+        x = x * (torch.rand(4096) > 0.9) + 10 * (torch.rand(4096) > 0.999)
+    kl_minimizer = KLMinimizerThreshold(signed, lambda: torch.tensor(bit_width))
+    out = kl_minimizer(x)
+    expected_out = kl_minimizer_threshold_reference(x, signed, bit_width)
+    assert torch.equal(out, expected_out)
+
+
+@pytest.mark.parametrize(
+    'weight_quant', [Int8WeightPerTensorFloatMSE, ShiftedUint8WeightPerChannelFloatMSE])
+@pytest.mark.parametrize('mse_max_batch_numel', [1000, 100000])
+def test_mse_batched_search(weight_quant, mse_max_batch_numel):
+    torch.manual_seed(SEED)
+    layer = qnn.QuantConv2d(4, 8, 3, weight_quant=weight_quant)
+    torch.manual_seed(SEED)
+    mse_scale = weight_quant.mse_scale.let(mse_max_batch_numel=mse_max_batch_numel)
+    batched_layer = qnn.QuantConv2d(4, 8, 3, weight_quant=weight_quant.let(mse_scale=mse_scale))
+    mse_modules = [m for m in batched_layer.modules() if isinstance(m, MSE)]
+    assert mse_max_batch_numel in [m.mse_max_batch_numel for m in mse_modules]
+    assert torch.equal(layer.quant_weight().value, batched_layer.quant_weight().value)
+
+
+@pytest.mark.parametrize('dtype', [torch.float16, torch.bfloat16])
+def test_mse_low_precision(dtype):
+    torch.manual_seed(SEED)
+    layer = qnn.QuantLinear(64, 64, bias=False, weight_quant=Int8WeightPerTensorFloatMSE)
+    expected_scale = layer.quant_weight().scale
+    torch.manual_seed(SEED)
+    layer = qnn.QuantLinear(64, 64, bias=False, weight_quant=Int8WeightPerTensorFloatMSE)
+    layer = layer.to(dtype)
+    quant_weight = layer.quant_weight()
+    assert quant_weight.value.dtype == dtype
+    assert torch.isfinite(quant_weight.value).all()
+    assert torch.allclose(quant_weight.scale.float(), expected_scale, rtol=0.05)
+
+
+@pytest.mark.parametrize('dtype', [torch.float16, torch.bfloat16])
+@pytest.mark.parametrize('stats_reduce_dim', [None, 1])
+def test_percentile_low_precision(dtype, stats_reduce_dim):
+    torch.manual_seed(SEED)
+    x = torch.randn(8, 64).to(dtype)
+    # Percentiles select elements of the input, so they are exact in any dtype. kthvalue upcasts
+    # the inputs it has no kernel for
+    for stats_op in [AbsPercentile(99., stats_reduce_dim),
+                     NegativePercentileOrZero(1., stats_reduce_dim)]:
+        expected_out = stats_op(x.float())
+        out = stats_op(x)
+        assert out.dtype == dtype
+        assert torch.equal(out.float(), expected_out)
+
+
+class TestHistogramThreshold:
+
+    def test_histogram_rescaling(self):
+        torch.manual_seed(SEED)
+        x = torch.randn(1000) * torch.logspace(-2, 2, 1000)
+        histogram_threshold = HistogramThreshold()
+        for chunk in x.split(100):
+            histogram_threshold(chunk)
+        # The range only grows, so the histogram had to be rescaled along the way
+        reference_histogram_threshold = HistogramThreshold()
+        reference_histogram_threshold(x)
+        assert histogram_threshold.range == reference_histogram_threshold.range
+        assert torch.equal(histogram_threshold.hist, reference_histogram_threshold.hist)
+
+    def test_percentile(self):
+        torch.manual_seed(SEED)
+        x = torch.randn(100000)
+        histogram_threshold = HistogramThreshold(high_percentile_q=99.)
+        histogram_threshold(x)
+        expected_out = AbsPercentile(99., None)(x)
+        out = histogram_threshold.compute_threshold()
+        bin_width = 2 * histogram_threshold.range / histogram_threshold.num_bins
+        assert torch.abs(out - expected_out) < bin_width
+
+    def test_percentile_interval(self):
+        torch.manual_seed(SEED)
+        x = torch.randn(100000)
+        histogram_threshold = HistogramThreshold(high_percentile_q=99., low_percentile_q=1.)
+        histogram_threshold(x)
+        expected_out = PercentileInterval(low_percentile_q=1., high_percentile_q=99.)(x)
+        out = histogram_threshold.compute_threshold()
+        bin_width = 2 * histogram_threshold.range / histogram_threshold.num_bins
+        assert torch.abs(out - expected_out) < 2 * bin_width
+
+    @pytest.mark.parametrize('method', ['mse', 'kl'])
+    def test_threshold_within_range(self, method):
+        torch.manual_seed(SEED)
+        x = torch.randn(100000)
+        histogram_threshold = HistogramThreshold(
+            method, signed=True, bit_width_impl=lambda: torch.tensor(4.))
+        absmax = histogram_threshold(x)
+        out = histogram_threshold.compute_threshold()
+        assert 0. < out <= absmax + 2 * histogram_threshold.range / histogram_threshold.num_bins
+
+    def test_non_contiguous_input(self):
+        torch.manual_seed(SEED)
+        x = torch.randn(100, 50)
+        histogram_threshold = HistogramThreshold()
+        histogram_threshold(x.t())
+        reference_histogram_threshold = HistogramThreshold()
+        reference_histogram_threshold(x)
+        assert torch.equal(histogram_threshold.hist, reference_histogram_threshold.hist)
+
+    @pytest.mark.parametrize('num_batches', [3, 5])
+    def test_scaling_more_batches_than_steps(self, num_batches):
+        torch.manual_seed(SEED)
+        scaling_impl = ParameterFromRuntimeStatsScaling(
+            collect_stats_steps=3, scaling_stats_impl=HistogramThreshold(high_percentile_q=99.))
+        for _ in range(num_batches):
+            scaling_impl(torch.randn(16, 16))
+        # After collect_stats_steps batches, the average of the per-batch stats is moved to value
+        scaling_impl.finalize_stats()
+        scaling_impl.eval()
+        expected_out = scaling_impl.stats.stats_impl.compute_threshold()
+        assert torch.allclose(scaling_impl(torch.randn(16, 16)), expected_out)
+
+    def test_per_channel_scaling_not_supported(self):
+        with pytest.raises(RuntimeError, match='per-tensor'):
+            ParameterFromRuntimeStatsScaling(
+                collect_stats_steps=1,
+                scaling_stats_impl=HistogramThreshold(),
+                scaling_shape=(1, 8, 1, 1))
@@ -4,6 +4,7 @@
 from hypothesis import given
 import numpy as np
 import pytest
+import torch
 from torch import tensor
 
 from brevitas.function.ops import *
@@ -121,3 +122,16 @@ def test_narrow_range_signed_interval(bit_width, signed, narrow_range):
         assert val_max - val_min == tensor((2 ** bit_width) - 2)
     else:
         assert val_max - val_min == tensor((2 ** bit_width) - 1)
+
+
+@pytest.mark.parametrize('bit_width', range(1, 9))
+@pytest.mark.parametrize('numel', [1, 7, 8, 13, 64])
+def test_pack_unpack_uint(bit_width, numel):
+    """
+    Test that packing is lossless and takes bit_width bits per value.
+    """
+    x = torch.randint(0, 2 ** bit_width, (numel,))
+    packed = pack_uint(x, bit_width)
+    assert packed.dtype == torch.uint8
+    assert packed.numel() == (numel * bit_width + 7) // 8
+    assert torch.equal(unpack_uint(packed, bit_width, numel).long(), x)
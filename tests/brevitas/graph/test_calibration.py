@@ -1,17 +1,28 @@
 # Copyright (C) 2023, Advanced Micro Devices, Inc. All rights reserved.
 # SPDX-License-Identifier: BSD-3-Clause
 
+from copy import deepcopy
+import json
 import math
 
 from hypothesis import given
+import pytest
 from pytest_cases import fixture
 import torch
 import torch.nn as nn
 
 from brevitas.graph.calibrate import bias_correction_mode
+from brevitas.graph.calibrate import calibration_fingerprint
 from brevitas.graph.calibrate import calibration_mode
+from brevitas.graph.calibrate import CalibrationStatsCache
+from brevitas.graph.calibrate import quant_profiling_mode
 import brevitas.nn as qnn
+from brevitas.quant import Int4WeightPerTensorFloatDecoupled
 from brevitas.quant import Int8ActPerTensorFixedPoint
+from brevitas.quant import Int8ActPerTensorFloat
+from brevitas.quant import Int8Bias
+from brevitas.quant import Int8WeightPerTensorFloat
+from brevitas.quant.base import ParamFromRuntimeHistogramScaling
 # Use custom implementation of kthvalue as work around to (b)float16 kernel limitations
 from brevitas.utils.torch_utils import kthvalue
 from tests.brevitas.hyp_helper import float_tensor_random_size_st
@@ -19,6 +30,7 @@ from tests.brevitas.hyp_helper import float_tensor_random_size_st
 IN_CH = 8
 OUT_CH = 16
 BATCH = 1
+SEED = 123456
 
 
 def compute_quantile(x, q):
@@ -85,6 +97,130 @@ def test_calibration_training_state():
     assert model.training == False
 
 
+@pytest.mark.parametrize('histogram_threshold_method', ['percentile', 'mse', 'kl'])
+def test_calibration_histogram_batch_size_independent(histogram_threshold_method):
+
+    class Int8ActPerTensorFloatHistogram(ParamFromRuntimeHistogramScaling, Int8ActPerTensorFloat):
+        pass
+
+    torch.manual_seed(SEED)
+    inp = torch.randn(64, 8, 16, 16) * torch.linspace(0.1, 10., 8).view(1, -1, 1, 1)
+    scales = []
+    for batch_size in [4, 64]:
+        act = qnn.QuantIdentity(
+            act_quant=Int8ActPerTensorFloatHistogram,
+            histogram_threshold_method=histogram_threshold_method,
+            return_quant_tensor=True)
+        act.eval()
+        with torch.no_grad():
+            with calibration_mode(act):
+                for batch in inp.split(batch_size):
+                    act(batch)
+        scales.append(act.quant_act_scale())
+    assert torch.equal(scales[0], scales[1])
+
+
+def test_calibration_stats_cache(tmp_path):
+
+    def build_model(weight_quant, act_bit_width=8):
+        torch.manual_seed(SEED)
+        return nn.Sequential(
+            qnn.QuantConv2d(
+                IN_CH, OUT_CH, 3, weight_quant=weight_quant, input_quant=Int8ActPerTensorFloat),
+            qnn.QuantReLU(bit_width=act_bit_width),
+            qnn.QuantConv2d(
+                OUT_CH, OUT_CH, 3, weight_quant=weight_quant,
+                input_quant=Int8ActPerTensorFloat)).eval()
+
+    def calibrate(model, calibration_data):
+        with torch.no_grad():
+            with calibration_mode(model):
+                for inp in calibration_data:
+                    model(inp)
+
+    torch.manual_seed(SEED)
+    calibration_data = [torch.randn(BATCH, IN_CH, 8, 8) for _ in range(4)]
+    cache = CalibrationStatsCache(tmp_path)
+
+    model = build_model(Int8WeightPerTensorFloat)
+    key = cache.fingerprint(model, calibration_data)
+    assert not cache.load(model, key)
+    calibrate(model, calibration_data)
+    cache.save(model, key)
+
+    # Weight quantization is not part of the fingerprint
+    cached_model = build_model(Int4WeightPerTensorFloatDecoupled)
+    assert cache.fingerprint(cached_model, calibration_data) == key
+    assert cache.load(cached_model, key)
+    reference_model = build_model(Int4WeightPerTensorFloatDecoupled)
+    calibrate(reference_model, calibration_data)
+    inp = torch.randn(BATCH, IN_CH, 8, 8)
+    assert torch.equal(cached_model(inp), reference_model(inp))
+
+    # Activation quantization and calibration data are
+    assert cache.fingerprint(build_model(Int8WeightPerTensorFloat, 4), calibration_data) != key
+    assert cache.fingerprint(build_model(Int8WeightPerTensorFloat), calibration_data[1:]) != key
+
+    # Float weights are only hashed on request
+    other_model = build_model(Int8WeightPerTensorFloat)
+    other_model[0].weight.data[0] += 1.
+    assert cache.fingerprint(other_model, calibration_data) == key
+    parameters_cache = CalibrationStatsCache(tmp_path, hash_parameters=True)
+    assert parameters_cache.fingerprint(other_model, calibration_data) != (
+        parameters_cache.fingerprint(model, calibration_data))
+
+
+def test_calibration_fingerprint_meta_device():
+    torch.manual_seed(SEED)
+    model = nn.Sequential(
+        qnn.QuantLinear(IN_CH, OUT_CH, bias=True, input_quant=Int8ActPerTensorFloat),
+        qnn.QuantReLU()).eval()
+    calibration_data = [torch.randn(BATCH, IN_CH)]
+    key = calibration_fingerprint(model, calibration_data)
+    # Parameters on the meta device are fingerprinted without being materialized
+    meta_model = deepcopy(model)
+    for name, param in list(meta_model[0]._parameters.items()):
+        meta_model[0]._parameters[name] = nn.Parameter(torch.empty_like(param, device='meta'))
+    assert calibration_fingerprint(meta_model, calibration_data) == key
+
+
+def test_quant_profiling_mode(tmp_path):
+    torch.manual_seed(SEED)
+    model = nn.Sequential(
+        qnn.QuantIdentity(return_quant_tensor=True),
+        qnn.QuantLinear(IN_CH, OUT_CH, bias=True, bias_quant=Int8Bias, return_quant_tensor=True),
+        qnn.QuantReLU()).eval()
+    inp = torch.randn(BATCH, IN_CH)
+    num_calls = 3
+    with torch.no_grad():
+        expected_out = model(inp)
+        with quant_profiling_mode(model) as profiler:
+            for _ in range(num_calls):
+                out = model(inp)
+    assert torch.equal(out, expected_out)
+
+    stats = profiler.stats()
+    for stage in ['forward', 'input_quant', 'weight_quant', 'bias_quant', 'compute',
+                  'output_quant']:
+        assert stats[('1', stage)]['calls'] == num_calls
+    assert stats[('0', 'act_quant')]['calls'] == num_calls
+    assert stats[('2', 'act_quant')]['calls'] == num_calls
+    assert ('0', 'weight_quant') not in stats
+    assert stats[('1', 'forward')]['cpu_time_total'] >= stats[('1',
+                                                               'weight_quant')]['cpu_time_total']
+    assert 'weight_quant' in profiler.table()
+
+    trace_path = tmp_path / 'trace.json'
+    profiler.export_chrome_trace(str(trace_path))
+    with open(trace_path) as f:
+        trace_names = {event.get('name') for event in json.load(f)['traceEvents']}
+    assert '1/compute' in trace_names
+
+    # Hooks and wrappers are removed on exit
+    assert 'quant_inner_forward_impl' not in model[1].__dict__
+    assert not model[1]._forward_hooks and not model[1].weight_quant._forward_pre_hooks
+
+
 class TestBiasCorrection():
 
     @fixture
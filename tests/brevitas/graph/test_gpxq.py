@@ -0,0 +1,281 @@
+# Copyright (C) 2023, Advanced Micro Devices, Inc. All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+
+import numpy as np
+import pytest
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from brevitas.graph.gpfq import gpfq_mode
+from brevitas.graph.gptq import GPTQ
+from brevitas.graph.gptq import gptq_mode
+from brevitas.graph.gpxq import LayerHandler
+from brevitas.graph.gpxq import StopFwdException
+import brevitas.nn as qnn
+
+SEED = 123456
+BATCH = 2
+IN_CH = 8
+FEATURES = 5
+
+LAYERS = {
+    'linear': lambda: qnn.QuantLinear(IN_CH, IN_CH * 2, bias=True),
+    'conv': lambda: qnn.QuantConv2d(IN_CH, IN_CH * 2, 3),
+    'depthwise_conv': lambda: qnn.QuantConv2d(IN_CH, IN_CH, 3, groups=IN_CH),
+    'grouped_conv': lambda: qnn.QuantConv2d(IN_CH, IN_CH * 2, 3, groups=2),
+    'conv_transpose': lambda: qnn.QuantConvTranspose2d(IN_CH, IN_CH * 2, 3)}
+
+CHUNKED_LAYERS = {
+    **LAYERS,
+    'strided_conv': lambda: qnn.QuantConv2d(IN_CH, IN_CH, 3, stride=2, padding=1),
+    'dilated_conv': lambda: qnn.QuantConv2d(IN_CH, IN_CH, 3, dilation=2, padding=(2, 1)),
+    'same_conv': lambda: qnn.QuantConv2d(IN_CH, IN_CH, (4, 3), dilation=(1, 2), padding='same'),
+    'valid_conv': lambda: qnn.QuantConv2d(IN_CH, IN_CH, 3, padding='valid'),
+    'conv1d': lambda: qnn.QuantConv1d(IN_CH, IN_CH, 3, stride=2, padding=1, groups=2),
+    'strided_conv_transpose': lambda: qnn.QuantConvTranspose2d(
+        IN_CH, IN_CH, 3, stride=2, padding=1),
+    'dilated_conv_transpose': lambda: qnn.QuantConvTranspose2d(
+        IN_CH, IN_CH, (3, 2), stride=(3, 1), dilation=2, padding=(2, 1)),
+    'conv_transpose1d': lambda: qnn.QuantConvTranspose1d(IN_CH, IN_CH, 3, stride=2, padding=1)}
+
+
+def build_model():
+    torch.manual_seed(SEED)
+    return nn.Sequential(
+        qnn.QuantConv2d(IN_CH, IN_CH * 2, 3, padding=1),
+        qnn.QuantConv2d(IN_CH * 2, IN_CH * 2, 3, padding=1, groups=IN_CH * 2),
+        qnn.QuantConv2d(IN_CH * 2, IN_CH * 2, 3, padding=1, groups=4),
+        qnn.QuantConvTranspose2d(IN_CH * 2, IN_CH, 3),
+        nn.Flatten(),
+        qnn.QuantLinear(IN_CH * (FEATURES + 2) ** 2, IN_CH)).eval()
+
+
+class ParallelLayersModel(nn.Module):
+
+    def __init__(self):
+        super().__init__()
+        self.q = qnn.QuantLinear(IN_CH, IN_CH, bias=True)
+        self.k = qnn.QuantLinear(IN_CH, IN_CH, bias=True)
+        self.v = qnn.QuantLinear(IN_CH, IN_CH, bias=True)
+        self.out = qnn.QuantLinear(IN_CH, IN_CH, bias=True)
+
+    def forward(self, x):
+        return self.out(self.q(x) * self.k(x) + self.v(x))
+
+
+class Block(nn.Module):
+
+    def __init__(self):
+        super().__init__()
+        self.linear_0 = qnn.QuantLinear(IN_CH, IN_CH * 2, bias=True)
+        self.linear_1 = qnn.QuantLinear(IN_CH * 2, IN_CH, bias=True)
+
+    def forward(self, x, scale=1.):
+        return (x + scale * self.linear_1(torch.relu(self.linear_0(x))),)
+
+
+class BlocksModel(nn.Module):
+
+    def __init__(self):
+        super().__init__()
+        self.blocks = nn.ModuleList([Block() for _ in range(3)])
+
+    def forward(self, x, scale=1.):
+        for block in self.blocks:
+            x = block(x, scale=scale)[0]
+        return x
+
+
+def apply_gptq(model, calib_data, gpxq_mode=gptq_mode, **kwargs):
+    with torch.no_grad():
+        with gpxq_mode(model, **kwargs) as gptq:
+            for _ in range(gptq.num_layers):
+                for inp in calib_data:
+                    gptq.model(inp)
+                gptq.update()
+    return model
+
+
+@pytest.mark.parametrize('layer_type', LAYERS.keys())
+@pytest.mark.parametrize('act_order', [True, False])
+def test_get_quant_weights_matches_full_quantization(layer_type, act_order):
+    torch.manual_seed(SEED)
+    layer = LAYERS[layer_type]().eval()
+    gptq = GPTQ(
+        layer,
+        'layer',
+        act_order=act_order,
+        len_parallel_layers=1,
+        create_weight_orig=False,
+        num_blocks=1)
+    permutation_list = [torch.randperm(gptq.columns) for _ in range(gptq.groups)]
+
+    quant_weight = layer.quant_weight().value
+    if isinstance(layer, qnn.QuantConvTranspose2d):
+        quant_weight = quant_weight.transpose(1, 0)
+    quant_weight = quant_weight.flatten(1).view(gptq.groups, -1, gptq.columns)
+    with torch.no_grad():
+        for i in range(gptq.columns):
+            q = gptq.get_quant_weights(i, 0, permutation_list)
+            if not act_order:
+                # Without act_order, all groups share the same permutation
+                expected = quant_weight[:, :, permutation_list[0][i]]
+            else:
+                expected = torch.stack([
+                    quant_weight[g, :, perm[i]] for g, perm in enumerate(permutation_list)])
+            assert torch.equal(q, expected)
+
+
+@pytest.mark.parametrize('act_order', [True, False])
+def test_gptq_quantizes_all_layers(act_order):
+    model = build_model()
+    torch.manual_seed(SEED)
+    calib_data = [torch.randn(BATCH, IN_CH, FEATURES, FEATURES) for _ in range(2)]
+    apply_gptq(model, calib_data, act_order=act_order)
+    for module in model.modules():
+        if isinstance(module, (qnn.QuantLinear, qnn.QuantConv2d, qnn.QuantConvTranspose2d)):
+            assert not torch.equal(module.weight, module.weight_orig)
+
+
+@pytest.mark.parametrize('act_order', [True, False])
+def test_gptq_lazy_weight_update(act_order):
+    torch.manual_seed(SEED)
+    calib_data = [torch.randn(BATCH, IN_CH, FEATURES, FEATURES) for _ in range(2)]
+    model = apply_gptq(build_model(), calib_data, act_order=act_order)
+    lazy_model = apply_gptq(
+        build_model(), calib_data, act_order=act_order, lazy_weight_update=True, num_blocks=4)
+    for module, lazy_module in zip(model.modules(), lazy_model.modules()):
+        if isinstance(module, (qnn.QuantLinear, qnn.QuantConv2d, qnn.QuantConvTranspose2d)):
+            assert torch.allclose(module.weight, lazy_module.weight, atol=1e-2)
+
+
+def accumulate_hessian(layer, inp, **kwargs):
+    gptq = GPTQ(
+        layer,
+        'layer',
+        act_order=False,
+        len_parallel_layers=1,
+        create_weight_orig=False,
+        num_blocks=1,
+        **kwargs)
+    with pytest.raises(StopFwdException):
+        gptq.update_batch(layer, (inp,), current_layer=LayerHandler())
+    return gptq.H
+
+
+@pytest.mark.parametrize('layer_type', CHUNKED_LAYERS.keys())
+@pytest.mark.parametrize('input_chunk_size', [1, 7, 64])
+def test_gptq_chunked_hessian(layer_type, input_chunk_size):
+    torch.manual_seed(SEED)
+    layer = CHUNKED_LAYERS[layer_type]().eval()
+    if isinstance(layer, qnn.QuantLinear):
+        inp = torch.randn(BATCH, FEATURES, IN_CH)
+    elif isinstance(layer, (qnn.QuantConv1d, qnn.QuantConvTranspose1d)):
+        inp = torch.randn(BATCH, IN_CH, FEATURES * 2)
+    else:
+        inp = torch.randn(BATCH, IN_CH, FEATURES * 2, FEATURES)
+    hessian = accumulate_hessian(layer, inp)
+    chunked_hessian = accumulate_hessian(layer, inp, input_chunk_size=input_chunk_size)
+    float64_hessian = accumulate_hessian(
+        layer, inp, input_chunk_size=input_chunk_size, accumulator_dtype=torch.float64)
+    assert chunked_hessian.dtype == torch.float32
+    assert float64_hessian.dtype == torch.float64
+    assert torch.allclose(hessian, chunked_hessian, atol=1e-5)
+    assert torch.allclose(hessian.to(torch.float64), float64_hessian, atol=1e-5)
+
+
+@pytest.mark.parametrize('layer_type', ['same_conv', 'valid_conv', 'dilated_conv', 'conv1d'])
+@pytest.mark.parametrize('input_chunk_size', [None, 7])
+def test_gptq_unfold_input_matches_conv(layer_type, input_chunk_size):
+    torch.manual_seed(SEED)
+    layer = CHUNKED_LAYERS[layer_type]().eval()
+    if isinstance(layer, qnn.QuantConv1d):
+        inp = torch.randn(BATCH, IN_CH, FEATURES * 2)
+    else:
+        inp = torch.randn(BATCH, IN_CH, FEATURES * 2, FEATURES)
+    gptq = GPTQ(
+        layer,
+        'layer',
+        act_order=False,
+        len_parallel_layers=1,
+        create_weight_orig=False,
+        num_blocks=1,
+        input_chunk_size=input_chunk_size)
+    # Each unfolded column multiplied by the flattened weight gives an output of the convolution.
+    # Chunks are split along the output rows, so outputs are compared regardless of their order
+    out = torch.cat([
+        torch.bmm(gptq.grouped_weight(), inp_chunk) for inp_chunk in gptq.unfold_input(inp)],
+                    dim=-1)
+    conv = F.conv1d if isinstance(layer, qnn.QuantConv1d) else F.conv2d
+    expected_out = conv(
+        inp, layer.weight, None, layer.stride, layer.padding, layer.dilation, layer.groups)
+    expected_out = expected_out.transpose(0, 1).reshape(out.shape)
+    out, expected_out = out.sort(dim=-1).values, expected_out.sort(dim=-1).values
+    assert torch.allclose(out, expected_out, atol=1e-5)
+
+
+@pytest.mark.parametrize('layer_type', LAYERS.keys())
+@pytest.mark.parametrize('act_order', [True, False])
+def test_gpfq_num_blocks(layer_type, act_order):
+    torch.manual_seed(SEED)
+    if layer_type == 'linear':
+        calib_data = [torch.randn(BATCH, FEATURES, IN_CH) for _ in range(2)]
+    else:
+        calib_data = [torch.randn(BATCH, IN_CH, FEATURES, FEATURES) for _ in range(2)]
+    models = []
+    for num_blocks in [1, 4]:
+        torch.manual_seed(SEED)
+        np.random.seed(SEED)
+        model = nn.Sequential(LAYERS[layer_type]()).eval()
+        models.append(
+            apply_gptq(model, calib_data, gpfq_mode, act_order=act_order, num_blocks=num_blocks))
+    layer, blocked_layer = models[0][0], models[1][0]
+    assert not torch.equal(blocked_layer.weight, blocked_layer.weight_orig)
+    assert torch.allclose(layer.weight, blocked_layer.weight, atol=1e-5)
+
+
+@pytest.mark.parametrize('gpxq_mode', [gptq_mode, gpfq_mode])
+def test_gpxq_parallel_layers_num_workers(gpxq_mode):
+    torch.manual_seed(SEED)
+    calib_data = [torch.randn(BATCH, FEATURES, IN_CH) for _ in range(2)]
+    models = []
+    for num_workers in [1, 3]:
+        torch.manual_seed(SEED)
+        model = ParallelLayersModel().eval()
+        torch.manual_seed(SEED)
+        models.append(
+            apply_gptq(
+                model,
+                calib_data,
+                gpxq_mode=gpxq_mode,
+                group_of_parallel_layers=[['q', 'k', 'v']],
+                num_workers=num_workers))
+    for module, parallel_module in zip(models[0].modules(), models[1].modules()):
+        if isinstance(module, qnn.QuantLinear):
+            assert not torch.equal(module.weight, module.weight_orig)
+            assert torch.equal(module.weight, parallel_module.weight)
+
+
+@pytest.mark.parametrize('gpxq_mode', [gptq_mode, gpfq_mode])
+@pytest.mark.parametrize('spill_to_disk', [True, False])
+def test_gpxq_blockwise_update(gpxq_mode, spill_to_disk, tmp_path):
+    torch.manual_seed(SEED)
+    calib_data = [torch.randn(BATCH, FEATURES, IN_CH) for _ in range(2)]
+    torch.manual_seed(SEED)
+    model = apply_gptq(BlocksModel().eval(), calib_data, gpxq_mode=gpxq_mode)
+    torch.manual_seed(SEED)
+    blockwise_model = BlocksModel().eval()
+    with torch.no_grad():
+        with gpxq_mode(blockwise_model) as gpxq:
+            gpxq.blockwise_update(
+                blockwise_model.blocks,
+                [{
+                    'x': inp, 'scale': 1.} if i % 2 else inp for i, inp in enumerate(calib_data)],
+                cache_dir=str(tmp_path) if spill_to_disk else None)
+    for module, blockwise_module in zip(model.modules(), blockwise_model.modules()):
+        if isinstance(module, qnn.QuantLinear):
+            assert not torch.equal(blockwise_module.weight, blockwise_module.weight_orig)
+            assert torch.allclose(module.weight, blockwise_module.weight)
+            assert len(blockwise_module._forward_pre_hooks) == 0
+    assert len(list(tmp_path.iterdir())) == 0
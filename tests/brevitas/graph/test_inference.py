@@ -0,0 +1,444 @@
+# Copyright (C) 2023, Advanced Micro Devices, Inc. All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+
+import gc
+import io
+import weakref
+
+from packaging import version
+import pytest
+import torch
+import torch.nn as nn
+
+from brevitas import torch_version
+from brevitas.graph.calibrate import calibration_mode
+from brevitas.graph.inference import compile_mode
+from brevitas.graph.inference import enable_compile_mode
+from brevitas.graph.inference import freeze_quant_params
+from brevitas.graph.inference import frozen_inference_mode
+from brevitas.graph.inference import fused_attention_mode
+from brevitas.graph.inference import int_inference_mode
+from brevitas.graph.inference import is_int8_accumulation_exact
+from brevitas.graph.inference import is_int_inference_available
+import brevitas.graph.inference as inference
+from brevitas.graph.inference import pack_quant_weights
+from brevitas.graph.inference import unpack_quant_weights
+import brevitas.nn as qnn
+from brevitas.quant import Int8ActPerTensorFloat
+from brevitas.quant import Int8Bias
+from brevitas.quant import Int8WeightPerChannelFloat
+from brevitas.quant import Int8WeightPerTensorFloat
+from brevitas.quant import ShiftedUint8ActPerTensorFloat
+from brevitas.quant import ShiftedUint8WeightPerTensorFloat
+from brevitas.quant import Uint8ActPerTensorFloat
+from brevitas_examples.common.generative.quantizers import IntWeightSymmetricGroupQuant
+from brevitas_examples.common.generative.quantizers import ShiftedUintWeightAsymmetricGroupQuant
+
+SEED = 123456
+BATCH = 2
+IN_CH = 8
+
+LAYERS = {
+    'linear': lambda: qnn.QuantLinear(IN_CH, IN_CH * 2, bias=True, bias_quant=Int8Bias),
+    'conv': lambda: qnn.QuantConv2d(IN_CH, IN_CH * 2, 3, bias_quant=Int8Bias),
+    'conv_transpose': lambda: qnn.QuantConvTranspose2d(IN_CH, IN_CH * 2, 3, bias_quant=Int8Bias)}
+
+
+def build_model(layer_type):
+    torch.manual_seed(SEED)
+    layer = LAYERS[layer_type]()
+    model = nn.Sequential(
+        qnn.QuantIdentity(act_quant=Int8ActPerTensorFloat, return_quant_tensor=True), layer)
+    model.eval()
+    return model
+
+
+def model_input(layer_type):
+    if layer_type == 'linear':
+        return torch.randn(BATCH, IN_CH)
+    return torch.randn(BATCH, IN_CH, 5, 5)
+
+
+@pytest.mark.parametrize('layer_type', LAYERS.keys())
+def test_frozen_inference_mode(layer_type):
+    model = build_model(layer_type)
+    inp = model_input(layer_type)
+    with torch.no_grad():
+        expected_out = model(inp)
+        with frozen_inference_mode(model):
+            out = model(inp)
+            quant_weight = model[1].quant_weight()
+            assert model[1].quant_weight() is quant_weight
+            frozen_out = model(inp)
+    assert torch.equal(out, expected_out)
+    assert torch.equal(frozen_out, expected_out)
+    assert model[1]._frozen_quant_weight is None
+    assert model[1]._frozen_quant_bias is None
+
+
+@pytest.mark.parametrize('layer_type', LAYERS.keys())
+def test_frozen_inference_mode_invalidation(layer_type):
+    model = build_model(layer_type)
+    inp = model_input(layer_type)
+    with torch.no_grad():
+        with frozen_inference_mode(model):
+            model(inp)
+            model[1].weight.mul_(2.)
+            model[1].bias.add_(1.)
+            out = model(inp)
+        expected_out = model(inp)
+    assert torch.equal(out, expected_out)
+
+
+def test_frozen_inference_mode_state_dict():
+    model = build_model('linear')
+    reference_model = build_model('linear')
+    inp = model_input('linear')
+    with torch.no_grad():
+        reference_model[1].weight.mul_(2.)
+        with frozen_inference_mode(model):
+            model(inp)
+            model[1].load_state_dict(reference_model[1].state_dict())
+            out = model(inp)
+        expected_out = reference_model(inp)
+    assert torch.equal(out, expected_out)
+
+
+INT_LAYERS = {
+    'linear':
+        lambda weight_quant: qnn.QuantLinear(
+            IN_CH, IN_CH * 2, bias=True, weight_quant=weight_quant, bias_quant=Int8Bias),
+    'conv1d':
+        lambda weight_quant: qnn.QuantConv1d(
+            IN_CH, IN_CH * 2, 3, padding=1, weight_quant=weight_quant, bias_quant=Int8Bias),
+    'conv2d':
+        lambda weight_quant: qnn.QuantConv2d(
+            IN_CH, IN_CH * 2, 3, stride=2, weight_quant=weight_quant, bias_quant=Int8Bias),
+    'grouped_conv2d':
+        lambda weight_quant: qnn.QuantConv2d(
+            IN_CH, IN_CH * 2, 3, groups=2, bias=False, weight_quant=weight_quant)}
+
+INT_INPUT_SHAPES = {
+    'linear': (BATCH, 3, IN_CH),
+    'conv1d': (BATCH, IN_CH, 10),
+    'conv2d': (BATCH, IN_CH, 10, 10),
+    'grouped_conv2d': (BATCH, IN_CH, 10, 10)}
+
+
+def build_int_model(layer_type, input_quant, weight_quant):
+    torch.manual_seed(SEED)
+    model = nn.Sequential(
+        qnn.QuantIdentity(act_quant=input_quant, return_quant_tensor=True),
+        INT_LAYERS[layer_type](weight_quant))
+    model.eval()
+    with torch.no_grad():
+        with calibration_mode(model):
+            model(torch.randn(INT_INPUT_SHAPES[layer_type]))
+    return model
+
+
+@pytest.mark.skipif(not is_int_inference_available(), reason='Requires oneDNN quantized kernels')
+@pytest.mark.parametrize('layer_type', INT_LAYERS.keys())
+@pytest.mark.parametrize(
+    'input_quant', [Int8ActPerTensorFloat, Uint8ActPerTensorFloat, ShiftedUint8ActPerTensorFloat])
+@pytest.mark.parametrize('weight_quant', [Int8WeightPerTensorFloat, Int8WeightPerChannelFloat])
+def test_int_inference_mode(layer_type, input_quant, weight_quant):
+    model = build_int_model(layer_type, input_quant, weight_quant)
+    inp = torch.randn(INT_INPUT_SHAPES[layer_type])
+    with torch.no_grad():
+        expected_out = model(inp)
+        with int_inference_mode(model):
+            out = model(inp)
+            if is_int8_accumulation_exact():
+                assert model[1].int_inference_impl.packed_weight is not None
+    assert model[1].int_inference_impl is None
+    assert torch.allclose(out, expected_out, atol=1e-5)
+
+
+@pytest.mark.skipif(not is_int_inference_available(), reason='Requires oneDNN quantized kernels')
+@pytest.mark.parametrize(
+    'input_quant', [Int8ActPerTensorFloat, Uint8ActPerTensorFloat, ShiftedUint8ActPerTensorFloat])
+def test_int_inference_mode_without_vnni(input_quant, monkeypatch):
+    monkeypatch.setattr(inference, 'is_int8_accumulation_exact', lambda: False)
+    # 8-bit inputs could saturate the accumulation, while 7-bit ones are still run in int
+    for bit_width, is_int in [(8, False), (7, True)]:
+        model = build_int_model(
+            'linear', input_quant.let(bit_width=bit_width), Int8WeightPerTensorFloat)
+        inp = torch.randn(INT_INPUT_SHAPES['linear'])
+        with torch.no_grad():
+            expected_out = model(inp)
+            with int_inference_mode(model):
+                out = model(inp)
+                assert (model[1].int_inference_impl.packed_weight is not None) == is_int
+        assert torch.allclose(out, expected_out, atol=1e-5)
+
+
+@pytest.mark.skipif(not is_int_inference_available(), reason='Requires oneDNN quantized kernels')
+def test_int_inference_mode_fallback():
+    # Unsigned weights can't be represented as int8, so the layer falls back to float
+    model = build_int_model('linear', Int8ActPerTensorFloat, ShiftedUint8WeightPerTensorFloat)
+    inp = torch.randn(INT_INPUT_SHAPES['linear'])
+    with torch.no_grad():
+        expected_out = model(inp)
+        with int_inference_mode(model):
+            out = model(inp)
+            assert model[1].int_inference_impl.packed_weight is None
+    assert torch.equal(out, expected_out)
+
+
+PACKED_LAYERS = {
+    'embedding_3b':
+        lambda: qnn.QuantEmbedding(
+            IN_CH * 4, IN_CH * 4, weight_quant=Int8WeightPerTensorFloat, weight_bit_width=3),
+    'linear_4b_per_channel':
+        lambda: qnn.QuantLinear(
+            IN_CH * 4,
+            IN_CH * 4,
+            bias=True,
+            weight_quant=Int8WeightPerChannelFloat,
+            weight_bit_width=4,
+            bias_quant=Int8Bias),
+    'linear_4b_per_group':
+        lambda: qnn.QuantLinear(
+            IN_CH * 4,
+            IN_CH * 4,
+            bias=False,
+            weight_quant=IntWeightSymmetricGroupQuant,
+            weight_bit_width=4,
+            weight_group_size=IN_CH),
+    'linear_2b_asym_per_group':
+        lambda: qnn.QuantLinear(
+            IN_CH * 4,
+            IN_CH * 4,
+            bias=False,
+            weight_quant=ShiftedUintWeightAsymmetricGroupQuant,
+            weight_bit_width=2,
+            weight_group_size=IN_CH)}
+
+
+def build_packed_model(layer_type):
+    torch.manual_seed(SEED)
+    model = nn.Sequential(
+        qnn.QuantIdentity(act_quant=Int8ActPerTensorFloat, return_quant_tensor=True),
+        PACKED_LAYERS[layer_type]())
+    if layer_type.startswith('embedding'):
+        model = model[1:]
+    model.eval()
+    return model
+
+
+def packed_model_input(layer_type):
+    if layer_type.startswith('embedding'):
+        return torch.randint(0, IN_CH * 4, (BATCH, 3))
+    return torch.randn(BATCH, IN_CH * 4)
+
+
+def state_dict_size(model):
+    return sum(t.numel() * t.element_size() for t in model.state_dict().values())
+
+
+@pytest.mark.parametrize('layer_type', PACKED_LAYERS.keys())
+def test_pack_quant_weights(layer_type):
+    model = build_packed_model(layer_type)
+    layer = model[-1]
+    inp = packed_model_input(layer_type)
+    with torch.no_grad():
+        expected_out = model(inp)
+        expected_quant_weight = layer.quant_weight()
+        float_size = state_dict_size(model)
+        pack_quant_weights(model)
+        quant_weight = layer.quant_weight()
+        out = model(inp)
+    assert layer.is_weight_packed
+    assert 'weight' not in layer.state_dict()
+    assert layer.packed_weight.packed.dtype == torch.uint8
+    assert state_dict_size(model) < float_size
+    assert torch.equal(out, expected_out)
+    assert torch.equal(quant_weight.value, expected_quant_weight.value)
+    assert torch.equal(quant_weight.scale, expected_quant_weight.scale)
+    assert torch.equal(quant_weight.zero_point, expected_quant_weight.zero_point)
+    unpack_quant_weights(model)
+    assert not layer.is_weight_packed
+    with torch.no_grad():
+        assert torch.equal(model(inp), expected_out)
+
+
+@pytest.mark.parametrize('layer_type', PACKED_LAYERS.keys())
+def test_pack_quant_weights_releases_float_weight(layer_type):
+    model = build_packed_model(layer_type)
+    layer = model[-1]
+    weight_ref = weakref.ref(layer.weight)
+    num_params = sum(p.numel() for p in model.parameters())
+    weight_numel = layer.weight.numel()
+    pack_quant_weights(model)
+    gc.collect()
+    assert weight_ref() is None
+    assert sum(p.numel() for p in model.parameters()) == num_params - weight_numel
+    # Loading a packed state dict releases the float weight of the new model as well
+    new_model = build_packed_model(layer_type)
+    weight_ref = weakref.ref(new_model[-1].weight)
+    new_model.load_state_dict(model.state_dict(), strict=False)
+    gc.collect()
+    assert new_model[-1].is_weight_packed
+    assert weight_ref() is None
+
+
+@pytest.mark.parametrize('layer_type', PACKED_LAYERS.keys())
+def test_pack_quant_weights_state_dict(layer_type):
+    model = build_packed_model(layer_type)
+    inp = packed_model_input(layer_type)
+    with torch.no_grad():
+        with calibration_mode(model):
+            model(inp)
+        pack_quant_weights(model)
+        expected_out = model(inp)
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    buffer.seek(0)
+    # Loading into an unpacked model packs it
+    new_model = build_packed_model(layer_type)
+    new_model.load_state_dict(torch.load(buffer), strict=False)
+    assert new_model[-1].is_weight_packed
+    with torch.no_grad():
+        assert torch.equal(new_model(inp), expected_out)
+        with frozen_inference_mode(new_model):
+            new_model(inp)
+            assert torch.equal(new_model(inp), expected_out)
+
+
+class CompileModel(nn.Module):
+
+    def __init__(self):
+        super().__init__()
+        self.input_quant = qnn.QuantIdentity(return_quant_tensor=True)
+        self.conv = qnn.QuantConv2d(
+            IN_CH, IN_CH, 3, padding=1, bias_quant=Int8Bias, return_quant_tensor=True)
+        self.relu = qnn.QuantReLU(return_quant_tensor=True)
+        self.add = qnn.QuantEltwiseAdd()
+        self.pool = qnn.QuantMaxPool2d(2, return_quant_tensor=False)
+        self.mha = qnn.QuantMultiheadAttention(IN_CH, 2, batch_first=True)
+        self.linear = qnn.QuantLinear(
+            IN_CH, 4, bias=True, input_quant=Int8ActPerTensorFloat, bias_quant=Int8Bias)
+
+    def forward(self, x):
+        x = self.input_quant(x)
+        x = self.pool(self.add(x, self.relu(self.conv(x))))
+        x = x.flatten(2).transpose(1, 2)
+        x, _ = self.mha(x, x, x, need_weights=False)
+        return self.linear(x)
+
+
+def build_compile_model():
+    torch.manual_seed(SEED)
+    model = CompileModel()
+    inp = torch.randn(BATCH, IN_CH, 6, 6)
+    model.eval()
+    with torch.no_grad():
+        with calibration_mode(model):
+            model(inp)
+    model.train()
+    return model, inp
+
+
+def test_compile_mode():
+    model, inp = build_compile_model()
+    with torch.no_grad():
+        expected_out = model.eval()(inp)
+        model.train()
+        with compile_mode(model, (inp,)):
+            assert not model.training
+            assert model.conv.compile_mode
+            out = model(inp)
+    assert torch.equal(out, expected_out)
+    assert model.training
+    assert not model.conv.compile_mode
+    assert model.conv._compile_quant_weight is None
+    assert model.conv._compile_quant_bias is None
+
+
+@pytest.mark.skipif(torch_version < version.parse('2.1'), reason='Requires torch.compile')
+def test_compile_mode_graph_breaks():
+    model, inp = build_compile_model()
+    with torch.no_grad():
+        expected_out = model.eval()(inp)
+        with compile_mode(model, (inp,)):
+            explanation = torch._dynamo.explain(model)(inp)
+            out = torch.compile(model, backend='eager')(inp)
+    torch._dynamo.reset()
+    assert explanation.graph_break_count == 0
+    assert torch.equal(out, expected_out)
+
+
+def test_compile_mode_requires_example_inputs():
+    model, inp = build_compile_model()
+    with pytest.raises(RuntimeError, match='conv'):
+        enable_compile_mode(model)
+    # The model is left untouched on failure
+    assert model.training
+    for module in model.modules():
+        assert not getattr(module, 'compile_mode', False)
+        assert not getattr(module, 'freeze_quant_weight', False)
+        assert getattr(module, '_compile_quant_weight', None) is None
+        assert getattr(module, '_frozen_quant_weight', None) is None
+
+
+def test_compile_mode_keeps_frozen_layers():
+    model, inp = build_compile_model()
+    freeze_quant_params(model.conv)
+    with torch.no_grad():
+        with compile_mode(model, (inp,)):
+            model(inp)
+        assert model.conv.freeze_quant_weight
+        assert model.conv.freeze_quant_bias
+        for name, module in model.named_modules():
+            if name != 'conv':
+                assert not getattr(module, 'freeze_quant_weight', False)
+        # The cached value is still reused after compile mode
+        model.eval()
+        model(inp)
+        assert model.conv._frozen_quant_weight is not None
+
+
+def test_compile_mode_packed_in_proj_cross_attention():
+    model, inp = build_compile_model()
+    query, key = torch.randn(BATCH, 4, IN_CH), torch.randn(BATCH, 4, IN_CH)
+    with torch.no_grad(), compile_mode(model, (inp,)):
+        # Self-attention is only assumed while tracing with torch.compile
+        with pytest.raises(RuntimeError, match='self-attention'):
+            model.mha(query, key, key)
+
+
+def test_compile_mode_unsupported_layer():
+    model = nn.Sequential(qnn.QuantIdentity(), qnn.TruncAvgPool2d(2))
+    with pytest.raises(RuntimeError, match='1'):
+        enable_compile_mode(model, (torch.randn(BATCH, IN_CH, 4, 4),))
+
+
+@pytest.mark.parametrize('softmax_quant', [True, False])
+@pytest.mark.parametrize('mask', [None, 'attn_mask', 'key_padding_mask'])
+@pytest.mark.parametrize('query_chunk_size', [1, 3, 16])
+def test_fused_attention_mode(softmax_quant, mask, query_chunk_size):
+    if not softmax_quant and torch_version < version.parse('2.1'):
+        pytest.skip("Scaled dot product attention with a custom scale requires torch>=2.1.")
+    torch.manual_seed(SEED)
+    seq_len = 7
+    embed_dim = 8
+    kwargs = {}
+    if not softmax_quant:
+        kwargs['attn_output_weights_quant'] = None
+    model = qnn.QuantMultiheadAttention(embed_dim, 2, batch_first=True, **kwargs).eval()
+    inp = torch.randn(BATCH, seq_len, embed_dim)
+    mask_kwargs = {}
+    if mask == 'attn_mask':
+        mask_kwargs['attn_mask'] = torch.ones(seq_len, seq_len).triu(1).bool()
+    elif mask == 'key_padding_mask':
+        mask_kwargs['key_padding_mask'] = torch.zeros(BATCH, seq_len).bool()
+        mask_kwargs['key_padding_mask'][:, -2:] = True
+    with torch.no_grad():
+        expected_out, _ = model(inp, inp, inp, need_weights=False, **mask_kwargs)
+        with fused_attention_mode(model, query_chunk_size=query_chunk_size):
+            assert model.fused_attention
+            out, weights = model(inp, inp, inp, need_weights=False, **mask_kwargs)
+    assert not model.fused_attention
+    assert weights is None
+    assert torch.allclose(out, expected_out, atol=1e-5)
@@ -0,0 +1,164 @@
+# Copyright (C) 2023, Advanced Micro Devices, Inc. All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+
+import os
+
+from packaging import version
+import pytest
+import torch
+import torch.nn as nn
+
+from brevitas import torch_version
+from brevitas.graph.calibrate import bias_correction_mode
+from brevitas.graph.gptq import gptq_mode
+from brevitas.graph.offload import disable_param_offload
+from brevitas.graph.offload import enable_param_offload
+from brevitas.graph.offload import param_offload_mode
+import brevitas.nn as qnn
+
+SEED = 123456
+BATCH = 2
+IN_CH = 8
+FEATURES = 5
+
+
+def build_model():
+    torch.manual_seed(SEED)
+    return nn.Sequential(
+        qnn.QuantConv2d(IN_CH, IN_CH * 2, 3, padding=1),
+        nn.ReLU(),
+        qnn.QuantConv2d(IN_CH * 2, IN_CH, 3, padding=1),
+        nn.Flatten(),
+        qnn.QuantLinear(IN_CH * FEATURES ** 2, IN_CH, bias=True)).eval()
+
+
+def calib_data():
+    torch.manual_seed(SEED)
+    return [torch.randn(BATCH, IN_CH, FEATURES, FEATURES) for _ in range(2)]
+
+
+@pytest.mark.parametrize('to_disk', [True, False])
+def test_param_offload_forward(to_disk, tmp_path):
+    model = build_model()
+    inp = calib_data()[0]
+    with torch.no_grad():
+        reference = model(inp)
+        offload_dir = str(tmp_path) if to_disk else None
+        with param_offload_mode(model, offload_dir=offload_dir):
+            assert all(not m._param_offload.is_materialized for m in model if hasattr(m, 'weight'))
+            if to_disk:
+                assert len(os.listdir(model._param_offload_dir)) == 3
+            out = model(inp)
+    assert torch.allclose(out, reference)
+    assert len(os.listdir(tmp_path)) == 0
+
+
+def test_param_offload_disable():
+    model = build_model()
+    state_dict = {k: v.clone() for k, v in model.state_dict().items()}
+    enable_param_offload(model)
+    disable_param_offload(model)
+    for k, v in model.state_dict().items():
+        assert torch.equal(v, state_dict[k])
+    for m in model.modules():
+        assert not hasattr(m, '_param_offload')
+        assert not hasattr(m, 'allocate_params')
+        assert len(m._forward_pre_hooks) == 0
+        assert len(m._forward_hooks) == 0
+    assert not hasattr(model, '_param_offload_dir')
+
+
+def apply_gptq(model, calib_data):
+    with torch.no_grad():
+        with gptq_mode(model) as gptq:
+            for _ in range(gptq.num_layers):
+                for inp in calib_data:
+                    gptq.model(inp)
+                gptq.update()
+    return model
+
+
+@pytest.mark.parametrize('to_disk', [True, False])
+def test_param_offload_gptq(to_disk, tmp_path):
+    data = calib_data()
+    model = apply_gptq(build_model(), data)
+    offload_model = build_model()
+    with param_offload_mode(offload_model, offload_dir=str(tmp_path) if to_disk else None):
+        apply_gptq(offload_model, data)
+    for module, offload_module in zip(model.modules(), offload_model.modules()):
+        if hasattr(module, 'weight_orig'):
+            assert not torch.equal(offload_module.weight, offload_module.weight_orig)
+            assert torch.allclose(module.weight, offload_module.weight)
+
+
+def test_param_offload_bias_correction():
+    data = calib_data()
+    model = build_model()
+    offload_model = build_model()
+    with torch.no_grad():
+        for m in (model, offload_model):
+            with param_offload_mode(m, enabled=m is offload_model):
+                with bias_correction_mode(m):
+                    for inp in data:
+                        m(inp)
+    for module, offload_module in zip(model.modules(), offload_model.modules()):
+        if getattr(module, 'bias', None) is not None:
+            assert torch.allclose(module.bias, offload_module.bias)
+
+
+def build_float_model():
+    torch.manual_seed(SEED)
+    return nn.Sequential(
+        nn.Conv2d(IN_CH, IN_CH * 2, 3, padding=1),
+        nn.BatchNorm2d(IN_CH * 2),
+        nn.ReLU(),
+        nn.Flatten(),
+        nn.Linear(IN_CH * 2 * FEATURES ** 2, IN_CH)).eval()
+
+
+@pytest.mark.skipif(torch_version < version.parse('2.0'), reason='Requires torch.device as context')
+@pytest.mark.parametrize('to_disk', [True, False])
+def test_param_offload_from_meta_device(to_disk, tmp_path):
+    safetensors_torch = pytest.importorskip('safetensors.torch')
+    model = build_float_model()
+    checkpoint = str(tmp_path / 'model.safetensors')
+    safetensors_torch.save_file(model.state_dict(), checkpoint)
+    with torch.device('meta'):
+        meta_model = build_float_model()
+    inp = calib_data()[0]
+    offload_dir = tmp_path / 'offload'
+    offload_dir.mkdir()
+    with torch.no_grad():
+        reference = model(inp)
+        enable_param_offload(
+            meta_model,
+            offload_dir=str(offload_dir) if to_disk else None,
+            checkpoint=checkpoint)
+        assert all(not t.is_meta for t in meta_model.state_dict().values())
+        assert not meta_model[0]._param_offload.is_materialized
+        # Layers are read from the checkpoint until they are written back
+        if to_disk:
+            assert len(os.listdir(meta_model._param_offload_dir)) == 0
+        assert torch.allclose(meta_model(inp), reference)
+        meta_model[0].allocate_params(meta_model[0])
+        meta_model[0].weight += 1.
+        meta_model[0].offload_params(meta_model[0])
+        disable_param_offload(meta_model)
+    assert len(os.listdir(offload_dir)) == 0
+    assert torch.equal(meta_model[0].weight, model[0].weight + 1.)
+    for k, v in model.state_dict().items():
+        if k != '0.weight':
+            assert torch.equal(meta_model.state_dict()[k], v)
+
+
+@pytest.mark.skipif(torch_version < version.parse('2.0'), reason='Requires torch.device as context')
+def test_param_offload_from_meta_device_missing_tensor(tmp_path):
+    safetensors_torch = pytest.importorskip('safetensors.torch')
+    state_dict = build_float_model().state_dict()
+    del state_dict['1.running_mean']
+    checkpoint = str(tmp_path / 'model.safetensors')
+    safetensors_torch.save_file(state_dict, checkpoint)
+    with torch.device('meta'):
+        meta_model = build_float_model()
+    with pytest.raises(RuntimeError, match='1.running_mean'):
+        enable_param_offload(meta_model, checkpoint=checkpoint)
@@ -7,11 +7,20 @@ import torch
 from torch.nn import MultiheadAttention
 
 from brevitas import torch_version
+from brevitas.graph.calibrate import calibration_mode
+from brevitas.nn import QuantKVCache
 from brevitas.nn import QuantMultiheadAttention
+from brevitas.quant import ShiftedUint8ActPerTensorFloat
+from brevitas.quant_tensor import QuantTensor
 
 ATOL = 1e-6
 EMBED_DIM = 9
 NUM_HEADS = 3
+KV_QUANT = {
+    'int8': ({}, torch.int8),
+    'shifted_uint8': ({
+        'k_transposed_quant': ShiftedUint8ActPerTensorFloat,
+        'v_quant': ShiftedUint8ActPerTensorFloat}, torch.uint8)}
 
 
 class TestQuantMultiheadAttention:
@@ -49,3 +58,43 @@ class TestQuantMultiheadAttention:
         out = qm(inp, inp, inp)
         assert torch.isclose(out[0], ref_out[0], atol=ATOL).all()
         assert torch.isclose(out[1], ref_out[1], atol=ATOL).all()
+
+    @pytest.mark.parametrize("packed_in_proj", [True, False])
+    @pytest.mark.parametrize("kv_quant", ['int8', 'shifted_uint8'])
+    def test_mha_kv_cache(self, packed_in_proj, kv_quant):
+        torch.manual_seed(0)
+        seq_len, prompt_len = 6, 3
+        kwargs, cache_dtype = KV_QUANT[kv_quant]
+        qm = QuantMultiheadAttention(
+            EMBED_DIM, NUM_HEADS, packed_in_proj=packed_in_proj, **kwargs)
+        inp = torch.randn(seq_len, 2, EMBED_DIM)
+        causal_mask = torch.ones(seq_len, seq_len, dtype=torch.bool).triu(1)
+        with torch.no_grad():
+            with calibration_mode(qm):
+                qm(inp, inp, inp, attn_mask=causal_mask)
+            qm.eval()
+            ref_out, _ = qm(inp, inp, inp, attn_mask=causal_mask)
+            kv_cache = QuantKVCache()
+            prompt = inp[:prompt_len]
+            out, _ = qm(
+                prompt, prompt, prompt, attn_mask=causal_mask[:prompt_len, :prompt_len],
+                kv_cache=kv_cache)
+            outs = [out]
+            for i in range(prompt_len, seq_len):
+                token = inp[i:i + 1]
+                out, weights = qm(token, token, token, kv_cache=kv_cache)
+                assert weights.shape == (2, 1, i + 1)
+                outs.append(out)
+        assert kv_cache.seq_len == seq_len
+        assert kv_cache.keys.data.dtype == cache_dtype
+        assert kv_cache.values.data.dtype == cache_dtype
+        assert torch.isclose(torch.cat(outs), ref_out, atol=ATOL).all()
+
+    def test_mha_kv_cache_per_channel_scale(self):
+        kv_cache = QuantKVCache()
+        value = torch.randn(NUM_HEADS, 2, EMBED_DIM // NUM_HEADS)
+        scale = torch.rand(1, 1, EMBED_DIM // NUM_HEADS) + 0.1
+        x = QuantTensor(
+            value, scale=scale, zero_point=torch.tensor(0.), bit_width=8, signed=True)
+        with pytest.raises(RuntimeError, match="per-tensor"):
+            kv_cache.keys.append(x)
@@ -1,6 +1,7 @@
 # Copyright (C) 2023, Advanced Micro Devices, Inc. All rights reserved.
 # SPDX-License-Identifier: BSD-3-Clause
 
+import copy
 import warnings
 
 from hypothesis import given
@@ -10,6 +11,7 @@ import torch
 
 from brevitas.nn import QuantLSTM
 from brevitas.nn import QuantRNN
+import brevitas.nn.quant_rnn as quant_rnn
 from brevitas.quant_tensor import QuantTensor
 from tests.brevitas.hyp_helper import float_tensor_random_size_st
 
@@ -320,3 +322,141 @@ class TestRecurrent:
                 assert all([isinstance(el, QuantTensor) for el in c])
             else:
                 assert all([isinstance(el, torch.Tensor) for el in c])
+
+    @pytest.mark.parametrize("batch_first", [True, False])
+    @pytest.mark.parametrize("bidirectional", [True, False])
+    @pytest.mark.parametrize("num_layers", [1, 2])
+    @pytest.mark.parametrize("bias", [True, False])
+    def test_quant_rnn_fuse_gate_gemms(self, batch_first, bidirectional, num_layers, bias):
+        inp_size = 4
+        hidden_size = 5
+        inp = torch.randn(2, 3, inp_size)
+        kwargs = dict(
+            num_layers=num_layers, batch_first=batch_first, bidirectional=bidirectional, bias=bias)
+        m = QuantRNN(inp_size, hidden_size, **kwargs).eval()
+        fused_m = QuantRNN(inp_size, hidden_size, fuse_gate_gemms=True, **kwargs)
+        # Activation scales are not in the state dict before calibration
+        fused_m.load_state_dict(m.state_dict(), strict=False)
+        fused_m.eval()
+        out, state = m(inp)
+        fused_out, fused_state = fused_m(inp)
+        assert torch.isclose(out, fused_out, atol=ATOL).all()
+        assert torch.isclose(state, fused_state, atol=ATOL).all()
+
+    @pytest.mark.parametrize("batch_first", [True, False])
+    @pytest.mark.parametrize("bidirectional", [True, False])
+    @pytest.mark.parametrize("num_layers", [1, 2])
+    @pytest.mark.parametrize("bias", [True, False])
+    @pytest.mark.parametrize("coupled_input_forget_gates", [True, False])
+    def test_quant_lstm_fuse_gate_gemms(
+            self, batch_first, bidirectional, num_layers, bias, coupled_input_forget_gates):
+        inp_size = 4
+        hidden_size = 5
+        inp = torch.randn(2, 3, inp_size)
+        kwargs = dict(
+            num_layers=num_layers,
+            batch_first=batch_first,
+            bidirectional=bidirectional,
+            bias=bias,
+            coupled_input_forget_gates=coupled_input_forget_gates)
+        m = QuantLSTM(inp_size, hidden_size, **kwargs).eval()
+        fused_m = QuantLSTM(inp_size, hidden_size, fuse_gate_gemms=True, **kwargs)
+        # Activation scales are not in the state dict before calibration
+        fused_m.load_state_dict(m.state_dict(), strict=False)
+        fused_m.eval()
+        out, (h, c) = m(inp)
+        fused_out, (fused_h, fused_c) = fused_m(inp)
+        assert torch.isclose(out, fused_out, atol=ATOL).all()
+        assert torch.isclose(h, fused_h, atol=ATOL).all()
+        assert torch.isclose(c, fused_c, atol=ATOL).all()
+
+    @pytest.mark.parametrize("model_impl", [QuantRNN, QuantLSTM])
+    @pytest.mark.parametrize("batch_first", [True, False])
+    @pytest.mark.parametrize("num_layers", [1, 2])
+    def test_quant_recurrent_concurrent_directions(self, model_impl, batch_first, num_layers):
+        inp_size = 4
+        hidden_size = 5
+        inp = torch.randn(2, 3, inp_size)
+        kwargs = dict(num_layers=num_layers, batch_first=batch_first, bidirectional=True)
+        m = model_impl(inp_size, hidden_size, **kwargs).eval()
+        concurrent_m = model_impl(inp_size, hidden_size, concurrent_directions=True, **kwargs)
+        concurrent_m.load_state_dict(m.state_dict(), strict=False)
+        concurrent_m.eval()
+        num_threads = torch.get_num_threads()
+        with torch.no_grad():
+            out = m(inp)
+            concurrent_out = concurrent_m(inp)
+            executor = quant_rnn._EXECUTOR
+            copy.deepcopy(concurrent_m)(inp)
+        # A single pool is shared across forward passes and models, and the number of intra-op
+        # threads is left untouched
+        assert executor is not None and quant_rnn._EXECUTOR is executor
+        assert torch.get_num_threads() == num_threads
+        assert torch.isclose(out[0], concurrent_out[0], atol=ATOL).all()
+        if model_impl is QuantLSTM:
+            assert torch.isclose(out[1][0], concurrent_out[1][0], atol=ATOL).all()
+            assert torch.isclose(out[1][1], concurrent_out[1][1], atol=ATOL).all()
+        else:
+            assert torch.isclose(out[1], concurrent_out[1], atol=ATOL).all()
+
+    @pytest.mark.parametrize("model_impl", [QuantRNN, QuantLSTM])
+    @pytest.mark.parametrize("batch_first", [True, False])
+    @pytest.mark.parametrize("num_layers", [2, 3])
+    @pytest.mark.parametrize("wavefront_chunk_size", [1, 2, 5])
+    def test_quant_recurrent_wavefront(
+            self, model_impl, batch_first, num_layers, wavefront_chunk_size):
+        inp_size = 4
+        hidden_size = 5
+        inp = torch.randn(2, 4, inp_size)
+        kwargs = dict(num_layers=num_layers, batch_first=batch_first)
+        m = model_impl(inp_size, hidden_size, **kwargs).eval()
+        wavefront_m = model_impl(
+            inp_size, hidden_size, wavefront_chunk_size=wavefront_chunk_size, **kwargs)
+        wavefront_m.load_state_dict(m.state_dict(), strict=False)
+        wavefront_m.eval()
+        with torch.no_grad():
+            out = m(inp)
+            wavefront_out = wavefront_m(inp)
+        assert torch.isclose(out[0], wavefront_out[0], atol=ATOL).all()
+        if model_impl is QuantLSTM:
+            assert torch.isclose(out[1][0], wavefront_out[1][0], atol=ATOL).all()
+            assert torch.isclose(out[1][1], wavefront_out[1][1], atol=ATOL).all()
+        else:
+            assert torch.isclose(out[1], wavefront_out[1], atol=ATOL).all()
+
+    @pytest.mark.parametrize("model_impl", [QuantRNN, QuantLSTM])
+    @pytest.mark.parametrize("batch_first", [True, False])
+    @pytest.mark.parametrize("num_layers", [1, 2])
+    @pytest.mark.parametrize("chunk_size", [1, 3])
+    @pytest.mark.parametrize("initial_states", [True, False])
+    def test_quant_recurrent_streaming_session(
+            self, model_impl, batch_first, num_layers, chunk_size, initial_states):
+        inp_size = 4
+        hidden_size = 5
+        seq_dim = 1 if batch_first else 0
+        inp = torch.randn(2, 6, inp_size) if batch_first else torch.randn(6, 2, inp_size)
+        m = model_impl(inp_size, hidden_size, num_layers=num_layers, batch_first=batch_first)
+        m.eval()
+        states = ()
+        if initial_states:
+            states = (torch.randn(num_layers, 2, hidden_size),)
+            if model_impl is QuantLSTM:
+                states = states + (torch.randn(num_layers, 2, hidden_size),)
+        session = m.streaming_session(*states)
+        with torch.no_grad():
+            out, out_states = m(inp, *states)
+            chunk_outs = []
+            for chunk in inp.split(chunk_size, dim=seq_dim):
+                chunk_out, chunk_out_states = session(chunk)
+                chunk_outs.append(chunk_out)
+        assert torch.equal(out, torch.cat(chunk_outs, dim=seq_dim))
+        if model_impl is QuantLSTM:
+            assert torch.equal(out_states[0], chunk_out_states[0])
+            assert torch.equal(out_states[1], chunk_out_states[1])
+        else:
+            assert torch.equal(out_states, chunk_out_states)
+
+    def test_quant_recurrent_streaming_session_bidirectional(self):
+        m = QuantLSTM(4, 5, bidirectional=True).eval()
+        with pytest.raises(RuntimeError):
+            m.streaming_session()
@@ -6,6 +6,7 @@ from torch import nn
 
 from brevitas import config
 from brevitas.nn import QuantLinear
+from brevitas.quant import Int8WeightPerTensorFloat
 
 
 def test_parameter_from_stats_update():
@@ -50,3 +51,13 @@ def test_parameter_from_stats_state_dict():
     assert q_linear1_old_scale != q_linear2_scale
     assert q_linear1_old_scale != q_linear1_new_scale
     assert q_linear1_new_scale == q_linear2_scale
+
+
+def test_proxy_properties_follow_injector():
+    q_linear = QuantLinear(10, 5, bias=False, weight_quant=Int8WeightPerTensorFloat)
+    assert q_linear.is_quant_weight_signed
+    assert q_linear.is_quant_weight_narrow_range
+    weight_quant = q_linear.weight_quant
+    weight_quant.quant_injector = weight_quant.quant_injector.let(signed=False, narrow_range=False)
+    assert not q_linear.is_quant_weight_signed
+    assert not q_linear.is_quant_weight_narrow_range